@@ -1,13 +1,14 @@
 #!/usr/bin/env python3
 """
 Arch-Sysup — Arch Linux GUI system manager
-Tabs: Updates | Search & Install | Package Info | System Stats | Orphans | Repositories
+Tabs: Updates | Search & Install | Package Info | System Stats | History | Orphans | Repositories | Mirrors
+Headless: arch-sysup --check | --stats | --orphans [--json]   (no Tk needed)
 Requires: python, tk  (sudo pacman -S tk)
 """
 
-import tkinter as tk
-from tkinter import ttk, messagebox
-import subprocess, threading, shutil, re, os, time
+import subprocess, threading, shutil, re, os, time, tarfile, io, signal, pickle, collections, gzip, json, sqlite3, functools, codecs
+import http.client, urllib.parse, concurrent.futures, sys, queue, selectors, itertools, fnmatch, hashlib, contextlib
+import pty, termios, fcntl, struct
 
 # ── Theme palettes ────────────────────────────────────────────────────────────
 THEMES = {
@@ -58,7 +59,84 @@ MONO_SB= ("Monospace", 9, "bold")
 MONO_L = ("Monospace", 11)
 TITLE  = ("Monospace", 16, "bold")
 PACMAN_CONF = "/etc/pacman.conf"
-
+PACMAN_DBPATH = "/var/lib/pacman"
+PACMAN_LOG    = "/var/log/pacman.log"
+PKG_CACHE     = "/var/cache/pacman/pkg"
+PREFETCH_DBPATH="/var/cache/arch-sysup/db"   # root-owned sync db copy background downloads run against
+MIRRORLIST    = "/etc/pacman.d/mirrorlist"
+REFLECTOR_CONF= "/etc/xdg/reflector/reflector.conf"
+LOG_FLUSH_MS  = 33      # log widget refresh cap (~30 fps)
+LOG_BATCH_MAX = 5000    # lines inserted per flush at most
+LOG_KEEP_LINES= 5000    # lines kept in the log widget; the rest lives in the transcript
+LOG_KEEP_FILES= 20      # transcripts kept under $XDG_STATE_HOME/arch-sysup/logs
+
+
+# ── Timing spans (Diagnostics tab) ────────────────────────────────────────────
+class Spans:
+    """Ring buffer of timed operations. Spans nest per thread (adopt() lets a worker
+    nest under a span opened elsewhere); note() adds subprocess and output-byte counts
+    to every span open on the calling thread, so a fetch span also carries what its
+    run_cmd children spawned and read. Times are seconds since t0."""
+    def __init__(self, maxlen=2000):
+        self.done=collections.deque(maxlen=maxlen); self.open={}
+        self.t0=time.perf_counter(); self.epoch=time.time()
+        self._ids=itertools.count(1); self._local=threading.local(); self._lock=threading.Lock()
+
+    def _stack(self):
+        st=getattr(self._local,"stack",None)
+        if st is None: st=self._local.stack=[]
+        return st
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        stack=self._stack()
+        s={"id":next(self._ids),"name":name,"thread":threading.current_thread().name,
+           "parent":stack[-1]["id"] if stack else None,"depth":stack[-1]["depth"]+1 if stack else 0,
+           "start":time.perf_counter()-self.t0,"end":None,"procs":0,"bytes":0,"attrs":attrs}
+        stack.append(s)
+        with self._lock: self.open[s["id"]]=s
+        try: yield s
+        finally:
+            s["end"]=time.perf_counter()-self.t0; stack.pop()
+            with self._lock: self.open.pop(s["id"],None); self.done.append(s)
+
+    @contextlib.contextmanager
+    def adopt(self, parent):
+        """Open the calling thread's spans as children of `parent`, a span from another thread."""
+        stack=self._stack(); stack.append(parent)
+        try: yield
+        finally: stack.pop()
+
+    def note(self, procs=0, nbytes=0):
+        for s in self._stack(): s["procs"]+=procs; s["bytes"]+=nbytes
+
+    def snapshot(self):
+        """Finished spans plus the ones still running (end=None), oldest first."""
+        with self._lock: spans=list(self.done)+list(self.open.values())
+        return sorted(spans,key=lambda s:s["start"])
+
+    def clear(self):
+        with self._lock: self.done.clear()
+
+    def export(self):
+        now=time.perf_counter()-self.t0
+        return {"epoch":self.epoch,"now":now,"pid":os.getpid(),"spans":[
+            {**s,"attrs":{k:str(v) for k,v in s["attrs"].items()}} for s in self.snapshot()]}
+
+SPANS=Spans()
+PROFILE=None   # LoopProfiler when started with --profile
+
+def traced(fn):
+    """Run fn inside a span named after it (leading underscore dropped). Under
+    --profile, calls on the Tk thread are also profiled."""
+    name=fn.__name__.lstrip("_")
+    @functools.wraps(fn)
+    def wrap(*a, **kw):
+        with SPANS.span(name):
+            if PROFILE and threading.current_thread() is threading.main_thread():
+                return PROFILE.ui_call(name,fn,a,kw)
+            return fn(*a,**kw)
+    return wrap
 
 # ── Pure helpers ──────────────────────────────────────────────────────────────
 def repo_color(repo):
@@ -83,11 +161,162 @@ def detect_aur_helper():
     return None
 
 def run_cmd(cmd, timeout=30):
+    with SPANS.span(os.path.basename(cmd[0]),argv=" ".join(cmd)[:200]):
+        try:
+            r = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+            SPANS.note(1,len(r.stdout))
+            return r.stdout.strip()
+        except Exception:
+            return ""
+
+def kill_proc_group(proc):
+    """Terminate a Popen started with start_new_session=True, children included."""
+    try: os.killpg(proc.pid,signal.SIGTERM)
+    except (OSError,AttributeError): pass
+
+def popen_pty(argv, columns, **kw):
+    """Popen with stdout+stderr on a pseudo-terminal `columns` wide. pacman turns its
+    progress bars and (k/N) steps off whenever stdout is not a terminal, so a pipe
+    never shows them. Output post-processing is off (no \n → \r\n), so the text
+    reads like a pipe's. Returns (proc, master fd); read it with read_pty()."""
+    kw.setdefault("stdin",subprocess.DEVNULL)
+    master,slave=pty.openpty()
     try:
-        r = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-        return r.stdout.strip()
-    except Exception:
-        return ""
+        fcntl.ioctl(slave,termios.TIOCSWINSZ,struct.pack("HHHH",50,int(columns),0,0))
+        attrs=termios.tcgetattr(slave); attrs[1]&=~termios.ONLCR
+        termios.tcsetattr(slave,termios.TCSANOW,attrs)
+        proc=subprocess.Popen(argv,stdout=slave,stderr=slave,**kw)
+    except BaseException:
+        os.close(master); raise
+    finally: os.close(slave)
+    return proc,master
+
+def read_pty(fd, n=65536):
+    """os.read on a pty master; b"" once every writer has closed the terminal (EIO)."""
+    try: return os.read(fd,n)
+    except OSError: return b""
+
+def interrupt_proc_group(proc, grace=60):
+    """Stop a start_new_session Popen the way Ctrl+C would. pacman only releases
+    db.lck on SIGINT/SIGHUP (SIGTERM leaves it behind), and it ignores SIGINT while
+    committing, so SIGTERM follows only if it is still running after `grace` seconds."""
+    try: os.killpg(proc.pid,signal.SIGINT)
+    except (OSError,AttributeError): return
+    def _fallback():
+        try: proc.wait(grace)
+        except subprocess.TimeoutExpired: kill_proc_group(proc)
+    threading.Thread(target=_fallback,daemon=True).start()
+
+# Per-source wall-clock limits for the update checkers (temp db sync / AUR RPC)
+UPDATE_TIMEOUTS = {"official":180, "aur":240}
+
+def parse_update_lines(text):
+    """`name old -> new` lines from checkupdates / `<helper> -Qua` → [(name, old, new)]."""
+    out=[]
+    for line in text.splitlines():
+        parts=line.split()
+        if len(parts)>=4: out.append((parts[0],parts[1],parts[3]))
+    return out
+
+def parse_search_output(text, source, seen=None):
+    """`repo/name ver [installed]` + indented description pairs from pacman/yay/paru -Ss
+    → result rows. Names already in `seen` are skipped, new ones added to it."""
+    seen=set() if seen is None else seen; out=[]
+    lines=text.splitlines(); i=0
+    while i<len(lines):
+        line=lines[i].rstrip()
+        if line and not line.startswith(" ") and "/" in line:
+            m=re.match(r'^([^/]+)/(\S+)\s+(\S+)(.*)',line)
+            if m:
+                repo,pkg,ver=m.group(1),m.group(2),m.group(3)
+                desc=lines[i+1].strip() if i+1<len(lines) else ""
+                if pkg not in seen:
+                    seen.add(pkg)
+                    out.append({"repo":repo,"pkg":pkg,"ver":ver,"desc":desc,
+                                "installed":"[installed]" in m.group(4),"source":source})
+            i+=2
+        else: i+=1
+    return out
+
+def run_update_source(cmd, timeout, procs=None):
+    """Run one update checker in its own process group (checkupdates forks
+    fakeroot + pacman) so it can be timed out or cancelled as a unit. Running
+    processes are kept in `procs` while alive. Returns (parsed, error or None)."""
+    with SPANS.span(os.path.basename(cmd[0]),argv=" ".join(cmd)[:200]):
+        return _run_update_source(cmd,timeout,procs)
+
+def _run_update_source(cmd, timeout, procs):
+    try:
+        proc=subprocess.Popen(cmd,stdout=subprocess.PIPE,stderr=subprocess.PIPE,
+                              text=True,start_new_session=True)
+    except OSError as e:
+        return [],str(e)
+    SPANS.note(1)
+    if procs is not None: procs.append(proc)
+    try:
+        out,err=proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        kill_proc_group(proc); proc.communicate()
+        return [],f"timed out after {timeout}s"
+    finally:
+        if procs is not None and proc in procs: procs.remove(proc)
+    SPANS.note(0,len(out))
+    rc=proc.returncode
+    # checkupdates: 0 updates, 2 nothing pending, anything else (1: "Cannot fetch
+    # updates") a failed check. AUR helpers' -Qua exits non-zero when nothing is found.
+    if os.path.basename(cmd[0])=="checkupdates" and rc not in (0,2):
+        lines=[l for l in err.splitlines() if l.strip()]
+        return [],"failed: "+(re.sub(r"^==> ERROR:\s*","",lines[-1].strip()) if lines else f"exit {rc}")
+    return (parse_update_lines(out) if rc==0 else []),None
+
+def xdg_path(kind, name):
+    """<$XDG_CACHE_HOME|$XDG_STATE_HOME>/arch-sysup/<name>; creates the directory."""
+    base=os.environ.get(f"XDG_{kind.upper()}_HOME") or os.path.expanduser(
+        {"cache":"~/.cache","state":"~/.local/state"}[kind])
+    path=os.path.join(base,"arch-sysup",name)
+    os.makedirs(os.path.dirname(path),exist_ok=True)
+    return path
+
+# ── Shared update state (also written by arch-sysup-notifier) ─────────────────
+UPDATE_STATE_VERSION = 1
+UPDATE_STATE_MAX_AGE = 3*3600   # revalidate anyway once cached results are this old
+
+def db_fingerprint(dbpath=PACMAN_DBPATH):
+    """mtimes of every sync .db and of the local db dir: changes after any -Sy or
+    transaction. Keep in step with the copy in arch-sysup-notifier."""
+    fp={}
+    sync=os.path.join(dbpath,"sync")
+    try: names=sorted(f for f in os.listdir(sync) if f.endswith(".db"))
+    except OSError: names=[]
+    for f in names:
+        try: fp[f]=os.stat(os.path.join(sync,f)).st_mtime_ns
+        except OSError: pass
+    try: fp["local"]=os.stat(os.path.join(dbpath,"local")).st_mtime_ns
+    except OSError: pass
+    return fp
+
+def load_update_state(path=None):
+    """The last saved update check, or None if missing/unreadable/other version."""
+    try:
+        with open(path or xdg_path("cache","update-state.json")) as f: st=json.load(f)
+    except (OSError,ValueError): return None
+    return st if isinstance(st,dict) and st.get("version")==UPDATE_STATE_VERSION else None
+
+def save_update_state(updates, dbpath=PACMAN_DBPATH, path=None):
+    """Atomically write [{pkg, old, new, source, repo, dl_size}] with a timestamp and db fingerprint."""
+    path=path or xdg_path("cache","update-state.json")
+    st={"version":UPDATE_STATE_VERSION,"timestamp":time.time(),"fingerprint":db_fingerprint(dbpath),
+        "updates":[{k:u.get(k) for k in ("pkg","old","new","source","repo","dl_size")} for u in updates]}
+    try:
+        with open(path+".tmp","w") as f: json.dump(st,f)
+        os.replace(path+".tmp",path)
+    except OSError: pass
+
+def fmt_age(secs):
+    """Compact age: 45s, 12m, 5h, 3d."""
+    for unit,n in (("d",86400),("h",3600),("m",60)):
+        if secs>=n: return f"{int(secs//n)}{unit}"
+    return f"{int(max(0,secs))}s"
 
 def fmt_bytes(n):
     for u in ("B","KB","MB","GB","TB"):
@@ -95,6 +324,41 @@ def fmt_bytes(n):
         n /= 1024
     return f"{n:.1f} PB"
 
+def parse_size(s):
+    """Turn a pacman size field ("12.34 MiB") into bytes; 0 if unparseable."""
+    m=re.match(r'^\s*([\d.,]+)\s*([KMGTP]?)i?B',s or "")
+    if not m: return 0
+    try: n=float(m.group(1).replace(",","."))
+    except ValueError: return 0
+    return int(n*1024**" KMGTP".index(m.group(2) or " "))
+
+def parse_pacman_info(text):
+    """Split `pacman -Si`/`-Qi` output for one or many packages into field dicts."""
+    pkgs,cur,last=[],{},None
+    for line in text.splitlines():
+        if not line.strip():
+            if cur: pkgs.append(cur)
+            cur,last={},None; continue
+        m=re.match(r'^(\S[^:]*?)\s*:\s*(.*)',line)
+        if m:
+            last=m.group(1); cur.setdefault(last,m.group(2).strip())
+        elif last: cur[last]+=" "+line.strip()
+    if cur: pkgs.append(cur)
+    return pkgs
+
+def resolve_repos(pkgs):
+    """Map package names to {repo, dl_size, inst_size} with one `pacman -Si` call.
+    Names pacman doesn't know (AUR/foreign) are simply absent from the result."""
+    out={}
+    if not pkgs: return out
+    for info in parse_pacman_info(run_cmd(["pacman","-Si"]+list(pkgs),timeout=60)):
+        n=info.get("Name")
+        if n and n not in out:   # first hit = highest-priority repo, like pacman
+            out[n]={"repo":info.get("Repository") or "AUR",
+                    "dl_size":parse_size(info.get("Download Size","")),
+                    "inst_size":parse_size(info.get("Installed Size",""))}
+    return out
+
 
 # ── pacman.conf helpers ───────────────────────────────────────────────────────
 def parse_pacman_conf(path=PACMAN_CONF):
@@ -122,6 +386,28 @@ def parse_pacman_conf(path=PACMAN_CONF):
     if current: sections.append(current)
     return preamble, sections
 
+def pacman_conf_options(path=PACMAN_CONF):
+    """{key: [values]} from the enabled [options] section (DBPath, CacheDir, IgnorePkg, …)."""
+    _,secs=parse_pacman_conf(path); out={}
+    for sec in secs:
+        if sec["type"]!="options" or not sec["enabled"]: continue
+        for ln in sec["lines"][1:]:
+            s=ln.split("#",1)[0].strip()
+            if s: k,_,v=s.partition("="); out.setdefault(k.strip(),[]).extend(v.split())
+    return out
+
+def mirrorlist_repos(path=PACMAN_CONF, mirrorlist=MIRRORLIST):
+    """Enabled repos whose first server entry is `Include = <mirrorlist>`, i.e. whose
+    files pacman fetches from the first working server of that mirrorlist."""
+    try: _,secs=parse_pacman_conf(path)
+    except OSError: return set()
+    out=set()
+    for sec in secs:
+        if sec["type"]!="repo" or not sec["enabled"]: continue
+        first=next((m for m in (re.match(r'^(Include|Server)\s*=\s*(\S+)',ln.strip()) for ln in sec["lines"][1:]) if m),None)
+        if first and first.group(1)=="Include" and first.group(2)==mirrorlist: out.add(sec["name"])
+    return out
+
 def write_pacman_conf(preamble, sections):
     out = list(preamble)
     for sec in sections:
@@ -141,6 +427,1477 @@ def write_pacman_conf(preamble, sections):
     return "".join(out)
 
 
+# ── Sync database index ───────────────────────────────────────────────────────
+def parse_desc(text):
+    """Parse an alpm desc file (%FIELD% header, one value per line) into {FIELD: [values]}."""
+    d,key={},None
+    for line in text.splitlines():
+        if len(line)>2 and line[0]=="%" and line[-1]=="%": key=line[1:-1]; d.setdefault(key,[])
+        elif not line: key=None
+        elif key: d[key].append(line)
+    return d
+
+def read_db_archive(path):
+    """Return {entry_dir: merged desc fields} for a sync db archive (gz/xz/bz2/zstd/plain)."""
+    with open(path,"rb") as f: raw=f.read()
+    if raw[:4]==b"\x28\xb5\x2f\xfd":   # zstd — tarfile can't do it before 3.14
+        raw=subprocess.run(["zstd","-dcq"],input=raw,capture_output=True).stdout; SPANS.note(1)
+    entries={}
+    with tarfile.open(fileobj=io.BytesIO(raw),mode="r:*") as tf:
+        for m in tf:
+            if not m.isfile(): continue
+            d=m.name.rsplit("/",1)[0]
+            entries.setdefault(d,{}).update(parse_desc(tf.extractfile(m).read().decode("utf-8","replace")))
+    return entries
+
+def _pkg_record(d, repo):
+    one=lambda k:(d.get(k) or [""])[0]
+    num=lambda k:int(one(k)) if one(k).isdigit() else 0
+    return {"name":one("NAME"),"ver":one("VERSION"),"desc":one("DESC"),"repo":repo,
+            "url":one("URL"),"licenses":d.get("LICENSE",[]),"packager":one("PACKAGER"),
+            "builddate":num("BUILDDATE"),"csize":num("CSIZE"),"isize":num("ISIZE"),
+            "filename":one("FILENAME"),"depends":d.get("DEPENDS",[]),
+            "optdepends":d.get("OPTDEPENDS",[]),"provides":d.get("PROVIDES",[]),
+            "conflicts":d.get("CONFLICTS",[])}
+
+def dep_name(dep):
+    """'foo>=1.2' / 'foo: optional reason' → 'foo'."""
+    return re.split(r'[<>=:]',dep,1)[0].strip()
+
+class SyncDB:
+    """In-memory index of <dbpath>/sync/<repo>.db keyed by package name.
+    Repos come from pacman.conf; a repo is only re-read when its .db mtime changes,
+    so refresh() is cheap enough to call before every lookup."""
+    def __init__(self, dbpath=PACMAN_DBPATH, conf=PACMAN_CONF):
+        self.dbpath=dbpath; self.conf=conf
+        self.pkgs={}; self.provides={}
+        self._repos={}; self._order=[]; self._lock=threading.Lock()
+
+    def repo_names(self):
+        _,secs=parse_pacman_conf(self.conf)
+        return [s["name"] for s in secs if s["type"]=="repo" and s["enabled"]]
+
+    def refresh(self):
+        with self._lock:
+            names=self.repo_names(); changed=names!=self._order
+            for r in names:
+                path=os.path.join(self.dbpath,"sync",r+".db")
+                try: mt=os.stat(path).st_mtime_ns
+                except OSError: mt=None
+                if r in self._repos and self._repos[r][0]==mt: continue
+                try: recs=[_pkg_record(d,r) for d in read_db_archive(path).values()] if mt else []
+                except Exception: recs=[]
+                self._repos[r]=(mt,recs); changed=True
+            if changed:
+                pkgs,prov={},{}
+                for r in names:
+                    for p in self._repos[r][1]:
+                        if p["name"] in pkgs: continue   # earlier repo wins, as in pacman
+                        pkgs[p["name"]]=p
+                        for pv in p["provides"]: prov.setdefault(dep_name(pv),[]).append(p["name"])
+                self._repos={r:v for r,v in self._repos.items() if r in names}
+                self.pkgs,self.provides,self._order=pkgs,prov,names
+        return self
+
+    def fingerprint(self):
+        """[(repo, .db mtime)] for the enabled repos — changes whenever a db is re-synced."""
+        out=[]
+        for r in self.repo_names():
+            try: out.append((r,os.stat(os.path.join(self.dbpath,"sync",r+".db")).st_mtime_ns))
+            except OSError: out.append((r,None))
+        return out
+
+    def get(self, name): return self.pkgs.get(name)
+
+    def resolve(self, names):
+        """Same shape as resolve_repos(): {name: {repo, dl_size, inst_size}}."""
+        return {n:{"repo":p["repo"],"dl_size":p["csize"],"inst_size":p["isize"]}
+                for n in names for p in (self.pkgs.get(n),) if p}
+
+    def search(self, query):
+        """pacman -Ss semantics: every term is a case-insensitive regex that must
+        match the name or the description."""
+        try: pats=[re.compile(t,re.I) for t in query.split()]
+        except re.error: pats=[re.compile(re.escape(t),re.I) for t in query.split()]
+        return [p for p in self.pkgs.values()
+                if all(rx.search(p["name"]) or rx.search(p["desc"]) for rx in pats)]
+
+    def info(self, name):
+        """Field dict shaped like parsed `pacman -Si` output, or {}."""
+        p=self.pkgs.get(name)
+        if not p: return {}
+        j=lambda l:"  ".join(l) or "None"
+        return {"Repository":p["repo"],"Name":p["name"],"Version":p["ver"],"Description":p["desc"],
+                "URL":p["url"],"Licenses":j(p["licenses"]),"Provides":j(p["provides"]),
+                "Depends On":j(p["depends"]),"Optional Deps":j(p["optdepends"]),
+                "Conflicts With":j(p["conflicts"]),"Download Size":fmt_bytes(p["csize"]),
+                "Installed Size":fmt_bytes(p["isize"]),"Packager":p["packager"],
+                "Build Date":time.strftime("%c",time.localtime(p["builddate"])) if p["builddate"] else ""}
+
+class SearchIndex:
+    """Trigram index over sync package names + descriptions for search-as-you-type.
+    Pickled to $XDG_CACHE_HOME/arch-sysup/ together with the sync db fingerprint it
+    was built from, so a fresh launch answers the first keystroke without reading
+    a single .db archive."""
+    VERSION=1
+
+    def __init__(self, key, pkgs, grams=None):
+        self.key=key; self.pkgs=pkgs        # [(name, ver, desc, repo)]
+        self.hay=[(n+"\n"+d).lower() for n,_,d,_ in pkgs]
+        if grams is None:
+            grams={}
+            for i,h in enumerate(self.hay):
+                for g in {h[j:j+3] for j in range(len(h)-2)}: grams.setdefault(g,[]).append(i)
+        self.grams=grams
+
+    @classmethod
+    def load_or_build(cls, syncdb, path=None):
+        path=path or xdg_path("cache","search-index.pickle")
+        key=syncdb.fingerprint()
+        try:
+            with open(path,"rb") as f: d=pickle.load(f)
+            if d.get("version")==cls.VERSION and d.get("key")==key:
+                return cls(key,d["pkgs"],d["grams"])
+        except Exception: pass
+        db=syncdb.refresh()
+        idx=cls(key,[(p["name"],p["ver"],p["desc"],p["repo"]) for p in db.pkgs.values()])
+        try:
+            with open(path+".tmp","wb") as f:
+                pickle.dump({"version":cls.VERSION,"key":key,"pkgs":idx.pkgs,"grams":idx.grams},f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path+".tmp",path)
+        except OSError: pass
+        return idx
+
+    def search(self, query, within=None):
+        """Indices of packages whose name/description contain every term (literal,
+        case-insensitive). `within` narrows an earlier result when the query grew."""
+        terms=query.lower().split()
+        if not terms: return []
+        cand=None
+        for t in terms:
+            for j in range(len(t)-2):
+                post=self.grams.get(t[j:j+3])
+                if post is None: return []
+                cand=set(post) if cand is None else cand.intersection(post)
+        if within is not None: cand=set(within) if cand is None else cand.intersection(within)
+        ids=cand if cand is not None else range(len(self.hay))
+        hits=[i for i in ids if all(t in self.hay[i] for t in terms)]
+        q=terms[0]
+        def rank(i):
+            n=self.pkgs[i][0]
+            return (0 if n==q else 1 if n.startswith(q) else 2 if q in n else 3,
+                    repo_order(self.pkgs[i][3]),n)
+        return sorted(hits,key=rank)
+
+
+class LocalDB:
+    """Index of <dbpath>/local/*/desc built in one directory scan. refresh() only
+    re-parses entries that are new or whose desc changed, and drops vanished ones;
+    required-by, orphan (-Qdt) and foreign (-Qm) status are derived afterwards."""
+    REASON={"0":"Explicitly installed","1":"Installed as a dependency for another package"}
+
+    def __init__(self, dbpath=PACMAN_DBPATH):
+        self.dbpath=dbpath; self.pkgs={}
+        self._ents={}; self._lock=threading.Lock()
+
+    def refresh(self, syncdb=None):
+        with self._lock:
+            root=os.path.join(self.dbpath,"local"); ents={}; changed=False
+            try: it=list(os.scandir(root))
+            except OSError: it=[]
+            for e in it:
+                try: mt=os.stat(os.path.join(e.path,"desc")).st_mtime_ns
+                except OSError: continue
+                old=self._ents.get(e.name)
+                if old and old[0]==mt: ents[e.name]=old; continue
+                try:
+                    with open(os.path.join(e.path,"desc"),encoding="utf-8",errors="replace") as f: d=parse_desc(f.read())
+                except OSError: continue
+                rec=_pkg_record(d,"local"); rec["dir"]=e.path
+                rec["reason"]="dep" if (d.get("REASON") or ["0"])[0]=="1" else "explicit"
+                rec["isize"]=int((d.get("SIZE") or ["0"])[0] or 0)
+                rec["installdate"]=int((d.get("INSTALLDATE") or ["0"])[0] or 0)
+                ents[e.name]=(mt,rec); changed=True
+            if changed or len(ents)!=len(self._ents):
+                pkgs={r["name"]:r for _,r in ents.values()}
+                prov={}
+                for r in pkgs.values():
+                    for pv in r["provides"]: prov.setdefault(dep_name(pv),[]).append(r["name"])
+                for r in pkgs.values(): r["required_by"]=[]; r["optional_for"]=[]
+                for r in pkgs.values():
+                    for key,deps in (("required_by",r["depends"]),("optional_for",r["optdepends"])):
+                        for dp in {dep_name(x) for x in deps}:
+                            # like pacman, a virtual dep counts for every installed provider
+                            for tgt in ([dp] if dp in pkgs else prov.get(dp,())):
+                                if tgt!=r["name"] and r["name"] not in pkgs[tgt][key]: pkgs[tgt][key].append(r["name"])
+                for r in pkgs.values():
+                    r["required_by"].sort(); r["optional_for"].sort()
+                    # -Qdt: not required *or optionally required* by anything installed
+                    r["orphan"]=r["reason"]=="dep" and not r["required_by"] and not r["optional_for"]
+                self._ents,self.pkgs=ents,pkgs
+            if syncdb is not None and syncdb.pkgs:
+                for r in self.pkgs.values(): r["foreign"]=r["name"] not in syncdb.pkgs
+        return self
+
+    def get(self, name): return self.pkgs.get(name)
+    def explicit(self): return sorted(n for n,r in self.pkgs.items() if r["reason"]=="explicit")
+    def orphans(self):  return sorted(n for n,r in self.pkgs.items() if r["orphan"])
+    def foreign(self):  return sorted(n for n,r in self.pkgs.items() if r.get("foreign"))
+
+    def files(self, name):
+        """Installed file paths (absolute), read from the entry's files list."""
+        r=self.pkgs.get(name)
+        if not r: return []
+        try:
+            with open(os.path.join(r["dir"],"files"),encoding="utf-8",errors="replace") as f:
+                return ["/"+p for p in parse_desc(f.read()).get("FILES",[])]
+        except OSError: return []
+
+    def info(self, name):
+        """Field dict shaped like parsed `pacman -Qi` output, or {}."""
+        r=self.pkgs.get(name)
+        if not r: return {}
+        j=lambda l:"  ".join(l) or "None"
+        ts=lambda t:time.strftime("%c",time.localtime(t)) if t else ""
+        return {"Name":r["name"],"Version":r["ver"],"Description":r["desc"],"URL":r["url"],
+                "Licenses":j(r["licenses"]),"Provides":j(r["provides"]),"Depends On":j(r["depends"]),
+                "Optional Deps":j(r["optdepends"]),"Required By":j(r["required_by"]),
+                "Optional For":j(r["optional_for"]),
+                "Conflicts With":j(r["conflicts"]),"Installed Size":fmt_bytes(r["isize"]),
+                "Packager":r["packager"],"Build Date":ts(r["builddate"]),"Install Date":ts(r["installdate"]),
+                "Install Reason":self.REASON["1" if r["reason"]=="dep" else "0"]}
+
+
+# ── Package cache catalog ─────────────────────────────────────────────────────
+_PKG_FILE = re.compile(r'^(.+)-([^-]+-[^-]+)-([^-]+)\.pkg\.tar(?:\.\w+)?$')
+
+def _rpmvercmp(a, b):
+    # Segment-wise compare, as alpm's rpmvercmp: digit runs numerically, alpha runs
+    # lexically, a digit run beats an alpha run, and a leftover alpha run loses.
+    if a==b: return 0
+    i=j=0
+    while i<len(a) and j<len(b):
+        si,sj=i,j
+        while i<len(a) and not a[i].isalnum(): i+=1
+        while j<len(b) and not b[j].isalnum(): j+=1
+        if i>=len(a) or j>=len(b): break
+        if i-si!=j-sj: return -1 if i-si<j-sj else 1
+        one,two=i,j
+        num=a[i].isdigit()
+        run=str.isdigit if num else str.isalpha
+        while i<len(a) and run(a[i]): i+=1
+        while j<len(b) and run(b[j]): j+=1
+        s1,s2=a[one:i],b[two:j]
+        if not s2: return 1 if num else -1
+        if num:
+            s1,s2=s1.lstrip("0"),s2.lstrip("0")
+            if len(s1)!=len(s2): return 1 if len(s1)>len(s2) else -1
+        if s1!=s2: return 1 if s1>s2 else -1
+    if i>=len(a) and j>=len(b): return 0
+    return -1 if (i>=len(a) and not b[j].isalpha()) or (i<len(a) and a[i].isalpha()) else 1
+
+def vercmp(a, b):
+    """pacman's vercmp: <0, 0 or >0 as version a is older than, equal to or newer than b."""
+    def evr(v):
+        e,_,v=v.rpartition(":") if ":" in v else ("0","",v)
+        v,_,r=v.rpartition("-") if "-" in v else (v,"","")
+        return e or "0",v,r
+    if a==b: return 0
+    (ea,va,ra),(eb,vb,rb)=evr(a),evr(b)
+    return _rpmvercmp(ea,eb) or _rpmvercmp(va,vb) or (_rpmvercmp(ra,rb) if ra and rb else 0)
+
+class PkgCache:
+    """Catalog of the pacman package cache: name → cached builds, parsed from the file
+    names (name-pkgver-pkgrel-arch.pkg.tar.*). refresh() rescans only when the
+    directory's mtime moved, and only stats files it has not seen before — cached
+    packages are written once, so a known file name keeps its size."""
+    def __init__(self, path=PKG_CACHE):
+        self.path=path; self.mtime=None
+        self.files={}     # file name → {"path","size","name","ver","arch"}; name is None for .sig etc.
+        self.pkgs={}      # package name → entries, newest version first
+        self.total=0
+        self._lock=threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            try: mt=os.stat(self.path).st_mtime_ns
+            except OSError:
+                self.files={}; self.pkgs={}; self.total=0; self.mtime=None; return self
+            if mt==self.mtime: return self
+            files={}
+            with os.scandir(self.path) as it:
+                for e in it:
+                    if e.name in self.files: files[e.name]=self.files[e.name]; continue
+                    try:
+                        if not e.is_file(follow_symlinks=False): continue
+                        size=e.stat(follow_symlinks=False).st_size
+                    except OSError: continue
+                    m=_PKG_FILE.match(e.name)
+                    files[e.name]={"path":e.path,"size":size,"name":m and m.group(1),
+                                   "ver":m and m.group(2),"arch":m and m.group(3)}
+            pkgs=collections.defaultdict(list)
+            for f in files.values():
+                if f["name"]: pkgs[f["name"]].append(f)
+            for v in pkgs.values():
+                v.sort(key=functools.cmp_to_key(lambda x,y:vercmp(y["ver"],x["ver"])))
+            self.files=files; self.pkgs=dict(pkgs); self.mtime=mt
+            self.total=sum(f["size"] for f in files.values())
+            return self
+
+    def versions(self, name): return self.pkgs.get(name,[])
+
+    def older(self, name, ver):
+        """Cached builds of name older than ver, newest first."""
+        return [f for f in self.pkgs.get(name,[]) if vercmp(f["ver"],ver)<0]
+
+    def plan(self, keep=3, installed=None):
+        """What `paccache -rk<keep>` (plus `-ruk0` when installed is given) would delete:
+        all but the newest keep builds of each package per architecture, and every
+        build of a package not in installed. Returns (builds, paths, bytes); paths
+        includes each build's .sig."""
+        builds=[]
+        for name,vers in self.pkgs.items():
+            if installed is not None and name not in installed: builds.extend(vers); continue
+            seen=collections.Counter()
+            for f in vers:
+                seen[f["arch"]]+=1
+                if seen[f["arch"]]>keep: builds.append(f)
+        paths=[]; size=0
+        for f in builds:
+            paths.append(f["path"]); size+=f["size"]
+            sig=self.files.get(os.path.basename(f["path"])+".sig")
+            if sig: paths.append(sig["path"]); size+=sig["size"]
+        return builds,paths,size
+
+
+# ── pacman.log index ──────────────────────────────────────────────────────────
+_LOG_LINE = re.compile(r'^\[([^\]]+)\] (?:\[([\w-]+)\] )?(.*)$')
+_LOG_PKG  = re.compile(r'^(upgraded|installed|removed|downgraded|reinstalled) (\S+) \((.*)\)$')
+
+def _log_ts(raw):
+    """'2024-03-01T09:15:02+0100' / '2019-01-01 12:00' → '2024-03-01 09:15:02' (sortable)."""
+    t=raw[:19].replace("T"," ")
+    return t+":00" if len(t)==16 else t
+
+class PacmanLogIndex:
+    """Persistent index of pacman.log in sqlite ($XDG_CACHE_HOME/arch-sysup/pacman-log.sqlite).
+    The log's inode and the byte offset reached are checkpointed, so update() only
+    parses bytes appended since the last call (starting over if the log was rotated
+    or truncated). Records: transactions (start, end, status, command) and their
+    installed/upgraded/removed/downgraded/reinstalled entries with versions."""
+    VERSION="1"
+    SCHEMA="""
+        CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS txn(id INTEGER PRIMARY KEY, start TEXT, end TEXT, status TEXT, cmd TEXT);
+        CREATE TABLE IF NOT EXISTS event(txn INTEGER, ts TEXT, action TEXT, pkg TEXT, old TEXT, new TEXT);
+        CREATE INDEX IF NOT EXISTS event_pkg ON event(pkg, ts);
+        CREATE INDEX IF NOT EXISTS event_txn ON event(txn);
+        CREATE INDEX IF NOT EXISTS txn_start ON txn(start);"""
+
+    def __init__(self, log=PACMAN_LOG, path=None):
+        self.log=log; self.path=path or xdg_path("cache","pacman-log.sqlite")
+        self._lock=threading.Lock()
+
+    def _db(self):
+        db=sqlite3.connect(self.path,timeout=10)
+        db.executescript(self.SCHEMA)
+        if self._meta(db,"version")!=self.VERSION: self._reset(db)
+        return db
+
+    @staticmethod
+    def _meta(db, key, default=None):
+        r=db.execute("SELECT value FROM meta WHERE key=?",(key,)).fetchone()
+        return r[0] if r else default
+
+    def _reset(self, db):
+        db.executescript("DELETE FROM meta; DELETE FROM txn; DELETE FROM event;")
+        db.execute("INSERT INTO meta VALUES('version',?)",(self.VERSION,)); db.commit()
+
+    def update(self):
+        """Parse whatever was appended to the log since the last checkpoint; returns lines parsed."""
+        with self._lock:
+            try: st=os.stat(self.log)
+            except OSError: return 0
+            db=self._db()
+            try:
+                off=int(self._meta(db,"offset","0"))
+                if self._meta(db,"inode")!=str(st.st_ino) or st.st_size<off:
+                    self._reset(db); off=0
+                if st.st_size==off: return 0
+                with open(self.log,"rb") as f:
+                    f.seek(off); data=f.read()
+                end=data.rfind(b"\n")+1          # leave a half-written last line for next time
+                n=self._parse(db,data[:end].decode("utf-8","replace").splitlines())
+                for k,v in (("inode",st.st_ino),("offset",off+end)):
+                    db.execute("INSERT OR REPLACE INTO meta VALUES(?,?)",(k,str(v)))
+                db.commit()
+                return n
+            finally: db.close()
+
+    def _parse(self, db, lines):
+        cur=self._meta(db,"open_txn"); cur=int(cur) if cur else None
+        cmd=self._meta(db,"pending_cmd",""); last=self._meta(db,"last_upgrade","")
+        implicit=self._meta(db,"implicit")=="1"; ev=[]
+        for line in lines:
+            m=_LOG_LINE.match(line)
+            if not m: continue
+            ts,src,msg=_log_ts(m.group(1)),m.group(2),m.group(3).strip()
+            low=msg.lower()
+            if implicit and not _LOG_PKG.match(msg):
+                # pre-2013 logs have no transaction markers: a run of package lines is one
+                db.executemany("INSERT INTO event VALUES(?,?,?,?,?,?)",ev); ev=[]
+                db.execute("UPDATE txn SET end=(SELECT MAX(ts) FROM event WHERE txn=?),status='completed' "
+                           "WHERE id=?",(cur,cur))
+                cur=None; implicit=False
+            if src=="PACMAN" and msg.startswith("Running "):
+                cmd=msg[8:].strip("'\"")
+            elif low=="transaction started":
+                cur=db.execute("INSERT INTO txn(start,cmd) VALUES(?,?)",(ts,cmd)).lastrowid; cmd=""
+            elif low.startswith("transaction ") and cur is not None:
+                db.execute("UPDATE txn SET end=?,status=? WHERE id=?",(ts,low[12:],cur)); cur=None
+            else:
+                if "starting full system upgrade" in low: last=ts
+                pm=_LOG_PKG.match(msg)
+                if not pm: continue
+                act,pkg,vers=pm.groups()
+                if cur is None:
+                    cur=db.execute("INSERT INTO txn(start,cmd) VALUES(?,?)",(ts,cmd)).lastrowid
+                    cmd=""; implicit=True
+                old,_,new=vers.partition(" -> ")
+                if not new: old,new=(old,"") if act=="removed" else ("" if act=="installed" else old,old)
+                ev.append((cur,ts,act,pkg,old,new))
+                if act=="upgraded": last=ts
+        db.executemany("INSERT INTO event VALUES(?,?,?,?,?,?)",ev)
+        for k,v in (("open_txn",cur or ""),("pending_cmd",cmd),("last_upgrade",last),("implicit",int(implicit))):
+            db.execute("INSERT OR REPLACE INTO meta VALUES(?,?)",(k,str(v)))
+        return len(lines)
+
+    def last_update(self):
+        """Timestamp of the last full system upgrade / package upgrade, or ''."""
+        db=self._db()
+        try: return self._meta(db,"last_upgrade","")
+        finally: db.close()
+
+    def history(self, pkg="", since="", until=""):
+        """Transactions newest first as dicts (id, start, end, status, cmd, counts, events).
+        pkg is a case-insensitive substring; when given, only transactions touching a
+        matching package are returned, each with just the matching events. since/until
+        are inclusive date prefixes (YYYY, YYYY-MM or YYYY-MM-DD) on the start time.
+        counts always covers the whole transaction: {action: n}."""
+        where,args=[],[]
+        if since: where.append("t.start>=?"); args.append(since)
+        if until: where.append("t.start<=?"); args.append(until+"~")
+        tsel="SELECT id FROM txn t"+(" WHERE "+" AND ".join(where) if where else "")
+        if pkg: where.append("e.pkg LIKE ? ESCAPE '\\'"); args.append("%"+re.sub(r"([%_\\])",r"\\\1",pkg)+"%")
+        sql=("SELECT t.id,t.start,t.end,t.status,t.cmd,e.ts,e.action,e.pkg,e.old,e.new FROM txn t "
+             +("JOIN" if pkg else "LEFT JOIN")+" event e ON e.txn=t.id"
+             +(" WHERE "+" AND ".join(where) if where else "")+" ORDER BY t.start DESC,t.id DESC,e.rowid")
+        db=self._db()
+        try:
+            counts=collections.defaultdict(dict)
+            for t,act,n in db.execute(f"SELECT txn,action,COUNT(*) FROM event WHERE txn IN ({tsel}) "
+                                      "GROUP BY txn,action",args[:len(args)-bool(pkg)]):
+                counts[t][act]=n
+            out=[]
+            for tid,start,end,status,cmd,ts,act,name,old,new in db.execute(sql,args):
+                if not out or out[-1]["id"]!=tid:
+                    out.append({"id":tid,"start":start,"end":end or "","status":status or "",
+                                "cmd":cmd or "","counts":counts.get(tid,{}),"events":[]})
+                if act: out[-1]["events"].append({"ts":ts,"action":act,"pkg":name,"old":old,"new":new})
+            return out
+        finally: db.close()
+
+
+# ── pacman / AUR helper progress ──────────────────────────────────────────────
+_ANSI      = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+_PROG_BAR  = re.compile(r'^\s*(.*?)\s+([\d.,]+\s*[KMGTP]?i?B)\s+([\d.,]+\s*[KMGTP]?i?B)/s\s+(\S+)\s+\[[^\]]*\]\s+(\d+)%$')
+_PROG_STEP = re.compile(r'^\(\s*(\d+)/(\d+)\)\s+(.*?)(?:\s+\[[^\]]*\]\s+(\d+)%)?$')
+_PROG_TOTAL= re.compile(r'^Total \(\s*(\d+)/(\d+)\)$')
+_PROG_DL   = re.compile(r'^\s*(\S+) downloading\.\.\.$')
+_PROG_MAKE = re.compile(r'^==> (Making|Finished making):? (\S+)')
+_PROG_ERR  = re.compile(r"^error: failed retrieving file '([^']+)' from (\S+) : (.*)$")
+_PROG_SKIP = re.compile(r"too many errors from (\S+), skipping")
+
+def dl_name(filename):
+    """Download file name as pacman labels its progress bar: 'core.db' → 'core',
+    'foo-1.0-1-x86_64.pkg.tar.zst(.sig)' → 'foo-1.0-1-x86_64'."""
+    return re.sub(r'(\.pkg\.tar(\.\w+)?|\.db|\.files)?(\.sig)?$','',filename)
+
+class ProgressParser:
+    """Incremental parser for pacman / yay / paru output. feed() takes decoded text in
+    arbitrary chunks, splits it on \r as well as \n and returns (kind, data) events:
+      line         a finished line for the log; progress-bar redraws never are, a bar
+                   is logged once when it reaches 100%
+      phase        ':: …' section header (data: text)
+      dl_start     {pkg}                dl_progress {pkg, done, rate, pct}
+      dl_done      {pkg, done}          dl_total    {k, n, done, rate, pct}
+      step         {k, n, text, pct}    install / check step k of N
+      hook_start   {when}  hook {k, n, text}  hook_end {}
+      build_start  {pkg}   build_done {pkg}   makepkg under an AUR helper
+      mirror_error {host, file, error}        a download that failed on one mirror
+    Running totals for a progress display are kept alongside; see snapshot().
+    Per download, files[name] is (first bar seen, last bar seen, bytes), failed_files
+    the names pacman reported a failed attempt for, and mirror_skipped the hosts
+    it gave up on for the rest of the run.
+    expected is the known download size in bytes, if any (pacman only reports an
+    aggregate total when several packages download in parallel)."""
+
+    def __init__(self, expected=0, clock=time.monotonic):
+        self.expected=expected; self.clock=clock
+        self._buf=""; self._live=""; self._full=set(); self._hooks=None
+        self.dl={}; self.total=0; self.done=0; self.rate=0.0; self._sample=None
+        self.dl_count=(0,0); self.step=(0,0,0); self.mode=""; self.label=""
+        self.files={}; self.failed_files=set(); self.mirror_errors=[]; self.mirror_skipped=set()
+        self.locked=False                          # pacman said "unable to lock database"
+
+    def feed(self, text):
+        self._buf+=text; out=[]
+        while True:
+            m=re.search(r'[\r\n]',self._buf)
+            if not m or (m.group()=="\r" and m.end()==len(self._buf)): break   # "\r" may start "\r\n"
+            seg,sep=self._buf[:m.start()],self._buf[m.end()-1:m.end()+1]
+            self._buf=self._buf[m.end()+(sep=="\r\n"):]
+            self._segment(_ANSI.sub("",seg).rstrip(),sep[0]=="\n" or sep=="\r\n",out)
+        return out
+
+    def close(self):
+        """Flush a trailing partial line and close an open hook section."""
+        out=[]
+        if self._buf: self._segment(_ANSI.sub("",self._buf).rstrip(),True,out); self._buf=""
+        if self._hooks: out.append(("hook_end",{})); self._hooks=None
+        return out
+
+    def _segment(self, seg, final, out):
+        if not final:                        # a redraw: parse it, remember it, don't log it
+            if seg: self._live=seg; self._parse(seg,out,False)
+            return
+        if not seg:
+            if self._live: seg=self._live    # "bar\r\n": the last redraw is the final state
+            else: out.append(("line","")); return
+        self._live=""
+        if self._parse(seg,out,True): out.append(("line",seg))
+
+    def _parse(self, seg, out, final):
+        """Emit events for one segment; returns whether it should be logged."""
+        s=seg.strip()
+        m=_PROG_BAR.match(seg)
+        if m:
+            name,done,rate,_,pct=m.groups(); done,rate,pct=parse_size(done),parse_size(rate),int(pct)
+            t=_PROG_TOTAL.match(name.strip())
+            if t:
+                k,n=int(t.group(1)),int(t.group(2)); self.dl_count=(k,n); self.mode="download"
+                self.done=done; self.rate=rate
+                if pct: self.total=done*100//pct
+                out.append(("dl_total",{"k":k,"n":n,"done":done,"rate":rate,"pct":pct}))
+                return False
+            name=name.strip(); now=self.clock(); f=self.files.get(name)
+            self.files[name]=(f[0] if f else now,now,done)
+            if name not in self.dl: out.append(("dl_start",{"pkg":name}))
+            self.dl[name]=done; self.mode="download"; self._tick(rate)
+            out.append(("dl_progress",{"pkg":name,"done":done,"rate":rate,"pct":pct}))
+            if pct==100 and name not in self._full:
+                self._full.add(name); out.append(("dl_done",{"pkg":name,"done":done})); return True
+            return False
+        m=_PROG_STEP.match(s)
+        if m:
+            k,n,text,pct=int(m.group(1)),int(m.group(2)),m.group(3),m.group(4)
+            if self._hooks:
+                self.step=(k,n,100 if final else 0); self.mode="hook"
+                self.label=f"{self._hooks.capitalize()}-transaction hook {k}/{n}: {text}"
+                if final: out.append(("hook",{"k":k,"n":n,"text":text}))
+                return final
+            pct=int(pct) if pct is not None else 100
+            self.step=(k,n,pct); self.mode="step"; self.label=f"({k}/{n}) {text}"
+            out.append(("step",{"k":k,"n":n,"text":text,"pct":pct}))
+            if pct<100: return False
+            key=("step",k,n,text)
+            if key in self._full: return False
+            self._full.add(key); return True
+        if not final: return False
+        if s.startswith("::"):
+            if self._hooks: out.append(("hook_end",{})); self._hooks=None
+            hm=re.match(r':: Running (pre|post)-transaction hooks',s)
+            if hm: self._hooks=hm.group(1); out.append(("hook_start",{"when":self._hooks}))
+            self.label=s[2:].strip(); out.append(("phase",self.label))
+            return True
+        m=_PROG_DL.match(s)
+        if m:
+            if m.group(1) not in self.dl: self.dl[m.group(1)]=0; out.append(("dl_start",{"pkg":m.group(1)}))
+            self.mode="download"
+            return True
+        if "unable to lock database" in s: self.locked=True
+        m=_PROG_ERR.match(s)
+        if m:
+            self.mirror_errors.append((m.group(2),m.group(3))); self.failed_files.add(dl_name(m.group(1)))
+            out.append(("mirror_error",{"host":m.group(2),"file":m.group(1),"error":m.group(3)}))
+            return True
+        m=_PROG_SKIP.search(s)
+        if m: self.mirror_skipped.add(m.group(1))
+        m=_PROG_MAKE.match(s)
+        if m:
+            start=m.group(1)=="Making"; self.mode="build"
+            self.label=("Building " if start else "Built ")+m.group(2)
+            out.append(("build_start" if start else "build_done",{"pkg":m.group(2)}))
+        return True
+
+    def _tick(self, rate):
+        # Without pacman's Total bar, aggregate ourselves: bytes so far over all files,
+        # with throughput smoothed from successive samples (single-file: its own rate).
+        self.done=sum(self.dl.values()); now=self.clock()
+        if len(self.dl)==1: self.rate=rate
+        elif self._sample and now-self._sample[0]>=0.5:
+            inst=(self.done-self._sample[1])/(now-self._sample[0])
+            self.rate=inst if not self.rate else 0.3*inst+0.7*self.rate
+        if not self._sample or now-self._sample[0]>=0.5: self._sample=(now,self.done)
+
+    def snapshot(self):
+        """(label, fraction or None, detail) for a progress bar."""
+        if self.mode in ("step","hook"):
+            k,n,pct=self.step
+            return self.label,min(1.0,(k-1+pct/100)/n),""
+        if self.mode!="download": return self.label,None,""
+        total=self.total or self.expected
+        frac=min(1.0,self.done/total) if total else None
+        detail=fmt_bytes(self.done)+(f" / {fmt_bytes(total)}" if total else "")
+        if self.rate: detail+=f"  ·  {fmt_bytes(self.rate)}/s"
+        if self.rate and total and total>self.done:
+            eta=int((total-self.done)/self.rate); detail+=f"  ·  ETA {eta//60}:{eta%60:02d}"
+        k,n=self.dl_count
+        return (f"Downloading {k}/{n}" if n else f"Downloading {len(self.dl)} file{'s' if len(self.dl)!=1 else ''}"),frac,detail
+
+
+# ── Mirror benchmark ──────────────────────────────────────────────────────────
+MIRROR_PROBE_WORKERS = 8                 # mirrors probed at once
+MIRROR_PROBE_BYTES   = 4*1024*1024       # stop reading <repo>.db after this much
+MIRROR_SCORE_BYTES   = 10*1024*1024      # rank by estimated time to fetch a package this big
+_MIRROR_MARK = "# Ranked by arch-sysup"
+
+def parse_mirrorlist(text):
+    """Server URLs in a mirrorlist, active and commented-out, in file order, deduplicated.
+    Returns [{"server", "active", "country"}]; country comes from the '## Name' headers."""
+    out=[]; seen=set(); country=""
+    for ln in text.splitlines():
+        s=ln.strip()
+        m=re.match(r'^(#\s*)?Server\s*=\s*(\S+)',s)
+        if m:
+            if m.group(2) not in seen:
+                seen.add(m.group(2)); out.append({"server":m.group(2),"active":not m.group(1),"country":country})
+        elif s.startswith("## "): country=s[3:].strip()
+    return out
+
+def probe_mirror(server, timeout=5, repo="core", arch=None, max_bytes=MIRROR_PROBE_BYTES):
+    """Time one mirror: connect (TCP, plus TLS for https), time to first byte of the
+    response, and throughput reading <repo>.db. server is a mirrorlist Server value
+    with $repo/$arch placeholders. Times in seconds, rate in bytes/s."""
+    url=server.replace("$repo",repo).replace("$arch",arch or os.uname().machine).rstrip("/")+f"/{repo}.db"
+    r={"server":server,"url":url,"ok":False,"error":"","connect":None,"ttfb":None,"rate":None,"bytes":0,"lastsync":None}
+    u=urllib.parse.urlsplit(url)
+    if u.scheme not in ("http","https"): r["error"]=f"unsupported: {u.scheme}"; return r
+    conn=(http.client.HTTPSConnection if u.scheme=="https" else http.client.HTTPConnection)(u.hostname,u.port,timeout=timeout)
+    try:
+        t0=time.perf_counter(); conn.connect(); t1=time.perf_counter()
+        conn.request("GET",u.path+(f"?{u.query}" if u.query else ""),headers={"User-Agent":"arch-sysup"})
+        resp=conn.getresponse(); t2=time.perf_counter()
+        r["connect"],r["ttfb"]=t1-t0,t2-t1
+        if resp.status!=200: r["error"]=f"HTTP {resp.status}"; return r
+        n=0; deadline=t2+timeout
+        while n<max_bytes and time.perf_counter()<deadline:
+            chunk=resp.read1(65536)
+            if not chunk: break
+            n+=len(chunk)
+        dt=time.perf_counter()-t2
+        r.update(ok=n>0,bytes=n,rate=n/dt if dt>0 else None,error="" if n else "empty response")
+    except (OSError,http.client.HTTPException) as e:
+        r["error"]=str(e) or type(e).__name__
+    finally: conn.close()
+    if r["ok"] and "$repo" in server: r["lastsync"]=mirror_lastsync(server,timeout)
+    return r
+
+def mirror_lastsync(server, timeout=5):
+    """The mirror's lastsync stamp (epoch seconds, published next to the repo dirs), or None."""
+    u=urllib.parse.urlsplit(server.split("$repo")[0]+"lastsync")
+    conn=(http.client.HTTPSConnection if u.scheme=="https" else http.client.HTTPConnection)(u.hostname,u.port,timeout=timeout)
+    try:
+        conn.request("GET",u.path,headers={"User-Agent":"arch-sysup"}); resp=conn.getresponse()
+        return int(resp.read(64).strip()) if resp.status==200 else None
+    except (OSError,http.client.HTTPException,ValueError): return None
+    finally: conn.close()
+
+def mirror_score(r):
+    """Estimated seconds to fetch a MIRROR_SCORE_BYTES package; lower is better, None if the probe failed."""
+    if not r["ok"] or not r["rate"]: return None
+    return r["connect"]+r["ttfb"]+MIRROR_SCORE_BYTES/r["rate"]
+
+def rank_mirrors(results):
+    """Successful probes by score, then failures."""
+    return sorted(results,key=lambda r:(mirror_score(r) is None,mirror_score(r) or 0))
+
+def probe_mirrors(servers, workers=MIRROR_PROBE_WORKERS, timeout=5, on_result=None, stop=None, **kw):
+    """Probe servers with at most `workers` connections in flight. on_result(r) is called
+    from the worker threads as each probe finishes; setting the `stop` Event skips
+    probes that have not started. Returns rank_mirrors(results)."""
+    results=[]
+    def _one(srv):
+        if stop is not None and stop.is_set(): return None
+        r=probe_mirror(srv,timeout,**kw)
+        if on_result: on_result(r)
+        return r
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1,workers)) as ex:
+        for f in concurrent.futures.as_completed([ex.submit(_one,s) for s in servers]):
+            if f.result(): results.append(f.result())
+    return rank_mirrors(results)
+
+class MirrorHealth:
+    """Per-mirror outcome history in $XDG_STATE_HOME/arch-sysup/mirror-health.json.
+    Every observation — a benchmark probe, the throughput of a real transaction, a
+    failed download — is folded into time-decayed averages (an observation's weight
+    halves every HALF_LIFE), so rank() reflects how a mirror behaves lately rather
+    than on one lucky run. Keys are mirrorlist Server values."""
+    HALF_LIFE = 3*86400
+    STALE     = 24*3600      # lastsync older than this counts as out of date
+
+    def __init__(self, path=None):
+        self.path=path or xdg_path("state","mirror-health.json")
+        self._lock=threading.Lock()
+        try:
+            with open(self.path) as f: d=json.load(f)
+        except (OSError,ValueError): d={}
+        self.mirrors=d.get("mirrors",{}) if isinstance(d,dict) else {}
+        self.auto=bool(d.get("auto")) if isinstance(d,dict) else False
+
+    def save(self):
+        with self._lock:
+            try:
+                with open(self.path+".tmp","w") as f: json.dump({"auto":self.auto,"mirrors":self.mirrors},f)
+                os.replace(self.path+".tmp",self.path)
+            except OSError: pass
+
+    def _fold(self, rec, key, x, now):
+        a=rec.get(key)
+        if a is None: rec[key]={"v":x,"w":1.0,"t":now}; return
+        w=a["w"]*0.5**(max(0,now-a["t"])/self.HALF_LIFE)
+        a["v"]=(a["v"]*w+x)/(w+1); a["w"]=w+1; a["t"]=now
+
+    def _rec(self, server): return self.mirrors.setdefault(server,{})
+
+    def record_probe(self, r, now=None):
+        now=now or time.time()
+        with self._lock:
+            rec=self._rec(r["server"])
+            if not r["ok"]: self._fail(rec,now,r["error"]); return
+            self._fold(rec,"latency",r["connect"]+r["ttfb"],now)
+            if r["rate"]: self._fold(rec,"rate",r["rate"],now)
+            self._fold(rec,"fail",0.0,now); rec["last_ok"]=now
+            if r.get("lastsync"): rec["lastsync"]=r["lastsync"]
+
+    def record_transfer(self, server, nbytes, secs, now=None):
+        """Throughput seen during a real pacman transaction."""
+        now=now or time.time()
+        with self._lock:
+            rec=self._rec(server)
+            self._fold(rec,"rate",nbytes/secs,now); self._fold(rec,"fail",0.0,now); rec["last_ok"]=now
+
+    def record_failure(self, server, error="", now=None):
+        with self._lock: self._fail(self._rec(server),now or time.time(),error)
+
+    def _fail(self, rec, now, error):
+        self._fold(rec,"fail",1.0,now); rec["last_fail"]=now; rec["error"]=error[:120]
+
+    def score(self, server, now=None):
+        """(tier, seconds): tier 0 healthy, 1 no data yet, 2 stale lastsync, 3 failing
+        (the latest outcome was a failure, or most recent outcomes were); seconds is
+        the estimated time to fetch MIRROR_SCORE_BYTES, penalised by the failure rate."""
+        now=now or time.time(); rec=self.mirrors.get(server)
+        if not rec: return (1,0.0)
+        fail=rec.get("fail",{}).get("v",0.0)
+        lat=rec.get("latency",{}).get("v",1.0); rate=rec.get("rate",{}).get("v")
+        secs=(lat+(MIRROR_SCORE_BYTES/rate if rate else 60.0))*(1+4*fail)
+        if rec.get("last_fail",0)>rec.get("last_ok",0) or fail>0.5: return (3,secs)
+        if rec.get("lastsync") and now-rec["lastsync"]>self.STALE: return (2,secs)
+        return (0,secs) if rate else (1,secs)
+
+    def rank(self, servers, now=None):
+        """servers reordered best first; ties keep their current order."""
+        now=now or time.time()
+        return sorted(servers,key=lambda s:self.score(s,now))
+
+def rank_mirrorlist(text, best, note=""):
+    """Mirrorlist text with `best` servers as the active block on top; every other
+    Server line of the original is kept but commented out. A block from an earlier
+    ranking is replaced rather than stacked."""
+    lines=text.splitlines(); body=[]; skip=False
+    for ln in lines:
+        if ln.startswith(_MIRROR_MARK): skip=True; continue
+        if skip:
+            if ln.strip(): continue
+            skip=False; continue
+        body.append(re.sub(r'^(\s*)(Server\s*=)',r'\1#\2',ln))
+    head=[f"{_MIRROR_MARK} on {time.strftime('%Y-%m-%d %H:%M')}"+(f" — {note}" if note else "")]
+    return "\n".join(head+[f"Server = {s}" for s in best]+[""]+body)+"\n"
+
+
+# ── Privileged helper ─────────────────────────────────────────────────────────
+# One root process per session, started through sudo with --privileged-helper,
+# runs an allow-list of operations for the GUI. Requests and replies are
+# newline-delimited JSON over its stdin/stdout:
+#   {"id":n,"op":"run","argv":[...],"columns":120,"idle":false}
+#   {"id":n,"op":"write","path":...,"data":...,"backup":false}
+#   {"id":n,"op":"rm","paths":[...]}     (cached packages, or db.lck once stale)
+#   {"id":n,"op":"signal","target":m}    {"op":"quit"}
+# Each request is answered by any number of {"id":n,"out":text} and one
+# {"id":n,"exit":rc}; rejected requests get {"id":n,"error":why,"exit":126}.
+HELPER_FLAG      = "--privileged-helper"
+_HELPER_PROMPT   = "[arch-sysup] sudo password: "
+_HELPER_PKG      = re.compile(r"([A-Za-z0-9_][A-Za-z0-9_.-]*/)?[A-Za-z0-9@_+][A-Za-z0-9@._+-]*")
+_HELPER_PAC_OPS  = {"-S","-Sy","-Syu","-U","-Rns"}
+# Background download: syncs and upgrades a private copy of the dbs, never the live ones
+PREFETCH_ARGV    = ["pacman","-Syuw","--noconfirm","--dbpath",PREFETCH_DBPATH,"--logfile","/dev/null"]
+_HELPER_PAC_FLAGS= {"--noconfirm","--needed"}
+_HELPER_WRITABLE = {PACMAN_CONF,REFLECTOR_CONF,MIRRORLIST}
+
+def _in_pkg_cache(path):
+    return os.path.dirname(os.path.abspath(path))==PKG_CACHE and not os.path.islink(path)
+
+def helper_check(argv):
+    """Return None if argv is a command the helper may run as root, else why not."""
+    if not isinstance(argv,list) or not argv or not all(isinstance(a,str) for a in argv):
+        return "malformed command"
+    if argv in (["reboot"],PREFETCH_ARGV): return None
+    if argv[0]=="pacman":
+        if len(argv)<2 or argv[1] not in _HELPER_PAC_OPS: return f"pacman operation not allowed: {' '.join(argv[1:2])}"
+        for a in argv[2:]:
+            if a.startswith("-"):
+                if a not in _HELPER_PAC_FLAGS: return f"pacman option not allowed: {a}"
+            elif argv[1]=="-U":
+                if not _in_pkg_cache(a): return f"not in {PKG_CACHE}: {a}"
+            elif not _HELPER_PKG.fullmatch(a): return f"bad package name: {a}"
+        return None
+    if argv[0]=="reflector":
+        # argparse takes any unambiguous prefix (--sav, --sa) for --save and reads
+        # more arguments from @file, so normalise before counting saves.
+        saves=[]
+        for i,a in enumerate(argv[1:],1):
+            if a.startswith("@") or a=="--": return f"reflector argument not allowed: {a}"
+            opt,eq,val=a.partition("=")
+            if len(opt)>2 and "--save".startswith(opt):
+                saves.append(val if eq else argv[i+1] if i+1<len(argv) else "")
+        return None if saves==[MIRRORLIST] else f"reflector may only --save {MIRRORLIST}"
+    return f"command not allowed: {argv[0]}"
+
+def privileged_helper_main():
+    """Root side of PrivilegedHelper: serve requests until quit or EOF, then wait for
+    running jobs (an interrupted pacman transaction is worse than a late exit)."""
+    out,wlock,plock=sys.stdout.buffer,threading.Lock(),threading.Lock()
+    procs,cancelled,threads={},set(),[]
+
+    def send(**msg):
+        data=json.dumps(msg).encode()+b"\n"
+        with wlock:
+            try: out.write(data); out.flush()
+            except (OSError,ValueError): pass        # GUI gone; keep running to completion
+
+    def run(jid, argv, columns=None, idle=False):
+        # columns: run on a pty that wide, so pacman draws progress (see popen_pty)
+        if argv==PREFETCH_ARGV: seed_dbpath(PREFETCH_DBPATH)
+        env=dict(os.environ)
+        if columns:
+            env["COLUMNS"]=str(int(columns))
+            if argv[0]=="pacman": argv=argv[:2]+["--color","never"]+argv[2:]
+        if idle:
+            if shutil.which("ionice"): argv=["ionice","-c3"]+argv
+            if shutil.which("nice"):   argv=["nice","-n","19"]+argv
+        try:
+            if columns:
+                proc,master=popen_pty(argv,columns,env=env,start_new_session=True)
+                read=lambda:read_pty(master)
+            else:
+                proc=subprocess.Popen(argv,stdin=subprocess.DEVNULL,stdout=subprocess.PIPE,
+                                      stderr=subprocess.STDOUT,env=env,start_new_session=True)
+                read=lambda:proc.stdout.read1(65536)
+        except OSError as e: send(id=jid,error=str(e),exit=127); return
+        with plock:
+            procs[jid]=proc
+            if jid in cancelled: interrupt_proc_group(proc)
+        dec=codecs.getincrementaldecoder("utf-8")("replace")
+        for chunk in iter(read,b""): send(id=jid,out=dec.decode(chunk))
+        if columns: os.close(master)
+        tail=dec.decode(b"",True)
+        if tail: send(id=jid,out=tail)
+        rc=proc.wait()
+        with plock: procs.pop(jid,None)
+        send(id=jid,exit=rc)
+
+    def write(jid, path, data, backup=False):
+        if path not in _HELPER_WRITABLE: send(id=jid,error=f"not writable: {path}",exit=126); return
+        mode=os.stat(path).st_mode&0o7777 if os.path.exists(path) else 0o644
+        if backup and os.path.exists(path): shutil.copy2(path,path+".bak")
+        tmp=path+".sysup-tmp"
+        with open(tmp,"w") as f: f.write(data)
+        os.chmod(tmp,mode); os.replace(tmp,path)
+        send(id=jid,exit=0)
+
+    def rm(jid, paths):
+        if paths==[DB_LOCK]:
+            holder=db_lock_holder(DB_LOCK)
+            if holder not in (None,STALE_LOCK): send(id=jid,error=f"database lock is held by {holder}",exit=126); return
+        else:
+            bad=[p for p in paths if not isinstance(p,str) or not _in_pkg_cache(p)]
+            if bad: send(id=jid,error=f"not in {PKG_CACHE}: {bad[0]}",exit=126); return
+        failed=0
+        for p in paths:
+            try: os.unlink(p)
+            except FileNotFoundError: pass
+            except OSError as e: failed+=1; send(id=jid,out=f"✗ {p}: {e.strerror}\n")
+        send(id=jid,exit=1 if failed else 0)
+
+    def job(jid, fn, *args):
+        try: fn(jid,*args)
+        except Exception as e: send(id=jid,error=str(e),exit=1)
+
+    send(ready=True)
+    for line in sys.stdin.buffer:
+        try: req=json.loads(line)
+        except ValueError: continue          # e.g. a password sudo did not ask for
+        if not isinstance(req,dict): continue
+        op,jid=req.get("op"),req.get("id")
+        if op=="quit": break
+        if op=="signal":
+            with plock:
+                proc=procs.get(req.get("target"))
+                if proc: interrupt_proc_group(proc)
+                else: cancelled.add(req.get("target"))
+            send(id=jid,exit=0); continue
+        if op=="run":
+            why=helper_check(req.get("argv"))
+            if why: send(id=jid,error=why,exit=126); continue
+            args=(run,req["argv"],req.get("columns"),bool(req.get("idle")))
+        elif op=="write": args=(write,req.get("path"),str(req.get("data","")),bool(req.get("backup")))
+        elif op=="rm":    args=(rm,list(req.get("paths") or ()))
+        else: send(id=jid,error=f"unknown operation: {op}",exit=126); continue
+        t=threading.Thread(target=job,args=(jid,)+args); t.start(); threads.append(t)
+    for t in threads: t.join()
+    return 0
+
+class HelperJob:
+    """Popen-like handle on one helper request. stdout is the job itself:
+    read1()/read() give bytes, iterating gives text lines."""
+    def __init__(self, helper, jid):
+        self._helper,self.id=helper,jid
+        self.stdout=self; self.returncode=None
+        self._q=queue.Queue(); self._buf=b""; self._eof=False; self._done=threading.Event()
+
+    def _feed(self, data): self._q.put(data)
+    def _finish(self, rc):
+        if self._done.is_set(): return
+        self.returncode=rc; self._q.put(None); self._done.set()
+
+    def read1(self, n=65536):
+        if not self._buf and not self._eof:
+            data=self._q.get()
+            if data is None: self._eof=True
+            else: self._buf=data
+        data,self._buf=self._buf[:n],self._buf[n:]
+        return data
+    def read(self): return b"".join(iter(self.read1,b""))
+    def __iter__(self):
+        dec=codecs.getincrementaldecoder("utf-8")("replace"); pending=""
+        for chunk in iter(self.read1,b""):
+            lines=(pending+dec.decode(chunk)).splitlines(True)
+            pending=lines.pop() if lines and not lines[-1].endswith("\n") else ""
+            yield from lines
+        pending+=dec.decode(b"",True)
+        if pending: yield pending
+
+    def poll(self): return self.returncode
+    def wait(self, timeout=None):
+        if not self._done.wait(timeout): raise subprocess.TimeoutExpired(f"helper job {self.id}",timeout)
+        return self.returncode
+    def terminate(self):
+        """Interrupt the job's process group (SIGINT, then SIGTERM if it lingers)."""
+        if self.returncode is None: self._helper._request("signal",target=self.id)
+
+class PrivilegedHelper:
+    """GUI side: sudo is spawned once per session and every privileged action after
+    that is a request to the same root process. The password is written to sudo's
+    stdin once and not kept."""
+    def __init__(self):
+        self._proc=None; self._jobs={}; self._ids=itertools.count(1); self._lock=threading.Lock()
+
+    def alive(self): return self._proc is not None and self._proc.poll() is None
+
+    def start(self, pw, timeout=30):
+        """Authenticate and launch the helper. Returns None on success, else a message for the user."""
+        self.close()
+        try:
+            proc=subprocess.Popen(["sudo","-k","-S","-p",_HELPER_PROMPT,sys.executable,
+                                   os.path.abspath(__file__),HELPER_FLAG],
+                                  stdin=subprocess.PIPE,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
+        except OSError as e: return f"Could not run sudo: {e}"
+        try: proc.stdin.write(pw.encode()+b"\n"); proc.stdin.flush()
+        except OSError: pass
+        sel=selectors.DefaultSelector()
+        sel.register(proc.stdout,selectors.EVENT_READ); sel.register(proc.stderr,selectors.EVENT_READ)
+        out=err=b""; deadline=time.monotonic()+timeout; why=None
+        while why is None:
+            left=deadline-time.monotonic()
+            if left<=0: why="sudo did not respond."; break
+            for key,_ in sel.select(left):
+                data=os.read(key.fd,65536)
+                if not data: sel.unregister(key.fileobj); continue
+                if key.fileobj is proc.stdout: out+=data
+                else: err+=data
+            if b'"ready"' in out.split(b"\n",1)[0] and b"\n" in out: break
+            text=err.decode("utf-8","replace")
+            if text.count(_HELPER_PROMPT)>1 or "try again" in text: why="Incorrect password. Please try again."
+            elif not sel.get_map():
+                lines=[l for l in text.replace(_HELPER_PROMPT,"").splitlines() if l.strip()]
+                why=lines[-1].strip() if lines else "sudo failed."
+        sel.close()
+        if why:
+            try: proc.stdin.close()
+            except OSError: pass
+            try: proc.wait(5)
+            except subprocess.TimeoutExpired: proc.kill(); proc.wait()
+            return why
+        with self._lock: self._proc,self._jobs=proc,{}
+        threading.Thread(target=self._reader,args=(proc,self._jobs,out.split(b"\n",1)[1]),daemon=True).start()
+        threading.Thread(target=lambda:proc.stderr.read(),daemon=True).start()
+        return None
+
+    def _reader(self, proc, jobs, buf):
+        fd=proc.stdout.fileno()
+        while True:
+            *lines,buf=buf.split(b"\n")
+            for line in lines:
+                try: msg=json.loads(line)
+                except ValueError: continue
+                job=jobs.get(msg.get("id")) if isinstance(msg,dict) else None
+                if not job: continue
+                if "out" in msg:   job._feed(msg["out"].encode())
+                if "error" in msg: job._feed(f"✗ {msg['error']}\n".encode())
+                if "exit" in msg:
+                    with self._lock: jobs.pop(job.id,None)
+                    job._finish(msg["exit"])
+            try: chunk=os.read(fd,65536)
+            except OSError: chunk=b""
+            if not chunk: break
+            buf+=chunk
+        # Helper gone (killed, or sudo timed out a session): fail what was still running
+        with self._lock: left=list(jobs.values()); jobs.clear()
+        for job in left: job._feed("✗ privileged helper exited\n".encode()); job._finish(-1)
+
+    def _request(self, op, **kw):
+        job=HelperJob(self,next(self._ids))
+        with self._lock:
+            proc=self._proc
+            if proc is not None and proc.poll() is None:
+                self._jobs[job.id]=job
+                try:
+                    proc.stdin.write(json.dumps({"id":job.id,"op":op,**kw}).encode()+b"\n"); proc.stdin.flush()
+                    return job
+                except OSError: self._jobs.pop(job.id,None)
+        job._feed("✗ privileged helper is not running\n".encode()); job._finish(126)
+        return job
+
+    def run(self, argv, columns=None, idle=False):
+        return self._request("run",argv=list(argv),columns=columns,idle=idle)
+    def write(self, path, data, backup=False):
+        return self._request("write",path=path,data=data,backup=backup)
+    def remove_cached(self, paths):
+        return self._request("rm",paths=list(paths))
+    def remove_stale_lock(self):
+        return self._request("rm",paths=[DB_LOCK])
+
+    def close(self):
+        """Ask the helper to exit once its running jobs finish; does not wait for them."""
+        with self._lock: proc,self._proc=self._proc,None
+        if proc is None or proc.poll() is not None: return
+        try: proc.stdin.write(b'{"op":"quit"}\n'); proc.stdin.close()
+        except OSError: pass
+
+
+# ── Transaction queue ─────────────────────────────────────────────────────────
+DB_LOCK = os.path.join(PACMAN_DBPATH,"db.lck")
+
+class DbLocked(Exception):
+    """pacman refused to start because another process holds the database lock."""
+
+class DbLockStale(Exception):
+    """db.lck stayed in place with no package manager running (left by a killed pacman)."""
+
+STALE_LOCK = "stale lock — no package manager running"
+
+def db_lock_holder(lock=DB_LOCK):
+    """None while the pacman database is unlocked, else who holds it (for display)."""
+    if not os.path.exists(lock): return None
+    try: pids=[p for p in os.listdir("/proc") if p.isdigit()]
+    except OSError: pids=[]
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/comm") as f: comm=f.read().strip()
+        except OSError: continue
+        if comm in ("pacman","pamac-daemon","packagekitd"): return f"{comm} (pid {pid})"
+    return STALE_LOCK
+
+class TransactionQueue:
+    """Runs privileged jobs one at a time on a worker thread, in submission order.
+    Jobs with db=True first wait for the pacman lock to be free (an external pacman,
+    say) and are retried if pacman still reports it locked. A job submitted right
+    behind a pending job of a mergeable kind joins it instead (three queued installs
+    become one -S); a sync or update already covered by a pending one is dropped.
+    A lock that no package manager holds fails the job with DbLockStale after
+    STALE_WAIT seconds instead of blocking the queue.
+    Jobs are dicts: kind, label, run(items), items, db, state, on_done. Every on_done
+    callback given to submit() is called with the job once it is done, failed or
+    cancelled, including when the submission was merged into or covered by another job."""
+    MERGE  = {"install","remove","clean"}
+    COVERS = {"sync":("sync","update"),"update":("update",)}
+    RETRIES= 5
+    STALE_WAIT = 10
+
+    def __init__(self, on_start=None, on_wait=None, on_change=None, on_error=None, prepare=None,
+                 lock=DB_LOCK, poll=1.0):
+        nop=lambda *a:None
+        self.on_start,self.on_wait,self.on_change=on_start or nop,on_wait or nop,on_change or nop
+        self.on_error,self.prepare=on_error or nop,prepare or nop
+        self.lock,self.poll=lock,poll
+        self.pending=[]; self.current=None; self.waiting=None
+        self._cv=threading.Condition()
+        threading.Thread(target=self._work,daemon=True).start()
+
+    def submit(self, kind, label, run, items=(), db=True, on_done=None):
+        """Queue a job; returns the (possibly pre-existing) job it ended up in."""
+        return self._submit(kind,label,run,items,db,[on_done] if on_done else [])
+
+    def retry(self, job):
+        """Queue a finished job again, with the same on_done callbacks."""
+        return self._submit(job["kind"],job["label"],job["run"],job["items"],job["db"],job["on_done"])
+
+    def _submit(self, kind, label, run, items, db, done):
+        with self._cv:
+            job=next((j for j in self.pending if j["kind"] in self.COVERS.get(kind,())),None)
+            last=self.pending[-1] if self.pending else None
+            if job: pass
+            elif kind in self.MERGE and last and last["kind"]==kind:
+                last["items"]+=[i for i in items if i not in last["items"]]
+                job=last
+            else:
+                job={"kind":kind,"label":label,"run":run,"items":list(items),"db":db,"state":"queued","on_done":[]}
+                self.pending.append(job); self._cv.notify()
+            job["on_done"]+=done
+        self.on_change(); return job
+
+    def cancel(self, job):
+        with self._cv:
+            if job not in self.pending: return False
+            self.pending.remove(job); job["state"]="cancelled"
+        self._finished(job); return True
+
+    def _finished(self, job):
+        self.on_change()
+        for cb in job["on_done"]:
+            try: cb(job)
+            except Exception: pass
+
+    def busy(self): return self.current is not None or bool(self.pending)
+
+    def jobs(self):
+        with self._cv: return ([self.current] if self.current else [])+list(self.pending)
+
+    def _work(self):
+        while True:
+            with self._cv:
+                while not self.pending: self._cv.wait()
+                job=self.current=self.pending.pop(0); job["state"]="running"
+            self.on_change()
+            try:
+                self.on_start(job)
+                for attempt in range(self.RETRIES):
+                    if job["db"]: self.prepare(); self._wait_lock(job)
+                    try:
+                        with SPANS.span("tx "+job["kind"],items=len(job["items"])): job["run"](job["items"])
+                        break
+                    except DbLocked:
+                        if attempt==self.RETRIES-1: raise
+                        time.sleep(self.poll)
+                job["state"]="done"
+            except Exception as e:
+                job["state"]="failed"; self.on_error(job,e)
+            with self._cv: self.current=None; self.waiting=None
+            self._finished(job)
+
+    def _wait_lock(self, job):
+        stale=None
+        while True:
+            holder=db_lock_holder(self.lock)
+            if holder!=self.waiting:
+                self.waiting=holder
+                if holder: self.on_wait(job,holder)
+                self.on_change()
+            if holder is None: return
+            if holder!=STALE_LOCK: stale=None
+            elif stale is None: stale=time.monotonic()
+            elif time.monotonic()-stale>=self.STALE_WAIT: raise DbLockStale(self.lock)
+            time.sleep(self.poll)
+
+    @staticmethod
+    def describe(job):
+        names=[i["pkg"] if isinstance(i,dict) else os.path.basename(str(i[0] if isinstance(i,tuple) else i))
+               for i in job["items"]]
+        if not names: return job["label"]
+        return f"{job['label']} {', '.join(names[:3])}"+(f" +{len(names)-3} more" if len(names)>3 else "")
+
+
+# ── Update / stats / orphan collection (shared by the GUI and the CLI) ────────
+def update_sources(aur_helper):
+    """[(source, checker command)] for this machine."""
+    return [("official",["checkupdates"])]+([("aur",[aur_helper,"-Qua"])] if aur_helper else [])
+
+def enrich_updates(parsed, source, syncdb):
+    """(name, old, new) triples → update dicts with repo, sizes and kernel flag, looked
+    up in the sync index (one pacman query instead if it is unreadable)."""
+    if not parsed: return []
+    names=[p for p,_,_ in parsed]
+    db=syncdb.refresh()
+    meta=db.resolve(names) if db.pkgs else resolve_repos(names)
+    out=[]
+    for pkg,old,new in parsed:
+        m=meta.get(pkg,{})
+        out.append({"pkg":pkg,"old":old,"new":new,"repo":m.get("repo","AUR"),
+                    "dl_size":m.get("dl_size",0),"inst_size":m.get("inst_size",0),
+                    "kernel":is_kernel(pkg),"source":source})
+    return out
+
+def sort_updates(updates): return sorted(updates,key=lambda x:(repo_order(x["repo"]),x["pkg"].lower()))
+
+def collect_updates(aur_helper, syncdb, procs=None):
+    """Run every update source side by side. Returns (sorted updates, {source: error})."""
+    srcs=update_sources(aur_helper); updates=[]; errors={}
+    with concurrent.futures.ThreadPoolExecutor(len(srcs)) as ex:
+        futs={ex.submit(run_update_source,cmd,UPDATE_TIMEOUTS[s],procs):s for s,cmd in srcs}
+        for fut in concurrent.futures.as_completed(futs):
+            parsed,err=fut.result()
+            if err: errors[futs[fut]]=err
+            updates+=enrich_updates(parsed,futs[fut],syncdb)
+    return sort_updates(updates),errors
+
+def disk_usage(path):
+    """(used, total) bytes of the filesystem holding path, or None."""
+    try: st=os.statvfs(path)
+    except OSError: return None
+    total=st.f_blocks*st.f_frsize
+    return total-st.f_bavail*st.f_frsize,total
+
+def collect_stats(syncdb, localdb, pkgcache, logidx, root="/"):
+    """Raw system figures for System Stats and `--stats`; None where unknown. For an
+    alternate root, disk is the root's filesystem and home/kernel/uptime are None."""
+    host=root=="/"
+    sdb=syncdb.refresh(); ldb=localdb.refresh(sdb)
+    cache=pkgcache.refresh()
+    try: logidx.update(); last=logidx.last_update()
+    except Exception: last=None
+    uptime=None
+    if host:
+        try:
+            with open("/proc/uptime") as f: uptime=int(float(f.read().split()[0]))
+        except (OSError,ValueError,IndexError): pass
+    return {"packages":len(ldb.pkgs),"explicit":len(ldb.explicit()),
+            "foreign":len(ldb.foreign()) if sdb.pkgs else None,"orphans":len(ldb.orphans()),
+            "cache_bytes":cache.total if cache.mtime is not None else None,
+            "disk":{"/":disk_usage(root),"home":disk_usage(os.path.expanduser("~")) if host else None},
+            "last_update":last or None,"kernel":(run_cmd(["uname","-r"],timeout=5) or None) if host else None,
+            "uptime_secs":uptime}
+
+def collect_orphans(localdb):
+    """Orphans (-Qdt) with version and description."""
+    ldb=localdb.refresh()
+    return [{"pkg":n,"ver":ldb.pkgs[n]["ver"],"desc":ldb.pkgs[n]["desc"]} for n in ldb.orphans()]
+
+def inspect_root(spec=None, check=True, stats=False, orphans=False, aur_helper=None, offline=False):
+    """Everything the CLI reports for one system: the host when spec is None
+    (checkupdates + AUR helper), else a root_spec() root. Runs in a worker process
+    under --root, so it only returns plain data."""
+    t0=time.monotonic(); out={}; errors={}
+    if spec:
+        out.update(root=spec["root"],dbpath=spec["dbpath"],config=spec["config"])
+        if not os.path.isdir(os.path.join(spec["dbpath"],"local")):
+            # A typo'd root would otherwise look like a system with nothing to report
+            out["errors"]={"root":f"no local package database in {spec['dbpath']}"}
+            out["elapsed"]=round(time.monotonic()-t0,3); return out
+        syncdb,localdb=SyncDB(spec["dbpath"],spec["config"]),LocalDB(spec["dbpath"])
+    else: syncdb,localdb=SyncDB(),LocalDB()
+    if check:
+        if spec:
+            try:
+                sdb=syncdb if offline else SyncDB(sync_root_dbs(spec),spec["config"])
+                updates=sort_updates(enrich_updates(pending_updates(localdb,sdb,spec["ignore"]),"official",sdb))
+            except Exception as e: updates=[]; errors["official"]=str(e)
+        else:
+            updates,errs=collect_updates(aur_helper,syncdb); errors.update(errs)
+            if not errs: save_update_state(updates)
+        out["updates"]=updates
+    if stats:
+        try:
+            if spec: out["stats"]=collect_stats(syncdb,localdb,PkgCache(spec["cache"]),
+                        PacmanLogIndex(spec["log"],xdg_path("cache",f"roots/{spec['key']}/pacman-log.sqlite")),spec["root"])
+            else:    out["stats"]=collect_stats(syncdb,localdb,PkgCache(),PacmanLogIndex())
+        except Exception as e: errors["stats"]=str(e)
+    if orphans:
+        try: out["orphans"]=collect_orphans(localdb)
+        except Exception as e: errors["orphans"]=str(e)
+    out["errors"]=errors; out["elapsed"]=round(time.monotonic()-t0,3)
+    return out
+
+
+# ── Alternate roots (chroots / containers) ────────────────────────────────────
+def root_spec(text):
+    """'ROOT[:DBPATH[:CONFIG]]' → {root, dbpath, config, cache, log, ignore, key}.
+    Missing parts come from the root's own pacman.conf (DBPath, CacheDir, LogFile
+    resolved inside the root) and fall back to the standard layout under it."""
+    root,dbpath,config=(text.split(":")+["",""])[:3]
+    root=os.path.abspath(root or "/")
+    config=config or os.path.join(root,PACMAN_CONF.lstrip("/"))
+    try: opts=pacman_conf_options(config)
+    except OSError: opts={}
+    under=lambda key,default:os.path.join(root,(opts.get(key) or [default])[0].lstrip("/"))
+    dbpath=os.path.abspath(dbpath) if dbpath else under("DBPath",PACMAN_DBPATH)
+    return {"root":root,"dbpath":dbpath,"config":config,"cache":under("CacheDir",PKG_CACHE),
+            "log":under("LogFile",PACMAN_LOG),"ignore":opts.get("IgnorePkg",[]),
+            "key":hashlib.sha1(f"{root}\0{dbpath}\0{config}".encode()).hexdigest()[:12]}
+
+def pending_updates(localdb, syncdb, ignore=()):
+    """(name, old, new) for installed packages with a newer build in the sync dbs,
+    like `pacman -Qu`: IgnorePkg globs are skipped, replaces= is not followed."""
+    ldb=localdb.refresh(); sdb=syncdb.refresh(); out=[]
+    for name,r in sorted(ldb.pkgs.items()):
+        p=sdb.pkgs.get(name)
+        if p and vercmp(p["ver"],r["ver"])>0 and not any(fnmatch.fnmatchcase(name,g) for g in ignore):
+            out.append((name,r["ver"],p["ver"]))
+    return out
+
+def seed_dbpath(dbpath, src=PACMAN_DBPATH):
+    """Make dbpath a private copy of src for pacman --dbpath: local/ is a symlink to the
+    real one (read-only to -Sy/-Syuw), sync dbs are copied once with their mtimes so
+    the first -Sy only downloads repos that changed. A db.lck left by a killed run
+    is cleared."""
+    os.makedirs(os.path.join(dbpath,"sync"),exist_ok=True)
+    local=os.path.join(dbpath,"local")
+    if not os.path.islink(local): os.symlink(os.path.join(src,"local"),local)
+    sync=os.path.join(src,"sync")
+    for f in (os.listdir(sync) if os.path.isdir(sync) else ()):
+        dst=os.path.join(dbpath,"sync",f)
+        if f.endswith(".db") and not os.path.exists(dst): shutil.copy2(os.path.join(sync,f),dst)
+    lock=os.path.join(dbpath,"db.lck")
+    if db_lock_holder(lock)==STALE_LOCK: os.unlink(lock)
+
+def sync_root_dbs(spec, timeout=UPDATE_TIMEOUTS["official"]):
+    """checkupdates for a root: refresh a private copy of its sync dbs (local/ is
+    symlinked, so the root is never written) with fakeroot pacman -Sy and return
+    that dbpath. The copy persists under the cache, so later sweeps only download
+    the repos that changed. Servers come from the root's pacman.conf, whose
+    Include= paths are read on the host."""
+    tmp=xdg_path("cache",f"roots/{spec['key']}/db"); seed_dbpath(tmp,spec["dbpath"])
+    if not shutil.which("fakeroot"): raise OSError("fakeroot not found (use --offline)")
+    proc=subprocess.Popen(["fakeroot","--","pacman","-Sy","--dbpath",tmp,"--config",spec["config"],
+                           "--logfile","/dev/null"],stdout=subprocess.DEVNULL,stderr=subprocess.PIPE,
+                          text=True,start_new_session=True)
+    try: _,err=proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        kill_proc_group(proc); proc.communicate()
+        raise OSError(f"db sync timed out after {timeout}s")
+    if proc.returncode:
+        raise OSError((err.strip().splitlines() or [f"pacman -Sy exited {proc.returncode}"])[-1])
+    return tmp
+
+def inspect_roots(specs, workers=0, **kw):
+    """inspect_root() for many roots at once in a process pool — db parsing is CPU-bound,
+    so threads would serialise on the GIL. A sweep takes about as long as the slowest
+    root. Results keep the input order."""
+    import multiprocessing
+    workers=max(1,min(workers or len(specs),32,len(specs)))
+    with concurrent.futures.ProcessPoolExecutor(workers,mp_context=multiprocessing.get_context("fork")) as ex:
+        futs=[ex.submit(inspect_root,s,**kw) for s in specs]
+        out=[]
+        for spec,fut in zip(specs,futs):
+            try: out.append(fut.result())
+            except Exception as e:
+                out.append({"root":spec["root"],"dbpath":spec["dbpath"],"config":spec["config"],
+                            "errors":{"worker":str(e)}})
+    return out
+
+
+# ── Headless CLI ──────────────────────────────────────────────────────────────
+# `arch-sysup --check/--stats/--orphans [--json]` runs the collectors above and
+# exits before tkinter is imported, so it is cheap enough for cron and for
+# polling many machines or containers.
+CLI_FLAGS = ("--check","--stats","--orphans","--json","--no-aur","--root","--roots-file","-h","--help")
+EXIT_OK, EXIT_ERROR, EXIT_PENDING = 0, 1, 100
+
+def cli_main(argv=None):
+    import argparse
+    ap=argparse.ArgumentParser(prog="arch-sysup",description="Arch-Sysup without the GUI.",
+        epilog=f"exit status: {EXIT_OK} nothing to do, {EXIT_PENDING} updates or orphans found, "
+               f"{EXIT_ERROR} a check failed (and nothing was found), 2 usage error")
+    ap.add_argument("--check",action="store_true",help="check for pending updates (official + AUR)")
+    ap.add_argument("--stats",action="store_true",help="package counts, cache and disk usage, last update")
+    ap.add_argument("--orphans",action="store_true",help="list orphaned packages")
+    ap.add_argument("--json",action="store_true",help="print one JSON object instead of text")
+    ap.add_argument("--no-aur",action="store_true",help="skip the AUR helper check")
+    ap.add_argument("--root",action="append",default=[],metavar="ROOT[:DBPATH[:CONFIG]]",
+                    help="inspect this chroot/container instead of the host (repeatable)")
+    ap.add_argument("--roots-file",metavar="FILE",help="more roots, one ROOT[:DBPATH[:CONFIG]] per line")
+    ap.add_argument("--jobs",type=int,default=0,metavar="N",help="worker processes for roots (default: one per root, max 32)")
+    ap.add_argument("--offline",action="store_true",
+                    help="roots: compare with each root's own sync dbs instead of refreshing a copy")
+    args=ap.parse_args(argv)
+    if not (args.check or args.stats or args.orphans): ap.error("one of --check, --stats, --orphans is required")
+    roots=list(args.root)
+    if args.roots_file:
+        try:
+            with open(args.roots_file) as f: roots+=[l.strip() for l in f if l.strip() and not l.lstrip().startswith("#")]
+        except OSError as e: ap.error(f"--roots-file: {e}")
+    what=dict(check=args.check,stats=args.stats,orphans=args.orphans)
+    t0=time.monotonic()
+    if roots:
+        results=inspect_roots([root_spec(r) for r in roots],args.jobs,offline=args.offline,**what)
+        report={"roots":results,"elapsed":round(time.monotonic()-t0,3)}
+    else:
+        results=[inspect_root(None,aur_helper=None if args.no_aur else detect_aur_helper(),**what)]
+        report=results[0]
+    if args.json: print(json.dumps(report,indent=2 if sys.stdout.isatty() else None))
+    elif roots:
+        for r in results: print(f"── {r['root']}  ({r.get('elapsed',0):.1f}s)"); _cli_print(r,r["root"]+": ")
+    else: _cli_print(report)
+    pending=any(r.get("updates") or r.get("orphans") for r in results)
+    return EXIT_PENDING if pending else EXIT_ERROR if any(r["errors"] for r in results) else EXIT_OK
+
+def _cli_print(out, where=""):
+    for u in out.get("updates",()):
+        print(f"{u['pkg']} {u['old']} -> {u['new']}  [{u['repo']}]"+("  (kernel)" if u["kernel"] else ""))
+    for source,err in out.get("errors",{}).items(): print(f"error: {where}{source}: {err}",file=sys.stderr)
+    st=out.get("stats")
+    if st:
+        na=lambda v,f=str:"n/a" if v is None else f(v)
+        disk=lambda d:na(d,lambda d:f"{fmt_bytes(d[0])} / {fmt_bytes(d[1])}")
+        for k,v in (("packages",st["packages"]),("explicit",st["explicit"]),("foreign",na(st["foreign"])),
+                    ("orphans",st["orphans"]),("cache",na(st["cache_bytes"],fmt_bytes)),
+                    ("disk /",disk(st["disk"]["/"])),("disk home",disk(st["disk"]["home"])),
+                    ("last update",na(st["last_update"])),("kernel",na(st["kernel"])),
+                    ("uptime",na(st["uptime_secs"],fmt_age))):
+            print(f"{k+':':<13}{v}")
+    for o in out.get("orphans",()): print(f"{o['pkg']} {o['ver']}")
+
+if __name__=="__main__":
+    if HELPER_FLAG in sys.argv[1:]: sys.exit(privileged_helper_main())
+    if any(a.split("=",1)[0] in CLI_FLAGS for a in sys.argv[1:]): sys.exit(cli_main())
+
+# Everything below is the Tk GUI
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+import tkinter.font as tkfont
+
+
 # ── Button factory ────────────────────────────────────────────────────────────
 def _make_btn(parent, text, cmd, bg_key, hover_key, fg_key="FG", state="normal"):
     def _col(k): return T[k] if not k.startswith("#") else k
@@ -166,6 +1923,137 @@ def _make_btn(parent, text, cmd, bg_key, hover_key, fg_key="FG", state="normal")
     return btn
 
 
+# ── Virtualized table ─────────────────────────────────────────────────────────
+class VirtualTable(tk.Frame):
+    """Scrollable row list drawn straight onto one canvas. Only rows inside the
+    viewport get canvas items, so a redraw costs O(visible rows) whether there
+    are ten results or ten thousand. Rows are plain dicts; selection lives in
+    `self.selected` (a set of row indices) instead of a BooleanVar per row.
+
+    Column spec keys:
+      key / text(row)   cell value (text wins)       width   chars; None = fill rest
+      font / fg         value or callable(row)       diff    other key → version diff
+      action(row)       button label (None = hide)   on_click(row) for actions
+      bg                theme key of an action button
+    Action columns are laid out from the right edge, everything else from the left."""
+    _fonts={}
+
+    def __init__(self, parent, columns, checkable=False, row_h=26, pad_left=20,
+                 row_bg=None, on_select=None, on_click=None):
+        super().__init__(parent,bg=T["BG_PANEL"])
+        self.columns=columns; self.checkable=checkable; self.row_h=row_h; self.pad_left=pad_left
+        self.row_bg=row_bg; self.on_select=on_select; self.on_click=on_click
+        self.rows=[]; self.selected=set(); self.empty=("","FG_DIM"); self._hits=[]
+        self.canvas=tk.Canvas(self,bg=T["BG_PANEL"],highlightthickness=0,bd=0,
+                              yscrollincrement=row_h,cursor="hand2" if checkable else "")
+        self.sb=ttk.Scrollbar(self,orient="vertical",command=self.yview)
+        self.canvas.configure(yscrollcommand=self.sb.set)
+        self.sb.pack(side="right",fill="y"); self.canvas.pack(side="left",fill="both",expand=True)
+        self.canvas.bind("<Configure>",lambda e:self.redraw())
+        self.canvas.bind("<Button-1>",self._click)
+
+    # ── model ──
+    def set_rows(self, rows, empty_text="", empty_fg="FG_DIM", keep_view=False):
+        self.rows=list(rows); self.selected=set(); self.empty=(empty_text,empty_fg)
+        if not keep_view: self.canvas.yview_moveto(0)
+        self.redraw()
+
+    def checked(self): return [self.rows[i] for i in sorted(self.selected)]
+    def select_all(self): self.selected=set(range(len(self.rows))); self._changed()
+    def clear_selection(self): self.selected=set(); self._changed()
+    def _changed(self):
+        self.redraw()
+        if self.on_select: self.on_select()
+
+    # ── scrolling (the app's wheel handler calls yview_scroll on the active list) ──
+    def yview(self, *args): self.canvas.yview(*args); self.redraw()
+    def yview_scroll(self, n, what): self.canvas.yview_scroll(n,what); self.redraw()
+    def retheme(self): self.config(bg=T["BG_PANEL"]); self.redraw()
+
+    # ── drawing ──
+    @classmethod
+    def _cw(cls, font):
+        if font not in cls._fonts: cls._fonts[font]=tkfont.Font(font=font).measure("0")
+        return cls._fonts[font]
+
+    @staticmethod
+    def _val(v, row):
+        v=v(row) if callable(v) else v
+        return T[v] if isinstance(v,str) and v in T else v
+
+    def redraw(self):
+        c=self.canvas; c.delete("all"); self._hits=[]
+        W,H=c.winfo_width(),c.winfo_height(); n=len(self.rows); rh=self.row_h
+        c.config(bg=T["BG_PANEL"],scrollregion=(0,0,W,max(n*rh,H)))
+        if not n:
+            if self.empty[0]: c.create_text(W//2,40,text=self.empty[0],font=MONO,fill=T[self.empty[1]])
+            return
+        top=int(c.canvasy(0))
+        for i in range(max(0,top//rh),min(n,(top+H)//rh+1)): self._draw_row(i,W)
+
+    def _draw_row(self, i, W):
+        c,r,rh=self.canvas,self.rows[i],self.row_h; y=i*rh; mid=y+rh//2
+        bg=T[self.row_bg(r,i) if self.row_bg else ("BG_ROW_ALT" if i%2==0 else "BG_PANEL")]
+        c.create_rectangle(0,y,W,y+rh,fill=bg,outline="")
+        x=self.pad_left
+        if self.checkable:
+            S=16; cy=y+(rh-S)//2
+            if i in self.selected:
+                c.create_rectangle(x,cy,x+S-1,cy+S-1,outline=T["ACCENT"],fill=T["BTN_ACCENT"])
+                c.create_line(x+3,cy+8,x+6,cy+12,fill="#ffffff",width=2)
+                c.create_line(x+6,cy+12,x+13,cy+4,fill="#ffffff",width=2)
+            else:
+                c.create_rectangle(x,cy,x+S-1,cy+S-1,outline=T["BORDER"],fill=T["BG_INPUT"])
+            x+=S+14
+        right=W-16
+        for col in self.columns:
+            if "action" not in col: continue
+            label=col["action"](r)
+            if not label: continue
+            font=col.get("font",MONO_B); w=self._cw(font)*len(label)+12
+            c.create_rectangle(right-w,y+3,right,y+rh-3,fill=self._val(col.get("bg","BTN_BG"),r),outline="")
+            c.create_text(right-w//2,mid,text=label,font=font,fill="#ffffff")
+            self._hits.append((i,right-w,right,col)); right-=w+6
+        for col in self.columns:
+            if "action" in col: continue
+            font=self._val(col.get("font",MONO),r); cw=self._cw(font)
+            width=col.get("width") or max(1,(right-x)//cw)
+            txt=str(col["text"](r) if "text" in col else r.get(col["key"],""))
+            if len(txt)>width: txt=txt[:max(1,width-1)]+"…"
+            fg=self._val(col.get("fg","FG"),r)
+            if col.get("diff"):
+                pre,suf=split_ver_diff(txt,str(r.get(col["diff"],"")))
+                if pre: c.create_text(x,mid,text=pre,font=MONO,fill=T["FG"],anchor="w")
+                if suf: c.create_text(x+cw*len(pre),mid,text=suf,font=MONO_B,fill=fg,anchor="w")
+            elif txt:
+                c.create_text(x,mid,text=txt,font=font,fill=fg,anchor="w")
+            x+=cw*width+col.get("gap",8)
+
+    def _click(self, e):
+        i=int(self.canvas.canvasy(e.y)//self.row_h)
+        if not 0<=i<len(self.rows): return
+        for hi,x0,x1,col in self._hits:
+            if hi==i and x0<=e.x<=x1: col["on_click"](self.rows[i]); return
+        if self.checkable:
+            self.selected^={i}; self._changed()
+        elif self.on_click: self.on_click(self.rows[i])
+
+def updates_table(parent, older, on_cached):
+    """The Updates tab's table (bench/sysup_bench.py times this same one). older(u):
+    cached builds of u older than the installed one, which show a ↶ Cached button;
+    on_cached(u) installs the newest of them."""
+    kfg=lambda u:"KERNEL_FG" if u["kernel"] else "FG"
+    return VirtualTable(parent,[
+        {"key":"repo","width":14,"font":MONO_SB,"fg":lambda u:repo_color(u["repo"])},
+        {"key":"pkg","width":30,"font":lambda u:MONO_B if u["kernel"] else MONO,"fg":kfg},
+        {"key":"old","width":22,"diff":"new","fg":"VER_OLD","gap":0},
+        {"text":lambda u:"→","width":3,"fg":"FG_DIM","gap":4},
+        {"key":"new","width":22,"diff":"old","fg":"VER_NEW"},
+        {"text":lambda u:"⚠ KERNEL" if u["kernel"] else "","width":10,"font":MONO_SB,"fg":"KERNEL_FG"},
+        {"action":lambda u:" ↶ Cached " if older(u) else None,"font":MONO_S,"bg":"BTN_ORANGE","on_click":on_cached}],
+        row_h=28,row_bg=lambda u,i:"KERNEL_BG" if u["kernel"] else ("BG_ROW_ALT" if i%2==0 else "BG_PANEL"))
+
+
 # ── Sudo dialog ───────────────────────────────────────────────────────────────
 class SudoDialog(tk.Toplevel):
     def __init__(self, parent, prompt="Enter sudo password:"):
@@ -194,17 +2082,122 @@ class SudoDialog(tk.Toplevel):
     def _cancel(self): self.result=None; self.destroy()
     def show_error(self,msg): self._err.config(text=msg); self._entry.delete(0,"end"); self._entry.focus_set()
 
-def verify_sudo(pw):
-    r=subprocess.run(["sudo","-S","-v"],input=pw+"\n",capture_output=True,text=True)
-    return r.returncode==0
 
-def run_sudo_cmd(pw, cmd):
-    proc=subprocess.Popen(["sudo","-S","-p",""]+cmd,
-                          stdin=subprocess.PIPE,stdout=subprocess.PIPE,
-                          stderr=subprocess.STDOUT,text=True,bufsize=1)
-    try: proc.stdin.write(pw+"\n"); proc.stdin.flush(); proc.stdin.close()
-    except BrokenPipeError: pass
-    return proc
+# ── Main-loop profiler (--profile) ────────────────────────────────────────────
+PROFILE_FLAG = "--profile"
+LAG_SLOW_MS  = 50     # a callback holding the Tk thread this long is felt as a freeze
+
+def _callback_name(f):
+    """Readable name of a Tk callback; after() callbacks are unwrapped to what they call."""
+    if getattr(f,"__qualname__","").endswith("after.<locals>.callit") and f.__closure__:
+        f=dict(zip(f.__code__.co_freevars,(c.cell_contents for c in f.__closure__))).get("func",f)
+    return getattr(f,"__qualname__",None) or type(f).__name__
+
+class LoopProfiler:
+    """Started by --profile. A heartbeat after() measures how late the Tk main loop
+    gets back to it; every Tk callback runs in a span and is timed, so a late beat is
+    blamed on the callbacks that ran in between. Traced methods called on the Tk
+    thread (the _show_* rebuilds, chart drawing, theming) run under cProfile with
+    tracemalloc counters. report() writes it all out when the window closes."""
+    BEAT_MS = 20
+    BUCKETS = (16,50,100,250,1000)
+
+    def __init__(self, path=None):
+        import cProfile, tracemalloc
+        self._cprofile,self._tm=cProfile,tracemalloc
+        self.path=path or xdg_path("state",time.strftime("profile-%Y%m%d-%H%M%S.txt"))
+        self.lags=[]; self.stalls=[]; self.callbacks={}; self.ui={}; self._depth=0
+        tracemalloc.start(); self._snap0=tracemalloc.take_snapshot()
+        self.t0=time.perf_counter()
+        self._orig=orig=tk.CallWrapper.__call__
+        def call(cw, *args):
+            name=_callback_name(cw.func)
+            if name.endswith("LoopProfiler._beat"): return orig(cw,*args)
+            t=time.perf_counter()
+            try:
+                with SPANS.span("tk "+name): return orig(cw,*args)
+            finally:
+                ms=(time.perf_counter()-t)*1000; st=self.callbacks.setdefault(name,[0,0.0,0.0,0])
+                st[0]+=1; st[1]+=ms; st[2]=max(st[2],ms); st[3]+=ms>=LAG_SLOW_MS
+        tk.CallWrapper.__call__=call
+
+    def attach(self, app):
+        self.app=app; self._last=time.perf_counter()
+        self._due=self._last+self.BEAT_MS/1000; app.after(self.BEAT_MS,self._beat)
+
+    def _beat(self):
+        now=time.perf_counter(); lag=(now-self._due)*1000; self.lags.append(lag)
+        if lag>=LAG_SLOW_MS:
+            lo,hi=self._last-SPANS.t0,now-SPANS.t0
+            blame=[s for s in SPANS.snapshot() if s["thread"]=="MainThread" and s["depth"]==0
+                   and s["end"] is not None and s["end"]>=lo and s["start"]<=hi]
+            blame.sort(key=lambda s:s["start"]-s["end"])
+            self.stalls.append({"at":now-self.t0,"lag":lag,
+                                "blame":[(s["name"],(s["end"]-s["start"])*1000) for s in blame[:3]]})
+        self._last=now; self._due=now+self.BEAT_MS/1000
+        self.app.after(self.BEAT_MS,self._beat)
+
+    def ui_call(self, name, fn, a, kw):
+        """Run one traced method on the Tk thread under this name's cProfile. Nested
+        traced calls are part of the outer one: only one profiler can be active."""
+        if self._depth: return fn(*a,**kw)
+        st=self.ui.setdefault(name,{"n":0,"ms":0.0,"max":0.0,"alloc":0,"peak":0,"prof":self._cprofile.Profile()})
+        tm=self._tm; tm.reset_peak(); m0=tm.get_traced_memory()[0]
+        self._depth+=1; t=time.perf_counter()
+        try:
+            try: st["prof"].enable()
+            except ValueError: pass   # a debugger already owns the profiling hook
+            return fn(*a,**kw)
+        finally:
+            st["prof"].disable(); ms=(time.perf_counter()-t)*1000; self._depth-=1
+            cur,peak=tm.get_traced_memory()
+            st["n"]+=1; st["ms"]+=ms; st["max"]=max(st["max"],ms)
+            st["alloc"]+=cur-m0; st["peak"]=max(st["peak"],peak-m0)
+
+    def report(self):
+        """Write the text report (and the spans as JSON next to it); returns its path."""
+        tk.CallWrapper.__call__=self._orig
+        tm=self._tm
+        snap=tm.take_snapshot().filter_traces((tm.Filter(False,tm.__file__),)); tm.stop()
+        import pstats
+        lags=sorted(self.lags); n=len(lags)
+        pct=lambda p:lags[min(n-1,int(p*n))] if n else 0.0
+        out=io.StringIO(); w=lambda s="":out.write(s+"\n")
+        w(f"arch-sysup --profile  {time.strftime('%Y-%m-%d %H:%M:%S')}  session {time.perf_counter()-self.t0:.0f}s")
+        w("(tracemalloc is on for the whole session, so absolute times run somewhat high)")
+
+        w(); w(f"── Main-loop lag  ({self.BEAT_MS} ms heartbeat, {n} beats)")
+        w(f"  p50 {pct(.5):.1f} ms   p95 {pct(.95):.1f} ms   p99 {pct(.99):.1f} ms   max {pct(1):.1f} ms")
+        for lo,hi in zip((0,)+self.BUCKETS,self.BUCKETS+(None,)):
+            k=sum(1 for l in lags if l>=lo and (hi is None or l<hi))
+            w(f"  {f'{lo}–{hi} ms' if hi else f'≥ {lo} ms':>12}  {k}")
+
+        w(); w(f"── Stalls ≥ {LAG_SLOW_MS} ms: {len(self.stalls)}  (worst 25; +seconds into the session)")
+        for s in sorted(self.stalls,key=lambda s:-s["lag"])[:25]:
+            w(f"  +{s['at']:8.1f}s {s['lag']:8.1f} ms  "
+              +(", ".join(f"{nm} {ms:.0f} ms" for nm,ms in s["blame"]) or "(no Python callback: Tcl/Tk itself)"))
+
+        w(); w("── Tk callbacks  (by total time)")
+        w(f"  {'calls':>7} {'total ms':>10} {'max ms':>9} {'≥'+str(LAG_SLOW_MS)+' ms':>7}  callback")
+        for name,(k,tot,mx,slow) in sorted(self.callbacks.items(),key=lambda kv:-kv[1][1])[:30]:
+            w(f"  {k:>7} {tot:>10.1f} {mx:>9.1f} {slow:>7}  {name}")
+
+        w(); w("── UI work on the Tk thread  (traced methods; memory from tracemalloc)")
+        w(f"  {'calls':>7} {'total ms':>10} {'max ms':>9} {'net alloc':>11} {'peak':>11}  method")
+        ranked=sorted(self.ui.items(),key=lambda kv:-kv[1]["ms"])
+        for name,st in ranked:
+            w(f"  {st['n']:>7} {st['ms']:>10.1f} {st['max']:>9.1f} {fmt_bytes(st['alloc']):>11} {fmt_bytes(st['peak']):>11}  {name}")
+        for name,st in ranked:
+            w(); w(f"── cProfile: {name}  ({st['n']} calls, {st['ms']:.0f} ms)")
+            try: pstats.Stats(st["prof"],stream=out).strip_dirs().sort_stats("cumulative").print_stats(12)
+            except TypeError: w("  (no samples)")
+
+        w(); w("── Memory growth since start  (tracemalloc, top 15 lines)")
+        for d in snap.compare_to(self._snap0,"lineno")[:15]: w(f"  {d}")
+
+        with open(self.path,"w") as f: f.write(out.getvalue())
+        with open(os.path.splitext(self.path)[0]+".spans.json","w") as f: json.dump(SPANS.export(),f)
+        return self.path
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -219,16 +2212,37 @@ class SysUpApp(tk.Tk):
         self.aur_helper   = detect_aur_helper()
         self.updates      = []
         self.kernel_found = False
-        self._sudo_pw     = None
+        self._helper      = PrivilegedHelper()
+        # Every privileged action goes through here, one at a time against the pacman lock
+        self._txq=TransactionQueue(on_start=self._tx_start,on_wait=self._tx_wait,on_error=self._tx_error,
+                                   on_change=lambda:self.after(0,self._txq_show),prepare=self._tx_prepare)
+        self._txq_table=None; self._stale_jobs=[]
         self._themed_widgets = []
+        self._syncdb      = SyncDB()
+        self._localdb     = LocalDB()
+        self._logidx      = PacmanLogIndex()
+        self._pkgcache    = PkgCache()
+        self._mirror_health=MirrorHealth()
+        self._search_idx  = None     # SearchIndex, loaded in the background
+        self._instant_job = None
+        self._instant_last= ("",None)
+        self._upd_gen     = 0        # bumped per refresh; stale source results are dropped
+        self._upd_procs   = []
+        self._upd_pending = set()
+        self._upd_errors  = {}
+        self._prefetch_proc=None     # background PREFETCH_ARGV (-Syuw on a private db copy) while prefetch is on
         self._build_ui()
-        self.after(100, self._check_updates)
+        threading.Thread(target=lambda:self._localdb.refresh(self._syncdb.refresh()),daemon=True).start()
+        threading.Thread(target=self._load_search_index,daemon=True).start()
+        threading.Thread(target=self._pkgcache.refresh,daemon=True).start()
+        self.after(100, self._startup_updates)
         self.after(200, self._refresh_stats)
 
     # ── Theme registry ────────────────────────────────────────────────────────
     def _tw(self, w, **props):
         self._themed_widgets.append((w,props)); return w
 
+    @traced
     def _apply_theme(self):
         for w,props in self._themed_widgets:
             try:
@@ -239,65 +2253,12 @@ class SysUpApp(tk.Tk):
         ttk.Style(self).configure("Vertical.TScrollbar",
             background=T["BTN_BG"],troughcolor=T["BG_PANEL"],
             arrowcolor=T["FG_DIM"],bordercolor=T["BORDER"])
-        if hasattr(self,"_check_boxes"):
-            for cb in self._check_boxes:
-                if hasattr(cb,"_redraw"): cb._redraw()
-        self._retheme_search_rows()
-        self._retheme_update_rows()
         if hasattr(self,"_stats_canvas"): self._draw_stats_charts()
         if hasattr(self,"theme_btn"):
             nm = "Light" if _current_theme=="dark" else "Dark"
             self.theme_btn.config(text=f" {T['TOGGLE_ICON']}  {nm} Mode ",fg=T["FG"],bg=T["BTN_BG"])
         self.configure(bg=T["BG"])
 
-    def _retheme_search_rows(self):
-        if not hasattr(self,"_src_row_frames"): return
-        for row,bg_key in self._src_row_frames:
-            try:
-                bg=T[bg_key]; row.config(bg=bg)
-                for ch in row.winfo_children():
-                    if isinstance(ch,tk.Canvas):
-                        ch.config(bg=bg)
-                        if hasattr(ch,"_redraw"): ch._redraw()
-                        continue
-                    try:
-                        cfg=ch.cget("fg"); ch.config(bg=bg)
-                        fm={THEMES["dark"]["FG_DIM"]:T["FG_DIM"],THEMES["light"]["FG_DIM"]:T["FG_DIM"],
-                            THEMES["dark"]["FG"]:T["FG"],THEMES["light"]["FG"]:T["FG"],
-                            THEMES["dark"]["VER_NEW"]:T["VER_NEW"],THEMES["light"]["VER_NEW"]:T["VER_NEW"]}
-                        if cfg in fm: ch.config(fg=fm[cfg])
-                        else:
-                            for rk in ("REPO_CORE","REPO_EXTRA","REPO_MULTI","REPO_CHAOT","REPO_AUR","REPO_DEF"):
-                                if cfg in (THEMES["dark"][rk],THEMES["light"][rk]):
-                                    ch.config(fg=T[rk]); break
-                    except Exception: pass
-            except Exception: pass
-
-    def _retheme_update_rows(self):
-        if not hasattr(self,"upd_rows"): return
-        for row in self.upd_rows.winfo_children():
-            try:
-                cbg=row.cget("bg")
-                if cbg in (THEMES["dark"]["KERNEL_BG"],THEMES["light"]["KERNEL_BG"]): nbg=T["KERNEL_BG"]
-                elif cbg in (THEMES["dark"]["BG_ROW_ALT"],THEMES["light"]["BG_ROW_ALT"]): nbg=T["BG_ROW_ALT"]
-                else: nbg=T["BG_PANEL"]
-                row.config(bg=nbg)
-                for ch in row.winfo_children():
-                    try:
-                        cfg=ch.cget("fg"); ch.config(bg=nbg)
-                        fm={THEMES["dark"]["FG_DIM"]:T["FG_DIM"],THEMES["light"]["FG_DIM"]:T["FG_DIM"],
-                            THEMES["dark"]["FG"]:T["FG"],THEMES["light"]["FG"]:T["FG"],
-                            THEMES["dark"]["KERNEL_FG"]:T["KERNEL_FG"],THEMES["light"]["KERNEL_FG"]:T["KERNEL_FG"],
-                            THEMES["dark"]["VER_OLD"]:T["VER_OLD"],THEMES["light"]["VER_OLD"]:T["VER_OLD"],
-                            THEMES["dark"]["VER_NEW"]:T["VER_NEW"],THEMES["light"]["VER_NEW"]:T["VER_NEW"]}
-                        if cfg in fm: ch.config(fg=fm[cfg])
-                        else:
-                            for rk in ("REPO_CORE","REPO_EXTRA","REPO_MULTI","REPO_CHAOT","REPO_AUR","REPO_DEF"):
-                                if cfg in (THEMES["dark"][rk],THEMES["light"][rk]):
-                                    ch.config(fg=T[rk]); break
-                    except Exception: pass
-            except Exception: pass
-
     def _toggle_theme(self):
         global T,_current_theme
         _current_theme="light" if _current_theme=="dark" else "dark"
@@ -318,19 +2279,22 @@ class SysUpApp(tk.Tk):
         self._tw(self.theme_btn,bg="BTN_BG",fg="FG")
         self.status_lbl=self._tw(tk.Label(hdr,text="Initialising…",font=MONO,bg=T["BG"],fg=T["FG_DIM"]),bg="BG",fg="FG_DIM")
         self.status_lbl.pack(side="right")
+        self.txq_lbl=self._tw(tk.Label(hdr,text="",font=MONO_S,bg=T["BG"],fg=T["ACCENT"],cursor="hand2"),bg="BG",fg="ACCENT")
+        self.txq_lbl.pack(side="right",padx=(0,16)); self.txq_lbl.bind("<Button-1>",lambda e:self._txq_dialog())
         self._tw(tk.Frame(self,bg=T["BORDER"],height=1),bg="BORDER").pack(fill="x")
 
         # Tab bar
         self.tab_bar=self._tw(tk.Frame(self,bg=T["BG_PANEL"]),bg="BG_PANEL")
         self.tab_bar.pack(fill="x")
         self._tab_btns={}; self._pages={}; self._active_tab=None
-        TABS=("Updates","Search & Install","Package Info","System Stats","Orphans","Repositories","Mirrors")
+        TABS=("Updates","Search & Install","Package Info","System Stats","History","Orphans","Repositories","Mirrors","Diagnostics")
         for name in TABS:
             b=tk.Label(self.tab_bar,text=name,font=MONO_B,bg=T["BG_PANEL"],fg=T["FG_DIM"],
                        padx=16,pady=10,cursor="hand2")
             b.pack(side="left")
             b.bind("<Button-1>",lambda e,n=name:self._switch_tab(n))
             self._tab_btns[name]=b; self._tw(b,bg="BG_PANEL",fg="FG_DIM")
+        self._tab_btns["Diagnostics"].pack_forget()
         self._tw(tk.Frame(self,bg=T["BORDER"],height=1),bg="BORDER").pack(fill="x")
 
         self.page_container=self._tw(tk.Frame(self,bg=T["BG"]),bg="BG")
@@ -340,13 +2304,39 @@ class SysUpApp(tk.Tk):
         self._build_search_page()
         self._build_info_page()
         self._build_stats_page()
+        self._build_history_page()
         self._build_orphans_page()
         self._build_repos_page()
         self._build_mirrors_page()
+        self._build_diag_page()
+        self.bind_all("<Control-Shift-D>",lambda e:self._toggle_diag())
 
         # Shared log
         self._tw(tk.Frame(self,bg=T["BORDER"],height=1),bg="BORDER").pack(fill="x")
         self.log_frame=self._tw(tk.Frame(self,bg=T["BG"]),bg="BG")
+        lbar=self._tw(tk.Frame(self.log_frame,bg=T["BG"]),bg="BG"); lbar.pack(fill="x",padx=8,pady=(2,2))
+        self.log_more_lbl=self._tw(tk.Label(lbar,text="⤒ Load earlier",font=MONO_S,bg=T["BG"],fg=T["ACCENT"],cursor="hand2"),
+                                   bg="BG",fg="ACCENT")
+        self.log_more_lbl.bind("<Button-1>",lambda e:self._log_load_more())
+        self.log_file_lbl=self._tw(tk.Label(lbar,text="",font=MONO_S,bg=T["BG"],fg=T["FG_DIM"]),bg="BG",fg="FG_DIM")
+        self.log_file_lbl.pack(side="left")
+        find_btn=self._tw(tk.Label(lbar,text="Find",font=MONO_S,bg=T["BTN_BG"],fg=T["FG"],cursor="hand2",padx=6),
+                          bg="BTN_BG",fg="FG")
+        find_btn.pack(side="right"); find_btn.bind("<Button-1>",lambda e:self._log_search())
+        self.log_find_var=tk.StringVar()
+        fe=tk.Entry(lbar,textvariable=self.log_find_var,font=MONO_S,bg=T["BG_INPUT"],fg=T["FG"],
+                    insertbackground=T["FG"],relief="flat",bd=0,width=22)
+        self._tw(fe,bg="BG_INPUT",fg="FG",insertbackground="FG")
+        fe.pack(side="right",padx=(0,4),ipady=2); fe.bind("<Return>",lambda e:self._log_search())
+        # Progress panel: driven by ProgressParser snapshots, shown while a command streams
+        self.prog_frame=self._tw(tk.Frame(self.log_frame,bg=T["BG"]),bg="BG")
+        self.prog_lbl=self._tw(tk.Label(self.prog_frame,text="",font=MONO_S,bg=T["BG"],fg=T["FG"],anchor="w"),bg="BG",fg="FG")
+        self.prog_lbl.pack(side="left",padx=(8,8))
+        self.prog_detail=self._tw(tk.Label(self.prog_frame,text="",font=MONO_S,bg=T["BG"],fg=T["FG_DIM"]),bg="BG",fg="FG_DIM")
+        self.prog_detail.pack(side="right",padx=(8,8))
+        self.prog_bar=self._tw(tk.Canvas(self.prog_frame,height=8,bg=T["BG_INPUT"],highlightthickness=0,bd=0),bg="BG_INPUT")
+        self.prog_bar.pack(side="left",fill="x",expand=True)
+        self._prog=None; self._prog_shown=None
         self.log_text=tk.Text(self.log_frame,bg=T["BG_LOG"],fg=T["FG"],
                               font=("Monospace",9),relief="flat",bd=0,
                               state="disabled",wrap="word",height=10)
@@ -354,6 +2344,12 @@ class SysUpApp(tk.Tk):
         lsb=ttk.Scrollbar(self.log_frame,command=self.log_text.yview)
         self.log_text.configure(yscrollcommand=lsb.set)
         lsb.pack(side="right",fill="y"); self.log_text.pack(fill="both",expand=True)
+        # Reader threads only append here; _log_flush drains it on the Tk thread
+        self._log_q=collections.deque(); self._log_tags={"c_def"}
+        self._log_file=None; self._log_path=None; self._log_first=0
+        for k in ("FG","FG_DIM","ACCENT","VER_NEW","VER_OLD","KERNEL_FG"):
+            for th in THEMES.values(): self._log_tag(th[k])
+        self.after(LOG_FLUSH_MS,self._log_flush)
         self._setup_scroll()
         self._switch_tab("Updates")
 
@@ -369,12 +2365,15 @@ class SysUpApp(tk.Tk):
         if name=="Repositories": self._reload_repos_view()
         if name=="Orphans":      self._scan_orphans()
         if name=="System Stats": self._refresh_stats()
+        if name=="History":      self._load_history()
         if name=="Mirrors":      self._load_mirror_conf()
+        if name=="Diagnostics" and not self._diag_job: self._diag_tick()
 
     def _setup_scroll(self):
-        _canvases={"Updates":"upd_canvas","Search & Install":"src_canvas",
-                   "Package Info":"info_canvas","Orphans":"orph_canvas",
-                   "Repositories":"repo_canvas","Mirrors":"mir_canvas"}
+        _canvases={"Updates":"upd_table","Search & Install":"src_table",
+                   "Package Info":"info_canvas","History":"hist_table","Orphans":"orph_table",
+                   "Repositories":"repo_table","Mirrors":"mir_canvas",
+                   "Diagnostics":"diag_table"}
         def _get():
             c=_canvases.get(self._active_tab)
             return getattr(self,c,None) if c else None
@@ -402,19 +2401,20 @@ class SysUpApp(tk.Tk):
         for i,(l,w) in enumerate([("Repo",14),("Package",30),("Old Version",22),("New Version",22)]):
             self._tw(tk.Label(hdr,text=l,font=MONO_SB,bg=T["BG_HDR"],fg=T["FG_DIM"],width=w,anchor="w"),
                      bg="BG_HDR",fg="FG_DIM").pack(side="left",padx=(20 if i==0 else 4,0))
-        self.upd_canvas=self._tw(tk.Canvas(outer,bg=T["BG_PANEL"],highlightthickness=0,bd=0),bg="BG_PANEL")
-        usb=ttk.Scrollbar(outer,orient="vertical",command=self.upd_canvas.yview)
-        self.upd_canvas.configure(yscrollcommand=usb.set)
-        usb.pack(side="right",fill="y"); self.upd_canvas.pack(side="left",fill="both",expand=True)
-        self.upd_rows=self._tw(tk.Frame(self.upd_canvas,bg=T["BG_PANEL"]),bg="BG_PANEL")
-        self.upd_win=self.upd_canvas.create_window((0,0),window=self.upd_rows,anchor="nw")
-        self.upd_rows.bind("<Configure>",lambda e:self.upd_canvas.configure(scrollregion=self.upd_canvas.bbox("all")))
-        self.upd_canvas.bind("<Configure>",lambda e:self.upd_canvas.itemconfig(self.upd_win,width=e.width))
+        older=lambda u:self._pkgcache.older(u["pkg"],u["old"])
+        self.upd_table=self._tw(updates_table(outer,older,lambda u:self._install_cached(u["pkg"],older(u)[0])))
+        self.upd_table.pack(fill="both",expand=True)
         self._tw(tk.Frame(page,bg=T["BORDER"],height=1),bg="BORDER").pack(fill="x")
         bot=self._tw(tk.Frame(page,bg=T["BG"],pady=10),bg="BG"); bot.pack(fill="x",padx=24)
         self.count_lbl=self._tw(tk.Label(bot,text="",font=MONO,bg=T["BG"],fg=T["FG_DIM"]),bg="BG",fg="FG_DIM")
         self.count_lbl.pack(side="left")
         br=self._tw(tk.Frame(bot,bg=T["BG"]),bg="BG"); br.pack(side="right")
+        self.prefetch_var=tk.BooleanVar(value=False)
+        self.prefetch_chk=self._make_checkbox(br,self.prefetch_var,"BG",self._toggle_prefetch)
+        self.prefetch_chk.pack(side="left",padx=(0,4))
+        self._tw(tk.Label(br,text="Prefetch",font=MONO_S,bg=T["BG"],fg=T["FG_DIM"]),bg="BG",fg="FG_DIM").pack(side="left")
+        self.prefetch_lbl=self._tw(tk.Label(br,text="",font=MONO_S,bg=T["BG"],fg=T["FG_DIM"]),bg="BG",fg="FG_DIM")
+        self.prefetch_lbl.pack(side="left",padx=(6,16))
         self.sync_btn=_make_btn(br,"💾  Sync DBs",self._run_sync,"BTN_BG","BTN_HOVER")
         self.sync_btn.pack(side="left",padx=(0,8)); self._tw(self.sync_btn)
         self.refresh_btn=_make_btn(br,"↻  Refresh",self._check_updates,"BTN_BG","BTN_HOVER")
@@ -422,160 +2422,183 @@ class SysUpApp(tk.Tk):
         self.update_btn=_make_btn(br,"▶  Update All",self._run_updates,"BTN_GREEN","BTN_GREEN_H","#ffffff",state="disabled")
         self.update_btn.pack(side="left"); self._tw(self.update_btn)
 
-    def _check_updates(self):
+    def _startup_updates(self):
+        """Show the notifier's (or our last) saved check instantly, then only re-run
+        the expensive check if the pacman dbs changed since or the state is stale."""
+        st=load_update_state()
+        if not st or any(not u.get("repo") for u in st["updates"]):
+            self._check_updates(); return
+        self.updates=sorted([{**u,"dl_size":u.get("dl_size") or 0,"inst_size":0,"kernel":is_kernel(u["pkg"])}
+                             for u in st["updates"]],key=lambda x:(repo_order(x["repo"]),x["pkg"].lower()))
+        self.kernel_found=any(u["kernel"] for u in self.updates)
+        self._upd_pending=set(); self._upd_errors={}
+        if self.updates: self._show_updates()
+        else: self._show_up_to_date()
+        age=time.time()-st.get("timestamp",0)
+        if st.get("fingerprint")!=db_fingerprint() or age>UPDATE_STATE_MAX_AGE:
+            self._check_updates(keep=True)
+        else:
+            self._set_status(f"Checked {int(age//60)} min ago — databases unchanged",T["VER_NEW"])
+
+    def _check_updates(self, keep=False):
+        """keep=True leaves the current list on screen and swaps each source's rows
+        in as its fresh result arrives (used when revalidating cached state)."""
         self.update_btn.disable(); self.refresh_btn.disable()
-        for w in self.upd_rows.winfo_children(): w.destroy()
+        if not keep: self.upd_table.set_rows([])
         self._hide_log(); self._set_status("Checking for updates…",T["ACCENT"])
-        self.count_lbl.config(text="")
-        threading.Thread(target=self._fetch_updates,daemon=True).start()
-
-    def _fetch_updates(self):
-        self.after(0, lambda: self._set_status("Checking for updates...", T["ACCENT"]))
-        parsed = []
-
-        # 1. Get official updates using 'checkupdates'
-        try:
-            off_res = subprocess.run(["checkupdates"], capture_output=True, text=True)
-            if off_res.returncode == 0:
-                for line in off_res.stdout.splitlines():
-                    parts = line.split()
-                    if len(parts) >= 4: # Format: pkgname oldver -> newver
-                        parsed.append((parts[0], parts[1], parts[3]))
-        except Exception:
-            pass
-
-        # 2. Get AUR updates using helper
-        if self.aur_helper:
-            try:
-                aur_res = subprocess.run([self.aur_helper, "-Qua"], capture_output=True, text=True)
-                if aur_res.returncode == 0:
-                    for line in aur_res.stdout.splitlines():
-                        parts = line.split()
-                        if len(parts) >= 4:
-                            parsed.append((parts[0], parts[1], parts[3]))
-            except Exception:
-                pass
-
-        if not parsed:
-            self.after(0, self._show_up_to_date)
-            return
-
-        # Move metadata processing to the background thread to avoid UI freeze
-        self._process_parsed_updates_bg(parsed)
-
-    def _process_parsed_updates_bg(self, parsed):
-        self.after(0, lambda: self._set_status(f"Processing {len(parsed)} updates...", T["ACCENT"]))
-
-        updates = []
-        kernel_found = False
-
-        for pkg, old, new in parsed:
-            # Determine repo
-            repo = "AUR"
-            si = run_cmd(["pacman", "-Si", pkg])
-            if si:
-                m = re.search(r'^Repository\s*:\s*(.+)', si, re.M)
-                if m: repo = m.group(1).strip()
+        if not keep: self.count_lbl.config(text="")
+        # Cancel whatever the previous refresh still has running
+        self._upd_gen+=1
+        for proc in list(self._upd_procs): kill_proc_group(proc)
+        if not keep: self.updates=[]; self.kernel_found=False
+        self._upd_errors={}
+        self._upd_pending={"official"}|({"aur"} if self.aur_helper else set())
+        self._fetch_updates(self._upd_gen)
+
+    def _fetch_updates(self, gen):
+        # Official and AUR checks are independent and mostly waiting on the network,
+        # so run them side by side and render each list as soon as it lands. One
+        # "fetch_updates" span covers the whole check, until the last list is merged.
+        def _run():
+            with SPANS.span("fetch_updates") as span:
+                def _source(source, cmd):
+                    with SPANS.adopt(span): self._fetch_update_source(gen,source,cmd)
+                threads=[threading.Thread(target=_source,args=sc,daemon=True) for sc in update_sources(self.aur_helper)]
+                for t in threads: t.start()
+                for t in threads: t.join()
+        threading.Thread(target=_run,daemon=True).start()
 
-            kernel = is_kernel(pkg)
-            if kernel: kernel_found = True
+    @traced
+    def _fetch_update_source(self, gen, source, cmd):
+        parsed,err=run_update_source(cmd,UPDATE_TIMEOUTS[source],self._upd_procs)
+        if gen!=self._upd_gen: return
+        if err: self._upd_errors[source]=err
+        # Move metadata processing to the background thread to avoid UI freeze,
+        # then wait until the Tk thread has merged the result
+        self._process_parsed_updates_bg(parsed,gen,source).wait()
 
-            updates.append({"pkg": pkg, "old": old, "new": new, "repo": repo, "kernel": kernel})
+    @traced
+    def _process_parsed_updates_bg(self, parsed, gen=None, source="official"):
+        if parsed:
+            self.after(0, lambda: self._set_status(f"Processing {len(parsed)} updates...", T["ACCENT"]))
 
-        updates.sort(key=lambda x: (repo_order(x["repo"]), x["pkg"].lower()))
+        updates = enrich_updates(parsed, source, self._syncdb)
+        merged = threading.Event()
 
         def _done():
-            self.updates = updates
-            self.kernel_found = kernel_found
-            self._show_updates()
+            try: _merge()
+            finally: merged.set()
+
+        def _merge():
+            if gen is not None and gen != self._upd_gen: return
+            self._upd_pending.discard(source)
+            seen = {u["pkg"] for u in updates}
+            self.updates = sort_updates([u for u in self.updates if u.get("source") != source and u["pkg"] not in seen]
+                                        + updates)
+            self.kernel_found = any(u["kernel"] for u in self.updates)
+            if not self._upd_pending and not self._upd_errors:
+                save_update_state(self.updates)
+            if self.updates: self._show_updates()
+            elif not self._upd_pending: self._show_up_to_date()
 
         self.after(0, _done)
+        return merged
 
+    @traced
     def _show_up_to_date(self):
-        self._set_status("System is up to date ✓",T["VER_NEW"])
+        self.upd_table.set_rows([])
+        if self._upd_errors:
+            self._set_status("No updates found — "+"; ".join(f"{k} check {v}" for k,v in self._upd_errors.items()),T["VER_OLD"])
+        else:
+            self._set_status("System is up to date ✓",T["VER_NEW"])
         self.count_lbl.config(text="No updates available",fg=T["FG_DIM"])
         self.refresh_btn.enable()
 
+    @traced
     def _show_updates(self):
-        for w in self.upd_rows.winfo_children(): w.destroy()
-        for i,u in enumerate(self.updates):
-            bg=T["KERNEL_BG"] if u["kernel"] else (T["BG_ROW_ALT"] if i%2==0 else T["BG_PANEL"])
-            row=tk.Frame(self.upd_rows,bg=bg,pady=5); row.pack(fill="x")
-            tk.Label(row,text=u["repo"],font=MONO_SB,bg=bg,fg=repo_color(u["repo"]),width=14,anchor="w").pack(side="left",padx=(20,4))
-            tk.Label(row,text=u["pkg"],font=MONO_B if u["kernel"] else MONO,bg=bg,
-                     fg=T["KERNEL_FG"] if u["kernel"] else T["FG"],width=30,anchor="w").pack(side="left",padx=(0,4))
-            self._ver_label(row,bg,u["old"],u["new"],T["VER_OLD"])
-            tk.Label(row,text="→",font=MONO,bg=bg,fg=T["FG_DIM"]).pack(side="left",padx=6)
-            self._ver_label(row,bg,u["new"],u["old"],T["VER_NEW"])
-            if u["kernel"]:
-                tk.Label(row,text="⚠ KERNEL",font=MONO_SB,bg=bg,fg=T["KERNEL_FG"]).pack(side="left",padx=(12,0))
-        c=len(self.updates)
-        self.count_lbl.config(text=f"{c} package{'s' if c!=1 else ''} to update"+("  ⚠ kernel update!" if self.kernel_found else ""),fg=T["FG_DIM"])
-        self._set_status("Ready",T["VER_NEW"]); self.update_btn.enable(); self.refresh_btn.enable()
-
-    def _ver_label(self, parent, bg, ver, other, diff_col):
-        prefix,suffix=split_ver_diff(ver,other)
-        f=tk.Frame(parent,bg=bg); f.pack(side="left")
-        if prefix: tk.Label(f,text=prefix,font=MONO,bg=bg,fg=T["FG"]).pack(side="left")
-        if suffix: tk.Label(f,text=suffix,font=MONO_B,bg=bg,fg=diff_col).pack(side="left")
+        self.upd_table.set_rows(self.updates,keep_view=True)
+        c=len(self.updates); dl=sum(u.get("dl_size",0) for u in self.updates)
+        self.count_lbl.config(text=f"{c} package{'s' if c!=1 else ''} to update"+(f"  ({fmt_bytes(dl)} download)" if dl else "")
+                              +("  ⚠ kernel update!" if self.kernel_found else ""),fg=T["FG_DIM"])
+        if self._upd_pending:
+            self._set_status(f"Checking {' + '.join(sorted(self._upd_pending))} updates…",T["ACCENT"]); return
+        if self._upd_errors:
+            self._set_status("Ready — "+"; ".join(f"{k} check {v}" for k,v in self._upd_errors.items()),T["VER_OLD"])
+        else:
+            self._set_status("Ready",T["VER_NEW"])
+        self.update_btn.enable(); self.refresh_btn.enable()
+        self._maybe_prefetch()
+
+    # ── Prefetch: download pending official updates ahead of "Update All" ──
+    def _toggle_prefetch(self):
+        if not self.prefetch_var.get():
+            self._stop_prefetch(); self.prefetch_lbl.config(text=""); return
+        if not self._ensure_helper("Enter your sudo password to download updates in the background:"):
+            self.prefetch_var.set(False); self.prefetch_chk._redraw(); return
+        self._maybe_prefetch()
+
+    def _maybe_prefetch(self):
+        if not self.prefetch_var.get() or self._prefetch_proc or self._upd_pending or self._txq.busy() or not self._helper.alive(): return
+        n=sum(1 for u in self.updates if u["repo"].lower() not in ("aur","chaotic-aur"))
+        if not n: return
+        self.prefetch_lbl.config(text=f"downloading {n}…",fg=T["ACCENT"])
+        # Against a private copy of the sync dbs: moving the live ones forward without
+        # installing would leave later -S/-U jobs running a partial upgrade.
+        # idle=True: the helper runs it under ionice -c3 / nice -n 19, out of the user's way
+        self._prefetch_proc=proc=self._helper.run(PREFETCH_ARGV,idle=True)
+        def _run():
+            tail=collections.deque(proc.stdout,maxlen=5); rc=proc.wait()
+            def _done():
+                if self._prefetch_proc is not proc:             # stopped for Update All / toggled off
+                    if self._prefetch_proc is None: self.prefetch_lbl.config(text="")
+                    return
+                self._prefetch_proc=None
+                if rc==0: self.prefetch_lbl.config(text=f"✓ {n} cached",fg=T["VER_NEW"])
+                else:
+                    self.prefetch_lbl.config(text="prefetch failed",fg=T["VER_OLD"])
+                    for line in tail: self._log_line(line.rstrip(),T["FG_DIM"])
+            self.after(0,_done)
+        threading.Thread(target=_run,daemon=True).start()
+
+    def _stop_prefetch(self):
+        """Stop a running prefetch and wait for it. The helper sends SIGINT to its process
+        group, the one signal (with SIGHUP) on which pacman removes db.lck."""
+        proc,self._prefetch_proc=self._prefetch_proc,None
+        if not proc or proc.poll() is not None: return
+        try: proc.terminate(); proc.wait(timeout=15)
+        except (OSError,subprocess.TimeoutExpired): pass
 
     def _run_sync(self):
-        if self._sudo_pw and verify_sudo(self._sudo_pw):
-            pw = self._sudo_pw
-        else:
-            dlg = SudoDialog(self, "Enter your sudo password to sync databases:")
-            self.wait_window(dlg)
-            if dlg.result is None: return
-            if not verify_sudo(dlg.result):
-                dlg2 = SudoDialog(self, "Enter your sudo password to sync databases:")
-                dlg2.show_error("Incorrect password. Please try again.")
-                self.wait_window(dlg2)
-                if not dlg2.result or not verify_sudo(dlg2.result): return
-                pw = dlg2.result
-            else:
-                pw = dlg.result
-        self._sudo_pw = pw
+        if not self._ensure_helper("Enter your sudo password to sync databases:"): return
         self.sync_btn.disable(); self.refresh_btn.disable(); self.update_btn.disable()
-        self._show_log(); self._log_clear()
-        self._log_line("Syncing package databases (pacman -Sy)...", T["ACCENT"])
-        threading.Thread(target=self._do_sync, daemon=True).start()
+        self._txq.submit("sync","Sync package databases (pacman -Sy)",lambda _:self._do_sync(),
+                         on_done=self._tx_controls(self.sync_btn,self.refresh_btn,retry=self.update_btn))
 
     def _do_sync(self):
-        self._stream_sudo(["pacman", "-Sy"])
+        self._stream_sudo(["pacman", "-Sy"],mirrors=True)
         self._log_line("✓ Sync complete.", T["VER_NEW"])
-        self.after(0, self.sync_btn.enable)
-        self.after(0, self.refresh_btn.enable)
         self.after(200, self._check_updates)
 
     def _run_updates(self):
         if not self.updates: return
-        # Collect the sudo password on the main thread (avoids deadlock from
+        # Authenticate on the main thread (avoids deadlock from
         # blocking done.wait() while the Tk event loop also needs the main thread)
-        if self._sudo_pw and verify_sudo(self._sudo_pw):
-            pw = self._sudo_pw
-        else:
-            dlg = SudoDialog(self, "Enter your sudo password to begin updating:")
-            self.wait_window(dlg)
-            if dlg.result is None: return
-            if not verify_sudo(dlg.result):
-                dlg2 = SudoDialog(self, "Enter your sudo password to begin updating:")
-                dlg2.show_error("Incorrect password. Please try again.")
-                self.wait_window(dlg2)
-                if not dlg2.result or not verify_sudo(dlg2.result): return
-                pw = dlg2.result
-            else:
-                pw = dlg.result
-        self._sudo_pw = pw
+        if not self._ensure_helper("Enter your sudo password to begin updating:"): return
         self.update_btn.disable(); self.refresh_btn.disable()
-        self._show_log(); self._log_clear()
-        threading.Thread(target=self._do_updates,daemon=True).start()
+        self._txq.submit("update","Update system",lambda _:self._do_updates(),
+                         on_done=self._tx_controls(self.refresh_btn,retry=self.update_btn))
 
     def _do_updates(self):
         has_off=any(u["repo"].lower() in ("core","extra","multilib") for u in self.updates)
         has_aur=any(u["repo"].lower() in ("chaotic-aur","aur") for u in self.updates)
         if has_off:
             self._log_line("── Official repo updates ──────────────────",T["FG_DIM"])
-            self._stream_sudo(["pacman","-Syu","--noconfirm"])
+            # Expected download for the progress panel: whatever isn't already in the cache
+            cache=self._pkgcache.refresh()
+            dl=sum(u.get("dl_size",0) for u in self.updates if u["repo"].lower() not in ("aur","chaotic-aur")
+                   and not any(f["ver"]==u["new"] for f in cache.versions(u["pkg"])))
+            if self._mirror_health.auto: self._rerank_mirrors()
+            self._stream_sudo(["pacman","-Syu","--noconfirm"],dl,mirrors=True)
         if has_aur and self.aur_helper:
             self._log_line("── AUR / chaotic-aur updates ──────────────",T["FG_DIM"])
             self._stream_cmd([self.aur_helper,"-Sua","--noconfirm"])
@@ -584,7 +2607,6 @@ class SysUpApp(tk.Tk):
             self._log_line("⚠  Kernel updated — reboot required!",T["KERNEL_FG"])
             self.after(0,self._prompt_reboot)
         else:
-            self.after(0,self.refresh_btn.enable)
             self.after(600,self._check_updates)
 
     # ══════════════════════════════════════════════════════════════════════════
@@ -614,6 +2636,9 @@ class SysUpApp(tk.Tk):
         self.search_var.trace_add("write",self._on_search_var_change)
         self.search_btn=_make_btn(sb,"  Search  ",self._do_search,"BTN_ACCENT","BTN_ACCT_H","#ffffff")
         self.search_btn.pack(side="left",padx=(0,6)); self._tw(self.search_btn)
+        self.search_instant=tk.BooleanVar(value=True)
+        self._make_checkbox(sb,self.search_instant,"BG",lambda:None).pack(side="left",padx=(8,4))
+        self._tw(tk.Label(sb,text="Instant",font=MONO_S,bg=T["BG"],fg=T["FG_DIM"]),bg="BG",fg="FG_DIM").pack(side="left")
         self.search_status=self._tw(tk.Label(sb,text="",font=MONO_S,bg=T["BG"],fg=T["FG_DIM"]),bg="BG",fg="FG_DIM")
         self.search_status.pack(side="left",padx=(10,0))
         sf=self._tw(tk.Frame(sb,bg=T["BG"]),bg="BG"); sf.pack(side="right")
@@ -628,14 +2653,14 @@ class SysUpApp(tk.Tk):
         for i,(l,w) in enumerate([("Repo",13),("Package",26),("Version",18),("Description",50)]):
             self._tw(tk.Label(hdr,text=l,font=MONO_SB,bg=T["BG_HDR"],fg=T["FG_DIM"],width=w,anchor="w"),
                      bg="BG_HDR",fg="FG_DIM").pack(side="left",padx=(8 if i==0 else 4,0))
-        self.src_canvas=self._tw(tk.Canvas(ro,bg=T["BG_PANEL"],highlightthickness=0,bd=0),bg="BG_PANEL")
-        ssb=ttk.Scrollbar(ro,orient="vertical",command=self.src_canvas.yview)
-        self.src_canvas.configure(yscrollcommand=ssb.set)
-        ssb.pack(side="right",fill="y"); self.src_canvas.pack(side="left",fill="both",expand=True)
-        self.src_rows=self._tw(tk.Frame(self.src_canvas,bg=T["BG_PANEL"]),bg="BG_PANEL")
-        self.src_win=self.src_canvas.create_window((0,0),window=self.src_rows,anchor="nw")
-        self.src_rows.bind("<Configure>",lambda e:self.src_canvas.configure(scrollregion=self.src_canvas.bbox("all")))
-        self.src_canvas.bind("<Configure>",lambda e:self.src_canvas.itemconfig(self.src_win,width=e.width))
+        self.src_table=self._tw(VirtualTable(ro,[
+            {"key":"repo","width":13,"font":MONO_SB,"fg":lambda r:repo_color(r["repo"])},
+            {"text":lambda r:r["pkg"]+("  ✓" if r["installed"] else ""),"width":26,
+             "fg":lambda r:"VER_NEW" if r["installed"] else "FG"},
+            {"key":"ver","width":18,"fg":"FG_DIM"},
+            {"key":"desc","width":None,"font":MONO_S,"fg":"FG_DIM"}],
+            checkable=True,pad_left=14,on_select=self._update_action_bar))
+        self.src_table.pack(fill="both",expand=True)
         self._tw(tk.Frame(page,bg=T["BORDER"],height=1),bg="BORDER").pack(fill="x")
         ab=self._tw(tk.Frame(page,bg=T["BG"],pady=10),bg="BG"); ab.pack(fill="x",padx=24)
         self.selection_lbl=self._tw(tk.Label(ab,text="No packages selected",font=MONO,bg=T["BG"],fg=T["FG_DIM"]),bg="BG",fg="FG_DIM")
@@ -645,16 +2670,45 @@ class SysUpApp(tk.Tk):
         self.uninstall_btn.pack(side="left",padx=(0,8)); self._tw(self.uninstall_btn)
         self.install_btn=_make_btn(bg2,"  ▶ Install Selected  ",self._install_selected,"BTN_GREEN","BTN_GREEN_H","#ffffff",state="disabled")
         self.install_btn.pack(side="left"); self._tw(self.install_btn)
-        self._search_results=[]; self._check_vars=[]; self._check_boxes=[]; self._src_row_frames=[]
+        self._search_results=[]
 
     def _on_search_var_change(self,*_):
         if self.search_var.get(): self.clear_btn.pack(side="left",padx=(0,4))
         else: self.clear_btn.pack_forget()
+        # Debounce: filter the local index once typing pauses; AUR waits for Enter
+        if self._instant_job: self.after_cancel(self._instant_job)
+        self._instant_job=self.after(150,self._instant_search) if self.search_instant.get() else None
+
+    def _load_search_index(self):
+        try: self._search_idx=SearchIndex.load_or_build(self._syncdb)
+        except Exception: self._search_idx=None
+
+    def _instant_search(self):
+        self._instant_job=None
+        q=self.search_var.get().strip(); idx=self._search_idx
+        if len(q)<2:
+            self._instant_last=("",None); return
+        if idx is None:
+            self.search_status.config(text="Indexing…",fg=T["FG_DIM"]); return
+        if idx.key!=self._syncdb.fingerprint():   # dbs re-synced since the index was built
+            self._search_idx=None; self._instant_last=("",None)
+            threading.Thread(target=self._load_search_index,daemon=True).start()
+            self.search_status.config(text="Indexing…",fg=T["FG_DIM"]); return
+        # Typing more characters can only narrow the result, so refine the last hit set
+        prev_q,prev=self._instant_last
+        ids=idx.search(q,prev if prev is not None and q.startswith(prev_q) else None)
+        self._instant_last=(q,ids)
+        inst=self._localdb.pkgs
+        self._search_results=[{"repo":idx.pkgs[i][3],"pkg":idx.pkgs[i][0],"ver":idx.pkgs[i][1],
+                               "desc":idx.pkgs[i][2],"installed":idx.pkgs[i][0] in inst,"source":"pacman"}
+                              for i in ids]
+        self._show_search_results()
+        if self._search_results and self.aur_helper:
+            self.search_status.config(text=self.search_status.cget("text")+"  (Enter adds AUR)")
 
     def _clear_search(self):
         self.search_var.set("")
-        for w in self.src_rows.winfo_children(): w.destroy()
-        self._search_results=[]; self._check_vars=[]; self._check_boxes=[]; self._src_row_frames=[]
+        self._search_results=[]; self.src_table.set_rows([])
         self.search_status.config(text=""); self.selall_btn.disable(); self.clrall_btn.disable()
         self._update_action_bar(); self.search_entry.focus_set()
 
@@ -677,77 +2731,49 @@ class SysUpApp(tk.Tk):
     def _do_search(self):
         query=self.search_var.get().strip()
         if not query: return
+        if self._instant_job: self.after_cancel(self._instant_job); self._instant_job=None
         self.search_btn.disable(); self.selall_btn.disable(); self.clrall_btn.disable()
         self.search_status.config(text="Searching…",fg=T["ACCENT"])
-        for w in self.src_rows.winfo_children(): w.destroy()
-        self._search_results=[]; self._check_vars=[]; self._check_boxes=[]; self._src_row_frames=[]
+        self._search_results=[]; self.src_table.set_rows([])
         self._update_action_bar()
         threading.Thread(target=self._fetch_search,args=(query,),daemon=True).start()
 
+    @traced
     def _fetch_search(self, query):
         results,seen=[],set()
-        def parse_ss(text,source):
-            lines=text.splitlines(); i=0
-            while i<len(lines):
-                line=lines[i].rstrip()
-                if line and not line.startswith(" ") and "/" in line:
-                    m=re.match(r'^([^/]+)/(\S+)\s+(\S+)(.*)',line)
-                    if m:
-                        repo,pkg,ver=m.group(1),m.group(2),m.group(3)
-                        desc=lines[i+1].strip() if i+1<len(lines) else ""
-                        installed="[installed]" in m.group(4)
-                        if pkg not in seen:
-                            seen.add(pkg)
-                            results.append({"repo":repo,"pkg":pkg,"ver":ver,
-                                            "desc":desc,"installed":installed,"source":source})
-                    i+=2
-                else: i+=1
-        r1=subprocess.run(["pacman","-Ss",query],capture_output=True,text=True,timeout=30)
-        parse_ss(r1.stdout,"pacman")
+        db=self._syncdb.refresh()
+        if db.pkgs:
+            inst=self._localdb.refresh().pkgs
+            for p in db.search(query):
+                seen.add(p["name"])
+                results.append({"repo":p["repo"],"pkg":p["name"],"ver":p["ver"],"desc":p["desc"],
+                                "installed":p["name"] in inst,"source":"pacman"})
+        else:
+            with SPANS.span("pacman",argv=f"pacman -Ss {query}"):
+                r1=subprocess.run(["pacman","-Ss",query],capture_output=True,text=True,timeout=30)
+                SPANS.note(1,len(r1.stdout))
+            results+=parse_search_output(r1.stdout,"pacman",seen)
         if self.aur_helper:
-            r2=subprocess.run([self.aur_helper,"-Ss","--aur",query],capture_output=True,text=True,timeout=60)
-            parse_ss(r2.stdout,"aur")
+            with SPANS.span(self.aur_helper,argv=f"{self.aur_helper} -Ss --aur {query}"):
+                r2=subprocess.run([self.aur_helper,"-Ss","--aur",query],capture_output=True,text=True,timeout=60)
+                SPANS.note(1,len(r2.stdout))
+            results+=parse_search_output(r2.stdout,"aur",seen)
         results.sort(key=lambda x:(repo_order(x["repo"]),x["pkg"].lower()))
         self._search_results=results; self.after(0,self._show_search_results)
 
+    @traced
     def _show_search_results(self):
-        for w in self.src_rows.winfo_children(): w.destroy()
-        self._check_vars=[]; self._check_boxes=[]; self._src_row_frames=[]
+        self.src_table.set_rows(self._search_results,"No packages found.")
         if not self._search_results:
-            self._tw(tk.Label(self.src_rows,text="No packages found.",font=MONO,bg=T["BG_PANEL"],fg=T["FG_DIM"]),
-                     bg="BG_PANEL",fg="FG_DIM").pack(pady=30)
             self.search_status.config(text="No results",fg=T["FG_DIM"]); self.search_btn.enable(); return
         n=len(self._search_results)
         self.search_status.config(text=f"{n} result{'s' if n!=1 else ''}",fg=T["VER_NEW"])
-        for i,r in enumerate(self._search_results):
-            bk="BG_ROW_ALT" if i%2==0 else "BG_PANEL"
-            var=tk.BooleanVar(value=False); self._check_vars.append(var)
-            row=tk.Frame(self.src_rows,bg=T[bk],pady=4,cursor="hand2"); row.pack(fill="x")
-            self._src_row_frames.append((row,bk))
-            cb=self._make_checkbox(row,var,bk,self._update_action_bar)
-            cb.pack(side="left",padx=(14,6),pady=2); self._check_boxes.append(cb)
-            tk.Label(row,text=r["repo"],font=MONO_SB,bg=T[bk],fg=repo_color(r["repo"]),width=13,anchor="w").pack(side="left",padx=(0,4))
-            sfx="  ✓" if r["installed"] else ""
-            tk.Label(row,text=r["pkg"]+sfx,font=MONO,bg=T[bk],fg=T["VER_NEW"] if r["installed"] else T["FG"],width=26,anchor="w").pack(side="left",padx=(0,4))
-            tk.Label(row,text=r["ver"],font=MONO,bg=T[bk],fg=T["FG_DIM"],width=18,anchor="w").pack(side="left",padx=(0,4))
-            desc=r["desc"][:78]+("…" if len(r["desc"])>78 else "")
-            tk.Label(row,text=desc,font=MONO_S,bg=T[bk],fg=T["FG_DIM"],anchor="w").pack(side="left",padx=(0,10),fill="x",expand=True)
-            def _rc(e,v=var,c=cb): v.set(not v.get()); c._redraw(); self._update_action_bar()
-            for ch in [row]+list(row.winfo_children()):
-                if ch is not cb: ch.bind("<Button-1>",_rc)
         self.search_btn.enable(); self.selall_btn.enable(); self.clrall_btn.enable()
         self._update_action_bar()
 
-    def _select_all(self):
-        for v,cb in zip(self._check_vars,self._check_boxes): v.set(True); cb._redraw()
-        self._update_action_bar()
-
-    def _clear_all(self):
-        for v,cb in zip(self._check_vars,self._check_boxes): v.set(False); cb._redraw()
-        self._update_action_bar()
-
-    def _get_checked(self):
-        return [r for r,v in zip(self._search_results,self._check_vars) if v.get()]
+    def _select_all(self): self.src_table.select_all()
+    def _clear_all(self):  self.src_table.clear_selection()
+    def _get_checked(self): return self.src_table.checked()
 
     def _update_action_bar(self):
         checked=self._get_checked()
@@ -769,22 +2795,10 @@ class SysUpApp(tk.Tk):
         to_inst=[r for r in self._get_checked() if not r["installed"]]
         if not to_inst: return
         prompt=f"Enter your sudo password to install:\n{', '.join(r['pkg'] for r in to_inst)}"
-        if self._sudo_pw and verify_sudo(self._sudo_pw):
-            pw=self._sudo_pw
-        else:
-            dlg=SudoDialog(self,prompt); self.wait_window(dlg)
-            if dlg.result is None: return
-            if not verify_sudo(dlg.result):
-                dlg2=SudoDialog(self,prompt); dlg2.show_error("Incorrect password. Please try again.")
-                self.wait_window(dlg2)
-                if not dlg2.result or not verify_sudo(dlg2.result): return
-                pw=dlg2.result
-            else:
-                pw=dlg.result
-        self._sudo_pw=pw; self.install_btn.disable(); self.uninstall_btn.disable()
-        self._show_log(); self._log_clear()
-        self._log_line(f"Installing {len(to_inst)} package(s)…",T["ACCENT"])
-        threading.Thread(target=self._do_install,args=(to_inst,),daemon=True).start()
+        if not self._ensure_helper(prompt): return
+        # Queued installs merge into one transaction; clear the selection so more can follow
+        self._txq.submit("install","Install",self._do_install,to_inst)
+        self._clear_all(); self._update_action_bar()
 
     def _do_install(self, pkgs):
         off=[r for r in pkgs if r["source"]!="aur"]
@@ -808,29 +2822,18 @@ class SysUpApp(tk.Tk):
                                    f"Remove {len(names)} package(s)?\n\n"+"\n".join(f"  • {n}" for n in names),
                                    parent=self): return
         prompt=f"Enter your sudo password to remove:\n{', '.join(names)}"
-        if self._sudo_pw and verify_sudo(self._sudo_pw):
-            pw=self._sudo_pw
-        else:
-            dlg=SudoDialog(self,prompt); self.wait_window(dlg)
-            if dlg.result is None: return
-            if not verify_sudo(dlg.result):
-                dlg2=SudoDialog(self,prompt); dlg2.show_error("Incorrect password. Please try again.")
-                self.wait_window(dlg2)
-                if not dlg2.result or not verify_sudo(dlg2.result): return
-                pw=dlg2.result
-            else:
-                pw=dlg.result
-        self._sudo_pw=pw; self.install_btn.disable(); self.uninstall_btn.disable()
-        self._show_log(); self._log_clear()
-        self._log_line(f"Removing {len(names)} package(s)…",T["VER_OLD"])
-        threading.Thread(target=self._do_uninstall,args=(names,),daemon=True).start()
+        if not self._ensure_helper(prompt): return
+        self._txq.submit("remove","Remove",self._do_uninstall,names)
+        self._clear_all(); self._update_action_bar()
 
     def _do_uninstall(self, names):
+        """Queue worker for every "remove" job, from Search & Install and Orphans alike."""
         self._log_line(f"pacman -Rns {' '.join(names)}",T["FG_DIM"])
         self._stream_sudo(["pacman","-Rns","--noconfirm"]+names)
         self._log_line("✓ Removal complete.",T["VER_NEW"])
         q=self.search_var.get().strip()
         if q: self.after(200,lambda:threading.Thread(target=self._fetch_search,args=(q,),daemon=True).start())
+        if self._active_tab=="Orphans": self.after(500,self._scan_orphans)
 
     # ══════════════════════════════════════════════════════════════════════════
     # PACKAGE INFO TAB
@@ -898,32 +2901,28 @@ class SysUpApp(tk.Tk):
         self.files_text.config(state="normal"); self.files_text.delete("1.0","end"); self.files_text.config(state="disabled")
         threading.Thread(target=self._fetch_pkg_info,args=(pkg,),daemon=True).start()
 
+    @traced
     def _fetch_pkg_info(self, pkg):
         # Try local first, then sync db
-        local=run_cmd(["pacman","-Qi",pkg],timeout=10)
-        sync =run_cmd(["pacman","-Si",pkg],timeout=10)
-        raw  = local or sync
-        files=run_cmd(["pacman","-Ql",pkg],timeout=10) if local else ""
-
-        if not raw:
+        ldb  =self._localdb.refresh()
+        local=ldb.info(pkg)
+        files="\n".join(f"{pkg} {f}" for f in ldb.files(pkg)) if local else ""   # `pacman -Ql` layout
+        sdb  =self._syncdb.refresh()
+        info =local or sdb.info(pkg)
+        if not info and not sdb.pkgs:
+            # Sync index empty or unreadable: ask pacman
+            info=(parse_pacman_info(run_cmd(["pacman","-Si",pkg])) or [{}])[0]
+
+        if not info and self.aur_helper:
             # Try AUR
-            if self.aur_helper:
-                raw=run_cmd([self.aur_helper,"-Si","--aur",pkg],timeout=20)
-
-        info={}
-        if raw:
-            for line in raw.splitlines():
-                m=re.match(r'^([^:]+?)\s*:\s*(.+)',line)
-                if m:
-                    key=m.group(1).strip(); val=m.group(2).strip()
-                    if key not in info: info[key]=val
-                elif info:
-                    last=list(info.keys())[-1]
-                    info[last]+=" "+line.strip()
-
-        self.after(0,lambda:self._show_pkg_info(pkg,info,files,bool(local)))
-
-    def _show_pkg_info(self, pkg, info, files, installed):
+            raw=run_cmd([self.aur_helper,"-Si","--aur",pkg],timeout=20)
+            info=(parse_pacman_info(raw) or [{}])[0]
+
+        cached=self._pkgcache.refresh().versions(info.get("Name",pkg) if info else pkg)
+        self.after(0,lambda:self._show_pkg_info(pkg,info,files,bool(local),cached))
+
+    @traced
+    def _show_pkg_info(self, pkg, info, files, installed, cached=()):
         for w in self.info_frame.winfo_children(): w.destroy()
 
         if not info:
@@ -944,7 +2943,8 @@ class SysUpApp(tk.Tk):
               ("Packager","Packager"),("Build Date","Build Date"),
               ("Install Date","Install Date"),("Install Reason","Install Reason"),
               ("Depends On","Depends On"),("Optional Deps","Optional Deps"),
-              ("Required By","Required By"),("Conflicts With","Conflicts With")]
+              ("Required By","Required By"),("Optional For","Optional For"),
+              ("Conflicts With","Conflicts With")]
 
         for label,key in SHOW:
             val=info.get(key,"") or info.get(label,"")
@@ -956,6 +2956,26 @@ class SysUpApp(tk.Tk):
             tk.Label(row,text=val,font=MONO,bg=T["BG_PANEL"],fg=T["FG"],
                      anchor="nw",justify="left",wraplength=480).pack(side="left",fill="x",expand=True)
 
+        # Cached builds in /var/cache/pacman/pkg — one click rolls back (or reinstalls)
+        if cached:
+            cur=info.get("Version","") if installed else ""
+            tk.Label(self.info_frame,text=f"Cached Versions ({len(cached)})",font=MONO_SB,bg=T["BG_PANEL"],
+                     fg=T["FG_DIM"],anchor="w").pack(fill="x",padx=20,pady=(12,2))
+            for c in cached:
+                row=tk.Frame(self.info_frame,bg=T["BG_PANEL"],pady=2); row.pack(fill="x",padx=20)
+                cmp=vercmp(c["ver"],cur) if cur else 1
+                tk.Label(row,text=c["ver"],font=MONO,bg=T["BG_PANEL"],width=24,anchor="w",
+                         fg=T["VER_OLD"] if cmp<0 else T["VER_NEW"] if cmp>0 else T["FG"]).pack(side="left")
+                tk.Label(row,text=fmt_bytes(c["size"]),font=MONO_S,bg=T["BG_PANEL"],fg=T["FG_DIM"],
+                         width=12,anchor="w").pack(side="left")
+                if cmp==0:
+                    tk.Label(row,text="installed",font=MONO_S,bg=T["BG_PANEL"],fg=T["FG_DIM"]).pack(side="left")
+                    continue
+                label=" ↶ Downgrade " if cmp<0 else (" ↑ Upgrade " if cur else " Install ")
+                _make_btn(row,label,lambda c=c:self._install_cached(info.get("Name",pkg),c),
+                          "BTN_ORANGE" if cmp<0 else "BTN_ACCENT","BTN_ORNG_H" if cmp<0 else "BTN_ACCT_H",
+                          "#ffffff").pack(side="left")
+
         self.info_status.config(text=f"Found: {info.get('Name',pkg)}",fg=T["VER_NEW"])
         self.info_btn.enable()
 
@@ -970,6 +2990,20 @@ class SysUpApp(tk.Tk):
             self.files_text.insert("end","(not installed — no file list available)")
         self.files_text.config(state="disabled")
 
+    def _install_cached(self, name, entry):
+        """Install one cached build with `pacman -U` — the rollback path after a bad update."""
+        if not messagebox.askyesno("Install Cached Package",
+                                   f"Install {name} {entry['ver']} from the package cache?\n\n  {entry['path']}",
+                                   parent=self): return
+        prompt=f"Enter sudo password to install {name} {entry['ver']}:"
+        if not self._ensure_helper(prompt): return
+        def _run(_):
+            self._stream_sudo(["pacman","-U","--noconfirm",entry["path"]])
+            self._log_line("✓ Done.",T["VER_NEW"])
+            self.after(600,self._check_updates)
+            if self._active_tab=="Package Info": self.after(0,self._do_pkg_info)
+        self._txq.submit("cached",f"Install {name} {entry['ver']} from cache",_run)
+
     # ══════════════════════════════════════════════════════════════════════════
     # SYSTEM STATS TAB
     # ══════════════════════════════════════════════════════════════════════════
@@ -981,6 +3015,8 @@ class SysUpApp(tk.Tk):
         self._tw(tk.Label(top,text="System Statistics",font=MONO_B,bg=T["BG"],fg=T["FG"]),bg="BG",fg="FG").pack(side="left")
         self.stats_refresh_btn=_make_btn(top,"↻  Refresh Stats",self._refresh_stats,"BTN_BG","BTN_HOVER")
         self.stats_refresh_btn.pack(side="right"); self._tw(self.stats_refresh_btn)
+        self.stats_clean_btn=_make_btn(top,"🧹  Clean Cache…",self._cache_clean_dialog,"BTN_BG","BTN_HOVER")
+        self.stats_clean_btn.pack(side="right",padx=(0,8)); self._tw(self.stats_clean_btn)
         self._tw(tk.Frame(page,bg=T["BORDER"],height=1),bg="BORDER").pack(fill="x")
 
         # Two-column grid of stat cards + chart canvas
@@ -997,7 +3033,7 @@ class SysUpApp(tk.Tk):
         self._stats_canvas=tk.Canvas(self._stats_right,bg=T["BG"],highlightthickness=0,bd=0)
         self._tw(self._stats_canvas,bg="BG")
         self._stats_canvas.pack(fill="both",expand=True)
-        self._stats_canvas.bind("<Configure>",lambda e:self._draw_stats_charts())
+        self._stats_canvas.bind("<Configure>",self._on_stats_resize); self._stats_job=None
 
         # Placeholder labels — will be populated by _refresh_stats
         self._stat_labels={}
@@ -1025,87 +3061,106 @@ class SysUpApp(tk.Tk):
 
         self._chart_data={}  # populated by _refresh_stats
 
+    def _cache_clean_dialog(self):
+        """Preview and run a paccache-style prune of the package cache."""
+        dlg=tk.Toplevel(self); dlg.title("Clean Package Cache")
+        dlg.configure(bg=T["BG"]); dlg.geometry("760x520"); dlg.minsize(560,360)
+        dlg.transient(self)
+        tk.Label(dlg,text="Clean Package Cache",font=MONO_B,bg=T["BG"],fg=T["ACCENT"]).pack(pady=(16,2))
+        tk.Label(dlg,text=f"Keeps the newest builds of each package in {self._pkgcache.path} and deletes the rest.",
+                 font=MONO_S,bg=T["BG"],fg=T["FG_DIM"]).pack(pady=(0,10))
+        opts=tk.Frame(dlg,bg=T["BG"]); opts.pack(fill="x",padx=20)
+        tk.Label(opts,text="Keep newest:",font=MONO_S,bg=T["BG"],fg=T["FG"]).pack(side="left")
+        keep=tk.IntVar(value=3); unused=tk.BooleanVar(value=False)
+        tk.Spinbox(opts,from_=0,to=20,width=3,textvariable=keep,font=MONO,bg=T["BG_INPUT"],fg=T["FG"],
+                   buttonbackground=T["BTN_BG"],relief="flat",command=lambda:_preview()).pack(side="left",padx=(6,20))
+        self._make_checkbox(opts,unused,"BG",lambda:_preview()).pack(side="left",padx=(0,6))
+        tk.Label(opts,text="Also remove all builds of uninstalled packages",font=MONO_S,bg=T["BG"],fg=T["FG"]).pack(side="left")
+        summary=tk.Label(dlg,text="Scanning cache…",font=MONO_SB,bg=T["BG"],fg=T["ACCENT"],anchor="w")
+        summary.pack(fill="x",padx=20,pady=(10,4))
+        table=VirtualTable(dlg,[
+            {"key":"name","width":30,"fg":"FG"},
+            {"key":"ver","width":22,"fg":"VER_OLD"},
+            {"text":lambda f:fmt_bytes(f["size"]),"width":None,"font":MONO_S,"fg":"FG_DIM"}])
+        table.pack(fill="both",expand=True,padx=20)
+        br=tk.Frame(dlg,bg=T["BG"]); br.pack(pady=12)
+        del_btn=_make_btn(br,"  🗑  Delete  ",lambda:_delete(),"BTN_RED","BTN_RED_H","#ffffff",state="disabled")
+        del_btn.pack(side="left",padx=(0,10))
+        _make_btn(br,"  Close  ",dlg.destroy,"BTN_BG","BTN_HOVER").pack(side="left")
+        plan=[None]; installed=[None]
+
+        def _preview():
+            try: k=max(0,int(keep.get()))
+            except (tk.TclError,ValueError): return
+            if installed[0] is None: return
+            t0=time.perf_counter()
+            builds,paths,size=self._pkgcache.plan(k,installed[0] if unused.get() else None)
+            plan[0]=(paths,size)
+            table.set_rows(sorted(builds,key=lambda f:(f["name"],f["path"])),"✓  Nothing to remove.","VER_NEW")
+            summary.config(text=f"{len(builds)} package file{'s' if len(builds)!=1 else ''} · {fmt_bytes(size)} to free"
+                                f"   ({(time.perf_counter()-t0)*1000:.0f} ms)",
+                           fg=T["VER_OLD"] if builds else T["VER_NEW"])
+            if builds: del_btn.enable()
+            else:      del_btn.disable()
+        keep.trace_add("write",lambda *_:_preview())
+
+        def _scan():
+            self._pkgcache.refresh(); pk=set(self._localdb.refresh().pkgs)
+            def _ready(): installed[0]=pk; _preview()
+            try: dlg.after(0,_ready)
+            except tk.TclError: pass
+        threading.Thread(target=_scan,daemon=True).start()
+
+        def _delete():
+            paths,size=plan[0]
+            if not messagebox.askyesno("Clean Package Cache",
+                                       f"Delete {len(paths)} file(s) and free {fmt_bytes(size)}?",parent=dlg): return
+            prompt="Enter sudo password to clean the package cache:"
+            if not self._ensure_helper(prompt): return
+            dlg.destroy()
+            self._txq.submit("clean","Clean package cache",self._do_clean_cache,paths)
+
+    def _do_clean_cache(self, paths):
+        # One request: the helper unlinks the whole batch itself (cache files only)
+        size=0
+        for p in paths:
+            try: size+=os.path.getsize(p)
+            except OSError: pass
+        self._log_line(f"Removing {len(paths)} cached file(s)…",T["VER_OLD"])
+        job=self._helper.remove_cached(paths)
+        for line in job: self._log_line(line.rstrip(),T["VER_OLD"])
+        if job.wait()==0: self._log_line(f"✓ Freed {fmt_bytes(size)}.",T["VER_NEW"])
+        self.after(0,self._refresh_stats)
+
     def _refresh_stats(self):
         if not hasattr(self,"_stat_labels"): return
         threading.Thread(target=self._fetch_stats,daemon=True).start()
 
+    @traced
     def _fetch_stats(self):
-        data={}
-
-        # Package counts
-        all_pkgs=run_cmd(["pacman","-Q"])
-        pkg_lines=[l for l in all_pkgs.splitlines() if l.strip()]
-        data["pkg_count"]=str(len(pkg_lines))
-
-        exp=run_cmd(["pacman","-Qe"])
-        data["explicit"]=str(len([l for l in exp.splitlines() if l.strip()]))
-
-        if self.aur_helper:
-            aur_out=run_cmd([self.aur_helper,"-Qm"])
-            data["aur_count"]=str(len([l for l in aur_out.splitlines() if l.strip()]))
-        else:
-            data["aur_count"]="n/a"
-
-        orph=run_cmd(["pacman","-Qdtq"])
-        data["orphans"]=str(len([l for l in orph.splitlines() if l.strip()])) if orph else "0"
-
-        # Cache size
-        cache_dir="/var/cache/pacman/pkg"
-        try:
-            total=sum(os.path.getsize(os.path.join(cache_dir,f))
-                      for f in os.listdir(cache_dir)
-                      if os.path.isfile(os.path.join(cache_dir,f)))
-            data["disk_pkg"]=fmt_bytes(total)
-        except Exception:
-            data["disk_pkg"]="n/a"
-
-        # Disk usage
-        def disk_info(path):
-            try:
-                st=os.statvfs(path)
-                total=st.f_blocks*st.f_frsize
-                free=st.f_bavail*st.f_frsize
-                used=total-free
-                pct=int(used/total*100) if total else 0
-                return f"{fmt_bytes(used)} / {fmt_bytes(total)}  ({pct}%)", used, total
-            except Exception:
-                return "n/a",0,1
-
-        root_txt,root_used,root_total=disk_info("/")
-        home_path=os.path.expanduser("~")
-        home_txt,home_used,home_total=disk_info(home_path)
-        data["disk_root"]=root_txt; data["disk_home"]=home_txt
-
-        # Chart data
-        data["_chart_root"]=(root_used,root_total)
-        data["_chart_home"]=(home_used,home_total)
-
-        # Last update
-        try:
-            with open("/var/log/pacman.log") as f:
-                lines=[l for l in f if "starting full system upgrade" in l.lower() or "upgraded " in l.lower()]
-            if lines:
-                last=lines[-1]
-                m=re.match(r'\[(\d{4}-\d{2}-\d{2})',last)
-                data["last_upd"]=m.group(1) if m else "Unknown"
-            else:
-                data["last_upd"]="No record"
-        except Exception:
-            data["last_upd"]="Unknown"
-
-        # Kernel
-        data["kernel_ver"]=run_cmd(["uname","-r"],timeout=5) or "Unknown"
-
-        # Uptime
-        try:
-            with open("/proc/uptime") as f: secs=float(f.read().split()[0])
-            d,rem=divmod(int(secs),86400); h,rem=divmod(rem,3600); m2=rem//60
-            data["uptime"]=f"{d}d {h}h {m2}m" if d else f"{h}h {m2}m"
-        except Exception:
-            data["uptime"]="Unknown"
-
+        # Same collector as `arch-sysup --stats`; the local db, cache catalog and
+        # pacman.log index only rescan what changed since the last refresh
+        st=collect_stats(self._syncdb,self._localdb,self._pkgcache,self._logidx)
+        na=lambda v,f=str:"n/a" if v is None else f(v)
+        def disk(d):
+            if not d: return "n/a",0,1
+            used,total=d
+            return f"{fmt_bytes(used)} / {fmt_bytes(total)}  ({int(used/total*100) if total else 0}%)",used,total
+        root_txt,root_used,root_total=disk(st["disk"]["/"])
+        home_txt,home_used,home_total=disk(st["disk"]["home"])
+        up=st["uptime_secs"]
+        if up is not None:
+            d,rem=divmod(up,86400); h,rem=divmod(rem,3600)
+            up=f"{d}d {h}h {rem//60}m" if d else f"{h}h {rem//60}m"
+        data={"pkg_count":str(st["packages"]),"explicit":str(st["explicit"]),"aur_count":na(st["foreign"]),
+              "orphans":str(st["orphans"]),"disk_pkg":na(st["cache_bytes"],fmt_bytes),
+              "disk_root":root_txt,"disk_home":home_txt,
+              "_chart_root":(root_used,root_total),"_chart_home":(home_used,home_total),
+              "last_upd":st["last_update"][:10] if st["last_update"] else "No record",
+              "kernel_ver":st["kernel"] or "Unknown","uptime":up or "Unknown"}
         self.after(0,lambda:self._show_stats(data))
 
+    @traced
     def _show_stats(self, data):
         mapping={"pkg_count":("pkg_count","FG"),"explicit":("explicit","VER_NEW"),
                  "aur_count":("aur_count","REPO_AUR"),"orphans":("orphans","VER_OLD" if data.get("orphans","0")!="0" else "FG"),
@@ -1118,7 +3173,14 @@ class SysUpApp(tk.Tk):
         self._chart_data=data
         self._draw_stats_charts()
 
+    def _on_stats_resize(self, _):
+        # Dragging the window edge sends a burst of <Configure>s; draw once it settles
+        if self._stats_job: self.after_cancel(self._stats_job)
+        self._stats_job=self.after(60,self._draw_stats_charts)
+
+    @traced
     def _draw_stats_charts(self):
+        self._stats_job=None
         if not hasattr(self,"_stats_canvas") or not self._chart_data: return
         c=self._stats_canvas; c.delete("all")
         W=c.winfo_width(); H=c.winfo_height()
@@ -1176,6 +3238,98 @@ class SysUpApp(tk.Tk):
                 c.create_text(lx+14,ly,text=f"{lbl}: {n}",font=MONO_S,fill=T["FG_DIM"],anchor="nw")
                 lx+=max(120,len(lbl)*9+50)
 
+    # ══════════════════════════════════════════════════════════════════════════
+    # HISTORY TAB
+    # ══════════════════════════════════════════════════════════════════════════
+    _HIST_FG={"installed":"VER_NEW","removed":"VER_OLD","upgraded":"ACCENT",
+              "downgraded":"BTN_ORANGE","reinstalled":"FG_DIM"}
+
+    def _build_history_page(self):
+        page=self._tw(tk.Frame(self.page_container,bg=T["BG"]),bg="BG")
+        self._pages["History"]=page
+
+        top=self._tw(tk.Frame(page,bg=T["BG"],pady=12),bg="BG"); top.pack(fill="x",padx=24)
+        def _entry(label, var, width):
+            self._tw(tk.Label(top,text=label,font=MONO_B,bg=T["BG"],fg=T["FG"]),bg="BG",fg="FG").pack(side="left",padx=(0,6))
+            w=self._tw(tk.Frame(top,bg=T["BG_INPUT"],highlightthickness=1,
+                                highlightbackground=T["BORDER"],highlightcolor=T["ACCENT"]),
+                       bg="BG_INPUT",highlightbackground="BORDER",highlightcolor="ACCENT")
+            w.pack(side="left",padx=(0,14))
+            e=tk.Entry(w,textvariable=var,font=MONO,bg=T["BG_INPUT"],fg=T["FG"],
+                       insertbackground=T["FG"],relief="flat",bd=0,width=width)
+            self._tw(e,bg="BG_INPUT",fg="FG",insertbackground="FG")
+            e.pack(side="left",ipady=5,padx=6); e.bind("<Return>",lambda e:self._load_history())
+            var.trace_add("write",self._on_hist_filter_change)
+        self.hist_pkg_var=tk.StringVar(); self.hist_from_var=tk.StringVar(); self.hist_to_var=tk.StringVar()
+        _entry("Package:",self.hist_pkg_var,22)
+        _entry("From:",self.hist_from_var,11)
+        _entry("To:",self.hist_to_var,11)
+        self.hist_refresh_btn=_make_btn(top,"↻  Refresh",self._load_history,"BTN_BG","BTN_HOVER")
+        self.hist_refresh_btn.pack(side="left"); self._tw(self.hist_refresh_btn)
+        self.hist_status=self._tw(tk.Label(top,text="",font=MONO_S,bg=T["BG"],fg=T["FG_DIM"]),bg="BG",fg="FG_DIM")
+        self.hist_status.pack(side="right")
+
+        self._tw(tk.Frame(page,bg=T["BORDER"],height=1),bg="BORDER").pack(fill="x")
+        hdr=self._tw(tk.Frame(page,bg=T["BG_HDR"],pady=6),bg="BG_HDR"); hdr.pack(fill="x")
+        for i,(l,w) in enumerate([("When",18),("Action",12),("Package / Summary",32),("Old / Command",24),("New",20)]):
+            self._tw(tk.Label(hdr,text=l,font=MONO_SB,bg=T["BG_HDR"],fg=T["FG_DIM"],width=w,anchor="w"),
+                     bg="BG_HDR",fg="FG_DIM").pack(side="left",padx=(20 if i==0 else 4,0))
+
+        ro=self._tw(tk.Frame(page,bg=T["BG_PANEL"]),bg="BG_PANEL"); ro.pack(fill="both",expand=True)
+        txn=lambda r:"counts" in r
+        self.hist_table=self._tw(VirtualTable(ro,[
+            {"text":lambda r:r["start"][:16] if txn(r) else r["ts"][11:19],"width":18,
+             "font":lambda r:MONO_SB if txn(r) else MONO_S,"fg":lambda r:"ACCENT" if txn(r) else "FG_DIM"},
+            {"text":lambda r:(r["status"] or "incomplete") if txn(r) else r["action"],"width":12,"font":MONO_S,
+             "fg":lambda r:("VER_NEW" if r["status"]=="completed" else "VER_OLD") if txn(r)
+                           else self._HIST_FG.get(r["action"],"FG")},
+            {"text":lambda r:" · ".join(f"{n} {a}" for a,n in sorted(r["counts"].items(),key=lambda x:-x[1]))
+                             if txn(r) else r["pkg"],"width":32,
+             "font":lambda r:MONO_S if txn(r) else MONO_B,"fg":lambda r:"FG_DIM" if txn(r) else "FG"},
+            {"text":lambda r:r["cmd"] if txn(r) else r["old"],"width":24,
+             "font":lambda r:MONO_S if txn(r) else MONO,"fg":lambda r:"FG_DIM" if txn(r) else "VER_OLD"},
+            {"key":"new","width":None,"diff":"old","fg":"VER_NEW"}],
+            row_bg=lambda r,i:"BG_HDR" if txn(r) else ("BG_ROW_ALT" if i%2==0 else "BG_PANEL"),
+            on_click=lambda r:None if txn(r) else self.hist_pkg_var.set(r["pkg"])))
+        self.hist_table.pack(fill="both",expand=True)
+
+        self._tw(tk.Frame(page,bg=T["BORDER"],height=1),bg="BORDER").pack(fill="x")
+        self._tw(tk.Label(page,text="ℹ  Read from /var/log/pacman.log. Click a package to show only its history; "
+                                    "dates accept YYYY, YYYY-MM or YYYY-MM-DD.",
+                          font=MONO_S,bg=T["BG"],fg=T["FG_DIM"],anchor="w"),
+                 bg="BG",fg="FG_DIM").pack(fill="x",padx=24,pady=8)
+        self._hist_job=None; self._hist_gen=0
+
+    def _on_hist_filter_change(self,*_):
+        if self._hist_job: self.after_cancel(self._hist_job)
+        self._hist_job=self.after(200,self._load_history)
+
+    def _load_history(self):
+        self._hist_job=None
+        since,until=self.hist_from_var.get().strip(),self.hist_to_var.get().strip()
+        for d in (since,until):
+            if d and not re.fullmatch(r"\d{4}(-\d{2}){0,2}",d):
+                self.hist_status.config(text=f"Bad date: {d}",fg=T["VER_OLD"]); return
+        self._hist_gen+=1; gen=self._hist_gen
+        self.hist_status.config(text="Loading…",fg=T["ACCENT"])
+        threading.Thread(target=self._fetch_history,args=(gen,self.hist_pkg_var.get().strip(),since,until),
+                         daemon=True).start()
+
+    @traced
+    def _fetch_history(self, gen, pkg, since, until):
+        self._logidx.update()
+        hist=self._logidx.history(pkg,since,until)
+        rows=[]
+        for t in hist: rows.append(t); rows.extend(t["events"])
+        self.after(0,lambda:self._show_history(gen,rows,len(hist),len(rows)-len(hist)))
+
+    @traced
+    def _show_history(self, gen, rows, ntxn, nev):
+        if gen!=self._hist_gen: return
+        self.hist_table.set_rows(rows,"No transactions match." if ntxn==0 else "")
+        self.hist_status.config(text=f"{ntxn} transaction{'s' if ntxn!=1 else ''} · {nev} package change{'s' if nev!=1 else ''}",
+                                fg=T["FG_DIM"])
+
     # ══════════════════════════════════════════════════════════════════════════
     # ORPHANS TAB
     # ══════════════════════════════════════════════════════════════════════════
@@ -1211,102 +3365,56 @@ class SysUpApp(tk.Tk):
 
         # Scrollable list
         ro=self._tw(tk.Frame(page,bg=T["BG_PANEL"]),bg="BG_PANEL"); ro.pack(fill="both",expand=True)
-        self.orph_canvas=self._tw(tk.Canvas(ro,bg=T["BG_PANEL"],highlightthickness=0,bd=0),bg="BG_PANEL")
-        osb=ttk.Scrollbar(ro,orient="vertical",command=self.orph_canvas.yview)
-        self.orph_canvas.configure(yscrollcommand=osb.set)
-        osb.pack(side="right",fill="y"); self.orph_canvas.pack(side="left",fill="both",expand=True)
-        self.orph_rows=self._tw(tk.Frame(self.orph_canvas,bg=T["BG_PANEL"]),bg="BG_PANEL")
-        self.orph_win=self.orph_canvas.create_window((0,0),window=self.orph_rows,anchor="nw")
-        self.orph_rows.bind("<Configure>",lambda e:self.orph_canvas.configure(scrollregion=self.orph_canvas.bbox("all")))
-        self.orph_canvas.bind("<Configure>",lambda e:self.orph_canvas.itemconfig(self.orph_win,width=e.width))
+        self.orph_table=self._tw(VirtualTable(ro,[
+            {"key":"pkg","width":28,"fg":"VER_OLD"},
+            {"key":"ver","width":20,"fg":"FG_DIM"},
+            {"key":"desc","width":None,"font":MONO_S,"fg":"FG_DIM"}],
+            checkable=True,pad_left=14,on_select=self._update_orph_bar))
+        self.orph_table.pack(fill="both",expand=True)
 
         self._tw(tk.Frame(page,bg=T["BORDER"],height=1),bg="BORDER").pack(fill="x")
-        self._orph_pkgs=[]; self._orph_vars=[]; self._orph_cbs=[]; self._orph_row_frames=[]
+        self._orph_pkgs=[]
 
     def _scan_orphans(self):
         self.orph_scan_btn.disable(); self.orph_rem_btn.disable()
         self.orph_count_lbl.config(text="Scanning…",fg=T["ACCENT"])
-        for w in self.orph_rows.winfo_children(): w.destroy()
-        self._orph_pkgs=[]; self._orph_vars=[]; self._orph_cbs=[]; self._orph_row_frames=[]
+        self._orph_pkgs=[]; self.orph_table.set_rows([])
         threading.Thread(target=self._fetch_orphans,daemon=True).start()
 
+    @traced
     def _fetch_orphans(self):
-        raw=run_cmd(["pacman","-Qdtq"],timeout=15)
-        pkgs=[l.strip() for l in raw.splitlines() if l.strip()] if raw else []
-        info={}
-        if pkgs:
-            si=run_cmd(["pacman","-Qi"]+pkgs,timeout=20)
-            cur_name=""
-            for line in si.splitlines():
-                m=re.match(r'^Name\s*:\s*(.+)',line)
-                if m: cur_name=m.group(1).strip(); info[cur_name]={"ver":"","desc":""}
-                m=re.match(r'^Version\s*:\s*(.+)',line)
-                if m and cur_name: info[cur_name]["ver"]=m.group(1).strip()
-                m=re.match(r'^Description\s*:\s*(.+)',line)
-                if m and cur_name: info[cur_name]["desc"]=m.group(1).strip()
+        rows=collect_orphans(self._localdb)
+        pkgs=[r["pkg"] for r in rows]; info={r["pkg"]:r for r in rows}
         self._orph_pkgs=pkgs
         self.after(0,lambda:self._show_orphans(pkgs,info))
 
+    @traced
     def _show_orphans(self, pkgs, info):
-        for w in self.orph_rows.winfo_children(): w.destroy()
-        self._orph_vars=[]; self._orph_cbs=[]; self._orph_row_frames=[]
+        self.orph_table.set_rows([{"pkg":p,**info.get(p,{"ver":"","desc":""})} for p in pkgs],
+                                 "✓  No orphan packages found.","VER_NEW")
         if not pkgs:
-            tk.Label(self.orph_rows,text="✓  No orphan packages found.",
-                     font=MONO,bg=T["BG_PANEL"],fg=T["VER_NEW"]).pack(pady=30)
             self.orph_count_lbl.config(text="None found",fg=T["VER_NEW"])
             self.orph_scan_btn.enable(); return
         self.orph_count_lbl.config(text=f"{len(pkgs)} orphan{'s' if len(pkgs)!=1 else ''} found",fg=T["VER_OLD"])
-        for i,pkg in enumerate(pkgs):
-            bk="BG_ROW_ALT" if i%2==0 else "BG_PANEL"
-            var=tk.BooleanVar(value=False); self._orph_vars.append(var)
-            row=tk.Frame(self.orph_rows,bg=T[bk],pady=4,cursor="hand2"); row.pack(fill="x")
-            self._orph_row_frames.append((row,bk))
-            cb=self._make_checkbox(row,var,bk,self._update_orph_bar)
-            cb.pack(side="left",padx=(14,6),pady=2); self._orph_cbs.append(cb)
-            pinfo=info.get(pkg,{})
-            tk.Label(row,text=pkg,font=MONO,bg=T[bk],fg=T["VER_OLD"],width=28,anchor="w").pack(side="left",padx=(0,4))
-            tk.Label(row,text=pinfo.get("ver",""),font=MONO,bg=T[bk],fg=T["FG_DIM"],width=20,anchor="w").pack(side="left",padx=(0,4))
-            desc=pinfo.get("desc","")[:70]
-            tk.Label(row,text=desc,font=MONO_S,bg=T[bk],fg=T["FG_DIM"],anchor="w").pack(side="left",padx=(0,10),fill="x",expand=True)
-            def _rc(e,v=var,c=cb): v.set(not v.get()); c._redraw(); self._update_orph_bar()
-            for ch in [row]+list(row.winfo_children()):
-                if ch is not cb: ch.bind("<Button-1>",_rc)
         self.orph_scan_btn.enable()
         self._update_orph_bar()
 
     def _update_orph_bar(self):
-        sel=[p for p,v in zip(self._orph_pkgs,self._orph_vars) if v.get()]
-        if sel: self.orph_rem_btn.enable()
-        else:   self.orph_rem_btn.disable()
+        if self.orph_table.selected: self.orph_rem_btn.enable()
+        else:                        self.orph_rem_btn.disable()
 
     def _remove_orphans(self):
-        sel=[p for p,v in zip(self._orph_pkgs,self._orph_vars) if v.get()]
+        sel=[r["pkg"] for r in self.orph_table.checked()]
         if not sel: return
         if not messagebox.askyesno("Remove Orphans",
                                    f"Permanently remove {len(sel)} orphan package(s)?\n\n"+"\n".join(f"  • {p}" for p in sel),
                                    parent=self): return
         prompt=f"Enter sudo password to remove orphans:\n{', '.join(sel)}"
-        if self._sudo_pw and verify_sudo(self._sudo_pw):
-            pw=self._sudo_pw
-        else:
-            dlg=SudoDialog(self,prompt); self.wait_window(dlg)
-            if dlg.result is None: return
-            if not verify_sudo(dlg.result):
-                dlg2=SudoDialog(self,prompt); dlg2.show_error("Incorrect password. Please try again.")
-                self.wait_window(dlg2)
-                if not dlg2.result or not verify_sudo(dlg2.result): return
-                pw=dlg2.result
-            else:
-                pw=dlg.result
-        self._sudo_pw=pw; self.orph_rem_btn.disable(); self.orph_scan_btn.disable()
-        self._show_log(); self._log_clear()
-        self._log_line(f"Removing {len(sel)} orphan(s)…",T["VER_OLD"])
-        threading.Thread(target=self._do_remove_orphans,args=(sel,),daemon=True).start()
-
-    def _do_remove_orphans(self, pkgs):
-        self._stream_sudo(["pacman","-Rns","--noconfirm"]+pkgs)
-        self._log_line("✓ Orphan removal complete.",T["VER_NEW"])
-        self.after(500,self._scan_orphans)
+        if not self._ensure_helper(prompt): return
+        self.orph_rem_btn.disable(); self.orph_scan_btn.disable()
+        # Same job kind as Uninstall Selected, so the two merge when queued back to back
+        self._txq.submit("remove","Remove",self._do_uninstall,sel,
+                         on_done=lambda job:self.after(0,lambda:(self.orph_scan_btn.enable(),self._update_orph_bar())))
 
     # ══════════════════════════════════════════════════════════════════════════
     # REPOSITORIES TAB
@@ -1331,14 +3439,20 @@ class SysUpApp(tk.Tk):
         self._tw(tk.Label(hdr,text="Actions",font=MONO_SB,bg=T["BG_HDR"],fg=T["FG_DIM"]),
                  bg="BG_HDR",fg="FG_DIM").pack(side="right",padx=(0,20))
         ro=self._tw(tk.Frame(page,bg=T["BG_PANEL"]),bg="BG_PANEL"); ro.pack(fill="both",expand=True)
-        self.repo_canvas=self._tw(tk.Canvas(ro,bg=T["BG_PANEL"],highlightthickness=0,bd=0),bg="BG_PANEL")
-        rsb=ttk.Scrollbar(ro,orient="vertical",command=self.repo_canvas.yview)
-        self.repo_canvas.configure(yscrollcommand=rsb.set)
-        rsb.pack(side="right",fill="y"); self.repo_canvas.pack(side="left",fill="both",expand=True)
-        self.repo_rows=self._tw(tk.Frame(self.repo_canvas,bg=T["BG_PANEL"]),bg="BG_PANEL")
-        self.repo_win=self.repo_canvas.create_window((0,0),window=self.repo_rows,anchor="nw")
-        self.repo_rows.bind("<Configure>",lambda e:self.repo_canvas.configure(scrollregion=self.repo_canvas.bbox("all")))
-        self.repo_canvas.bind("<Configure>",lambda e:self.repo_canvas.itemconfig(self.repo_win,width=e.width))
+        def _incs(sec):
+            incs=[ln.strip() for ln in sec["lines"][1:] if re.match(r'^#?\s*(Include|Server)\s*=',ln.strip())]
+            return "  |  ".join(re.sub(r'^#?\s*','',x) for x in incs) or "(none)"
+        self.repo_table=self._tw(VirtualTable(ro,[
+            {"text":lambda s:"● ON " if s["enabled"] else "○ OFF","width":8,"font":MONO_SB,
+             "fg":lambda s:"VER_NEW" if s["enabled"] else "FG_DIM"},
+            {"text":lambda s:f"[{s['name']}]","width":24,"font":MONO_B,"fg":lambda s:repo_color(s["name"])},
+            {"text":_incs,"width":None,"font":MONO_S,"fg":"FG_DIM"},
+            {"action":lambda s:None if s["name"].lower() in ("core","extra","options") else " Remove ",
+             "bg":"BTN_RED","on_click":lambda s:self._remove_repo(s)},
+            {"action":lambda s:" Disable " if s["enabled"] else " Enable  ",
+             "bg":lambda s:"BTN_ORANGE" if s["enabled"] else "BTN_GREEN",
+             "on_click":lambda s:self._toggle_repo(s,not s["enabled"])}],row_h=34))
+        self.repo_table.pack(fill="both",expand=True)
         self._tw(tk.Frame(page,bg=T["BORDER"],height=1),bg="BORDER").pack(fill="x")
         self._tw(tk.Label(page,text="ℹ  Changes are written to /etc/pacman.conf and require sudo. A pacman -Sy will run after saving.",
                           font=MONO_S,bg=T["BG"],fg=T["FG_DIM"],anchor="w"),
@@ -1352,23 +3466,7 @@ class SysUpApp(tk.Tk):
         self._render_repo_rows()
 
     def _render_repo_rows(self):
-        for w in self.repo_rows.winfo_children(): w.destroy()
-        for i,sec in enumerate(s for s in self._repo_sections if s["type"]=="repo"):
-            bk="BG_ROW_ALT" if i%2==0 else "BG_PANEL"; bg=T[bk]
-            row=tk.Frame(self.repo_rows,bg=bg,pady=7); row.pack(fill="x")
-            en=sec["enabled"]
-            tk.Label(row,text="● ON " if en else "○ OFF",font=MONO_SB,bg=bg,
-                     fg=T["VER_NEW"] if en else T["FG_DIM"],width=8,anchor="w").pack(side="left",padx=(20,4))
-            tk.Label(row,text=f"[{sec['name']}]",font=MONO_B,bg=bg,
-                     fg=repo_color(sec["name"]),width=24,anchor="w").pack(side="left",padx=(0,4))
-            incs=[ln.strip() for ln in sec["lines"][1:] if re.match(r'^#?\s*(Include|Server)\s*=',ln.strip())]
-            inc_txt="  |  ".join(re.sub(r'^#?\s*','',x) for x in incs) or "(none)"
-            tk.Label(row,text=inc_txt,font=MONO_S,bg=bg,fg=T["FG_DIM"],anchor="w").pack(side="left",padx=(0,10),fill="x",expand=True)
-            af=tk.Frame(row,bg=bg); af.pack(side="right",padx=(0,16))
-            if en: _make_btn(af," Disable ",lambda s=sec:self._toggle_repo(s,False),"BTN_ORANGE","BTN_ORNG_H","#ffffff").pack(side="left",padx=3)
-            else:  _make_btn(af," Enable  ",lambda s=sec:self._toggle_repo(s,True),"BTN_GREEN","BTN_GREEN_H","#ffffff").pack(side="left",padx=3)
-            if sec["name"].lower() not in ("core","extra","options"):
-                _make_btn(af," Remove ",lambda s=sec:self._remove_repo(s),"BTN_RED","BTN_RED_H","#ffffff").pack(side="left",padx=3)
+        self.repo_table.set_rows([s for s in self._repo_sections if s["type"]=="repo"],keep_view=True)
 
     def _mark_dirty(self):
         self._repo_dirty=True; self.repo_dirty_lbl.config(text="● Unsaved changes",fg=T["BTN_ORANGE"])
@@ -1412,45 +3510,26 @@ class SysUpApp(tk.Tk):
         ne.focus_set(); se.bind("<Return>",lambda e:do_add())
 
     def _save_repo_changes(self):
-        # Collect the sudo password on the main thread (same fix as _run_updates)
-        if self._sudo_pw and verify_sudo(self._sudo_pw):
-            pw = self._sudo_pw
-        else:
-            dlg = SudoDialog(self, "Enter your sudo password to write /etc/pacman.conf:")
-            self.wait_window(dlg)
-            if dlg.result is None: return
-            if not verify_sudo(dlg.result):
-                dlg2 = SudoDialog(self, "Enter your sudo password to write /etc/pacman.conf:")
-                dlg2.show_error("Incorrect password. Please try again.")
-                self.wait_window(dlg2)
-                if not dlg2.result or not verify_sudo(dlg2.result): return
-                pw = dlg2.result
-            else:
-                pw = dlg.result
-        self._sudo_pw=pw
+        # Authenticate on the main thread (same fix as _run_updates)
+        if not self._ensure_helper("Enter your sudo password to write /etc/pacman.conf:"): return
         new_conf=write_pacman_conf(self._repo_preamble,self._repo_sections)
-        self._show_log(); self._log_clear()
-        self._log_line("Writing /etc/pacman.conf…",T["ACCENT"])
-        def _write():
-            proc=subprocess.Popen(["sudo","-S","-p","","tee",PACMAN_CONF],
-                                  stdin=subprocess.PIPE,stdout=subprocess.PIPE,stderr=subprocess.STDOUT,text=True)
-            try: proc.stdin.write(self._sudo_pw+"\n"); proc.stdin.write(new_conf); proc.stdin.close()
-            except BrokenPipeError: pass
-            out,_=proc.communicate()
-            if proc.returncode==0:
+        def _write(_):
+            job=self._helper.write(PACMAN_CONF,new_conf)
+            out=job.read().decode("utf-8","replace"); job.wait()
+            if job.returncode==0:
                 self._log_line("✓ pacman.conf saved.",T["VER_NEW"])
+                self.after(0,self._reload_repos_view)
                 self._log_line("Syncing new repo databases…",T["ACCENT"])
                 self._stream_sudo(["pacman","-Sy","--noconfirm"])
                 self._log_line("✓ Done.",T["VER_NEW"])
-                self.after(0,self._reload_repos_view)
             else: self._log_line(f"✗ Failed:\n{out}",T["VER_OLD"])
-        threading.Thread(target=_write,daemon=True).start()
+        self._txq.submit("config",f"Write {PACMAN_CONF}",_write)
 
 
     # ══════════════════════════════════════════════════════════════════════════
     # MIRRORS TAB
     # ══════════════════════════════════════════════════════════════════════════
-    REFLECTOR_CONF = "/etc/xdg/reflector/reflector.conf"
+    REFLECTOR_CONF = REFLECTOR_CONF
 
     def _build_mirrors_page(self):
         page=self._tw(tk.Frame(self.page_container,bg=T["BG"]),bg="BG")
@@ -1557,6 +3636,36 @@ class SysUpApp(tk.Tk):
             self._tw(tk.Label(ef2,text=txt,font=MONO,bg=T["BG_PANEL"],fg=T["FG"]),
                      bg="BG_PANEL",fg="FG").pack(side="left",padx=(0,18))
 
+        # ── Built-in benchmark of the current mirrorlist ──────────────────────
+        section(inner,"Benchmark Current Mirrorlist")
+        bf=row_frame(inner); lbl(bf,"Keep best:")
+        self.mir_best_var=tk.StringVar(value="10")
+        entry_box(bf,self.mir_best_var,width=5,hint=f"servers written to {MIRRORLIST}  (uses the protocol and timeout above)")
+        af3=row_frame(inner)
+        self.mir_auto_var=tk.BooleanVar(value=self._mirror_health.auto)
+        self._make_checkbox(af3,self.mir_auto_var,"BG_PANEL",self._toggle_mirror_auto).pack(side="left",padx=(0,4))
+        self._tw(tk.Label(af3,text="Re-rank the active mirrors by their recent health before each update",
+                          font=MONO,bg=T["BG_PANEL"],fg=T["FG"]),bg="BG_PANEL",fg="FG").pack(side="left")
+        hdr=self._tw(tk.Frame(inner,bg=T["BG_HDR"],pady=4),bg="BG_HDR"); hdr.pack(fill="x",padx=32,pady=(6,0))
+        for i,(l,w) in enumerate([("#",4),("Connect",10),("1st byte",10),("core.db",14),("Synced",8),("Server",40)]):
+            self._tw(tk.Label(hdr,text=l,font=MONO_SB,bg=T["BG_HDR"],fg=T["FG_DIM"],width=w,anchor="w"),
+                     bg="BG_HDR",fg="FG_DIM").pack(side="left",padx=(12 if i==0 else 4,0))
+        tbl=self._tw(tk.Frame(inner,bg=T["BG_PANEL"],height=280),bg="BG_PANEL")
+        tbl.pack(fill="x",padx=32); tbl.pack_propagate(False)
+        ms=lambda v:f"{v*1000:.0f} ms" if v is not None else "—"
+        self.mir_table=self._tw(VirtualTable(tbl,[
+            {"text":lambda r:str(r.get("rank") or "—"),"width":4,"font":MONO_SB,"fg":"ACCENT"},
+            {"text":lambda r:ms(r["connect"]),"width":10,"fg":"FG"},
+            {"text":lambda r:ms(r["ttfb"]),"width":10,"fg":"FG"},
+            {"text":lambda r:f"{fmt_bytes(r['rate'])}/s" if r["ok"] else "✗ "+r["error"],"width":14,
+             "fg":lambda r:"VER_NEW" if r["ok"] else "VER_OLD"},
+            {"text":lambda r:fmt_age(time.time()-r["lastsync"]) if r.get("lastsync") else "—","width":8,
+             "fg":lambda r:"BTN_ORANGE" if r.get("lastsync") and time.time()-r["lastsync"]>MirrorHealth.STALE else "FG_DIM"},
+            {"key":"server","width":None,"font":MONO_S,"fg":lambda r:"FG" if r["ok"] else "FG_DIM"}],
+            row_h=22,pad_left=12))
+        self.mir_table.pack(fill="both",expand=True)
+        self._mir_results=[]; self._mir_ranked=[]; self._mir_stop=None; self._mir_show_job=None
+
         # ── Status / info ─────────────────────────────────────────────────────
         self._tw(tk.Frame(inner,bg=T["BORDER"],height=1),bg="BORDER").pack(fill="x",padx=24,pady=(18,0))
         self.mir_status_lbl=self._tw(tk.Label(inner,text="",font=MONO_S,bg=T["BG_PANEL"],fg=T["FG_DIM"],anchor="w"),
@@ -1570,6 +3679,10 @@ class SysUpApp(tk.Tk):
                                     bg="BG",fg="FG_DIM")
         self.mir_dirty_lbl.pack(side="left")
         br=self._tw(tk.Frame(bot,bg=T["BG"]),bg="BG"); br.pack(side="right")
+        self.mir_bench_btn=_make_btn(br,"  ⏱  Benchmark  ",self._bench_mirrors,"BTN_BG","BTN_HOVER")
+        self.mir_bench_btn.pack(side="left",padx=(0,8)); self._tw(self.mir_bench_btn)
+        self.mir_write_btn=_make_btn(br,"  ✎  Write Best  ",self._write_best_mirrors,"BTN_PURPLE","BTN_PURP_H","#ffffff",state="disabled")
+        self.mir_write_btn.pack(side="left",padx=(0,8)); self._tw(self.mir_write_btn)
         self.mir_save_btn=_make_btn(br,"  💾  Save Config  ",self._save_mirror_conf,"BTN_ACCENT","BTN_ACCT_H","#ffffff")
         self.mir_save_btn.pack(side="left",padx=(0,8)); self._tw(self.mir_save_btn)
         self.mir_run_btn=_make_btn(br,"  ▶  Run Reflector Now  ",self._run_reflector,"BTN_GREEN","BTN_GREEN_H","#ffffff")
@@ -1683,67 +3796,149 @@ class SysUpApp(tk.Tk):
     def _save_mirror_conf(self):
         path=self.REFLECTOR_CONF
         new_conf=self._build_reflector_conf()
-        if self._sudo_pw and verify_sudo(self._sudo_pw):
-            pw=self._sudo_pw
-        else:
-            dlg=SudoDialog(self,f"Enter your sudo password to write {path}:")
-            self.wait_window(dlg)
-            if dlg.result is None: return
-            if not verify_sudo(dlg.result):
-                dlg2=SudoDialog(self,f"Enter your sudo password to write {path}:")
-                dlg2.show_error("Incorrect password. Please try again.")
-                self.wait_window(dlg2)
-                if not dlg2.result or not verify_sudo(dlg2.result): return
-                pw=dlg2.result
-            else:
-                pw=dlg.result
-        self._sudo_pw=pw
-        self._show_log(); self._log_clear()
-        self._log_line(f"Writing {path}…",T["ACCENT"])
-        def _write():
-            import tempfile, os
-            # Write to a temp file first, then sudo cp — avoids password leaking into the target file
-            try:
-                with tempfile.NamedTemporaryFile(mode="w",suffix=".conf",delete=False) as tf:
-                    tf.write(new_conf); tmp=tf.name
-            except Exception as e:
-                self._log_line(f"✗ Failed to create temp file: {e}",T["VER_OLD"]); return
-            proc=run_sudo_cmd(self._sudo_pw,["cp",tmp,path])
-            proc.wait()
-            try: os.unlink(tmp)
-            except Exception: pass
-            if proc.returncode==0:
+        if not self._ensure_helper(f"Enter your sudo password to write {path}:"): return
+        def _write(_):
+            job=self._helper.write(path,new_conf)
+            out=job.read().decode("utf-8","replace"); job.wait()
+            if job.returncode==0:
                 self._log_line(f"✓ {path} saved.",T["VER_NEW"])
                 self.after(0,lambda:self.mir_dirty_lbl.config(text=""))
                 self.after(0,lambda:self.mir_status_lbl.config(text=f"✓  Saved to {path}",fg=T["VER_NEW"]))
                 self._mir_dirty=False
             else:
-                self._log_line("✗ Failed to write config.",T["VER_OLD"])
-        threading.Thread(target=_write,daemon=True).start()
+                self._log_line(f"✗ Failed to write config.\n{out}",T["VER_OLD"])
+        self._txq.submit("config",f"Write {path}",_write,db=False)
+
+    # ── Built-in mirror benchmark ──
+    def _bench_mirrors(self):
+        if self._mir_stop:                      # the button doubles as Stop while probing
+            self._mir_stop.set(); self.mir_bench_btn.config(text="  Stopping…  "); return
+        try:
+            with open(MIRRORLIST) as f: mirrors=parse_mirrorlist(f.read())
+        except OSError as e:
+            self.mir_status_lbl.config(text=f"✗  Cannot read {MIRRORLIST}: {e}",fg=T["VER_OLD"]); return
+        protos={p for p,v in (("https",self.mir_proto_https),("http",self.mir_proto_http)) if v.get()} or {"https"}
+        servers=[m["server"] for m in mirrors if urllib.parse.urlsplit(m["server"]).scheme in protos]
+        if not servers:
+            self.mir_status_lbl.config(text=f"ℹ  No {'/'.join(sorted(protos))} servers in {MIRRORLIST}.",fg=T["FG_DIM"]); return
+        try: timeout=max(1.0,float(self.mir_timeout_var.get()))
+        except ValueError: timeout=5.0
+        self._mir_results=[]; self._mir_ranked=[]; self.mir_table.set_rows([])
+        stop=self._mir_stop=threading.Event()
+        self.mir_bench_btn.config(text="  ■  Stop  "); self.mir_write_btn.disable()
+        self.mir_status_lbl.config(text=f"Probing {len(servers)} mirrors, {MIRROR_PROBE_WORKERS} at a time…",fg=T["ACCENT"])
+        def _run():
+            probe_mirrors(servers,timeout=timeout,on_result=self._mir_result,stop=stop)
+            self.after(0,lambda:self._mir_bench_done(len(servers)))
+        threading.Thread(target=_run,daemon=True).start()
+
+    def _mir_result(self, r):
+        # Worker threads: results stream in; the table is re-ranked at most every 100 ms
+        self._mir_results.append(r)
+        if not self._mir_show_job: self._mir_show_job=self.after(100,self._mir_show)
+
+    def _mir_show(self):
+        self._mir_show_job=None
+        ranked=rank_mirrors(list(self._mir_results)); n=0
+        for r in ranked:
+            if r["ok"]: n+=1; r["rank"]=n
+        self._mir_ranked=ranked
+        self.mir_table.set_rows(ranked,keep_view=True)
+        if self._mir_stop: self.mir_status_lbl.config(text=f"Probed {len(ranked)} mirrors, {n} reachable…",fg=T["ACCENT"])
+
+    def _mir_bench_done(self, total):
+        stopped=self._mir_stop.is_set(); self._mir_stop=None
+        self._mir_show()
+        for r in self._mir_ranked: self._mirror_health.record_probe(r)
+        threading.Thread(target=self._mirror_health.save,daemon=True).start()
+        ok=sum(1 for r in self._mir_ranked if r["ok"])
+        self.mir_bench_btn.config(text="  ⏱  Benchmark  ")
+        if ok: self.mir_write_btn.enable()
+        self.mir_status_lbl.config(text=f"{'Stopped — ' if stopped else '✓  '}{ok} of {total} mirrors reachable"
+                                        +(f"; best: {self._mir_ranked[0]['server']}" if ok else ""),
+                                   fg=T["VER_NEW"] if ok else T["VER_OLD"])
+
+    def _write_best_mirrors(self):
+        try: n=max(1,int(self.mir_best_var.get()))
+        except ValueError: n=10
+        best=[r["server"] for r in self._mir_ranked if r["ok"]][:n]
+        if not best: return
+        if not messagebox.askyesno("Write Mirrorlist",
+                                   f"Make these {len(best)} mirrors the active servers in {MIRRORLIST}?\n\n"
+                                   +"\n".join(f"  {i+1}. {s}" for i,s in enumerate(best))
+                                   +"\n\nOther servers stay in the file, commented out; the old file is kept as .bak.",
+                                   parent=self): return
+        try:
+            with open(MIRRORLIST) as f: text=rank_mirrorlist(f.read(),best,"connect + first byte + core.db throughput")
+        except OSError as e:
+            self.mir_status_lbl.config(text=f"✗  Cannot read {MIRRORLIST}: {e}",fg=T["VER_OLD"]); return
+        prompt=f"Enter your sudo password to write {MIRRORLIST}:"
+        if not self._ensure_helper(prompt): return
+        def _write(_):
+            if self._write_mirrorlist(text):
+                self.after(0,lambda:self.mir_status_lbl.config(text=f"✓  Wrote {len(best)} mirrors to {MIRRORLIST}",fg=T["VER_NEW"]))
+        self._txq.submit("mirrorlist",f"Write {len(best)} ranked mirrors to {MIRRORLIST}",_write,db=False)
+
+    def _write_mirrorlist(self, text):
+        """Worker thread: install text as the mirrorlist via the helper, keeping the old one as .bak."""
+        job=self._helper.write(MIRRORLIST,text,backup=True)
+        out=job.read().decode("utf-8","replace"); job.wait()
+        if job.returncode==0:
+            self._log_line(f"✓ {MIRRORLIST} updated (previous version: {MIRRORLIST}.bak).",T["VER_NEW"]); return True
+        self._log_line(f"✗ Failed to write mirrorlist:\n{out}",T["VER_OLD"]); return False
+
+    # ── Mirror health: fed by benchmarks and real transactions ──
+    def _toggle_mirror_auto(self):
+        self._mirror_health.auto=self.mir_auto_var.get()
+        threading.Thread(target=self._mirror_health.save,daemon=True).start()
+
+    def _active_mirrors(self):
+        try:
+            with open(MIRRORLIST) as f: text=f.read()
+        except OSError: return "",[]
+        return text,[m["server"] for m in parse_mirrorlist(text) if m["active"]]
+
+    def _rerank_mirrors(self):
+        """Worker thread, sudo held: reorder the active servers by health if that changes anything."""
+        text,active=self._active_mirrors()
+        ranked=self._mirror_health.rank(active)
+        if len(active)<2 or ranked==active: return
+        self._log_line(f"Re-ranking mirrors by recent health — {ranked[0]} first.",T["FG_DIM"])
+        self._write_mirrorlist(rank_mirrorlist(text,ranked,"re-ranked by recent mirror health"))
+
+    def _record_transaction_mirrors(self, pp):
+        """Fold what a pacman run showed into the health store: download failures by host,
+        and throughput for the mirror that served the files. pacman fetches every file
+        from the first server in its repo's list and only moves on after a failure it
+        reports, so a file with no failure came from the first active mirrorlist server.
+        Files that failed anywhere, files from repos with their own Server lines, and
+        runs where pacman dropped a server are credited to nobody."""
+        if not pp: return
+        _,active=self._active_mirrors()
+        host=lambda srv:urllib.parse.urlsplit(srv).hostname
+        for h,err in pp.mirror_errors:
+            for srv in active:
+                if host(srv)==h: self._mirror_health.record_failure(srv,err)
+        if active and pp.files and not pp.mirror_skipped:
+            repos=mirrorlist_repos(); sdb=self._syncdb.refresh()
+            def _repo(name):
+                if name in repos: return name                    # a sync db
+                m=re.match(r'^(.+)-[^-]+-[^-]+-[^-]+$',name)      # name-ver-rel-arch
+                p=sdb.pkgs.get(m.group(1)) if m else None
+                return p and p["repo"]
+            got=[f for n,f in pp.files.items() if n not in pp.failed_files and _repo(n) in repos]
+            if got:
+                t0,t1=min(f[0] for f in got),max(f[1] for f in got)
+                if t1-t0>=1: self._mirror_health.record_transfer(active[0],sum(f[2] for f in got),t1-t0)
+        self._mirror_health.save()
 
     def _run_reflector(self):
         if not shutil.which("reflector"):
             messagebox.showerror("Not Found","reflector is not installed.\nInstall it with: sudo pacman -S reflector",parent=self)
             return
-        if self._sudo_pw and verify_sudo(self._sudo_pw):
-            pw=self._sudo_pw
-        else:
-            dlg=SudoDialog(self,"Enter your sudo password to run reflector:")
-            self.wait_window(dlg)
-            if dlg.result is None: return
-            if not verify_sudo(dlg.result):
-                dlg2=SudoDialog(self,"Enter your sudo password to run reflector:")
-                dlg2.show_error("Incorrect password. Please try again.")
-                self.wait_window(dlg2)
-                if not dlg2.result or not verify_sudo(dlg2.result): return
-                pw=dlg2.result
-            else:
-                pw=dlg.result
-        self._sudo_pw=pw
+        if not self._ensure_helper("Enter your sudo password to run reflector:"): return
         self.mir_run_btn.disable(); self.mir_save_btn.disable()
-        self._show_log(); self._log_clear()
-        self._log_line("Running reflector — this may take a minute…",T["ACCENT"])
-        def _run():
+        def _run(_):
             # Build the reflector command by parsing the conf file options directly,
             # so we are not relying on reflector's --config flag (not all versions support it).
             # Always append --save to write the mirrorlist.
@@ -1763,55 +3958,445 @@ class SysUpApp(tk.Tk):
             self._log_line("Command: "+" ".join(cmd_args),T["FG_DIM"])
             self._stream_sudo(cmd_args)
             self._log_line("✓ Mirrorlist updated.",T["VER_NEW"])
-            self.after(0,self.mir_run_btn.enable)
-            self.after(0,self.mir_save_btn.enable)
             self.after(0,lambda:self.mir_status_lbl.config(
                 text="✓  Reflector ran successfully — /etc/pacman.d/mirrorlist updated.",fg=T["VER_NEW"]))
-        threading.Thread(target=_run,daemon=True).start()
+        self._txq.submit("mirrorlist","Run reflector — this may take a minute",_run,db=False,
+                         on_done=self._tx_controls(self.mir_run_btn,self.mir_save_btn))
+
+    # ══════════════════════════════════════════════════════════════════════════
+    # DIAGNOSTICS TAB (hidden; Ctrl+Shift+D)
+    # ══════════════════════════════════════════════════════════════════════════
+    _DIAG_WINDOWS=((10,"10 s"),(60,"1 min"),(600,"10 min"),(None,"all"))
+    _DIAG_ROW=16; _DIAG_LANE_W=150
+
+    @staticmethod
+    def _diag_kind(s):
+        """Timeline colour of a span: subprocess, transaction, Tk rendering or background work."""
+        if "argv" in s["attrs"]: return "CHART_4"
+        if s["name"].startswith("tx "): return "CHART_3"
+        if s["name"].startswith(("show_","draw_")): return "CHART_2"
+        return "CHART_1"
+
+    @staticmethod
+    def _diag_dur(s, now):
+        d=(s["end"] if s["end"] is not None else now)-s["start"]
+        return f"{d*1000:.1f} ms" if d<10 else f"{d:.1f} s"
+
+    def _build_diag_page(self):
+        page=self._tw(tk.Frame(self.page_container,bg=T["BG"]),bg="BG")
+        self._pages["Diagnostics"]=page
+
+        top=self._tw(tk.Frame(page,bg=T["BG"],pady=12),bg="BG"); top.pack(fill="x",padx=24)
+        self._tw(tk.Label(top,text="Diagnostics",font=MONO_B,bg=T["BG"],fg=T["FG"]),bg="BG",fg="FG").pack(side="left")
+        for key,txt in (("CHART_1","fetch"),("CHART_2","render"),("CHART_4","subprocess"),("CHART_3","transaction")):
+            self._tw(tk.Label(top,text=f"■ {txt}",font=MONO_S,bg=T["BG"],fg=T[key]),bg="BG",fg=key).pack(side="left",padx=(12,0))
+        br=self._tw(tk.Frame(top,bg=T["BG"]),bg="BG"); br.pack(side="right")
+        self._diag_win=1
+        self.diag_win_btn=_make_btn(br,"",self._diag_cycle_window,"BTN_BG","BTN_HOVER")
+        self.diag_win_btn.pack(side="left",padx=(0,8)); self._tw(self.diag_win_btn)
+        b=_make_btn(br,"✕  Clear",self._diag_clear,"BTN_BG","BTN_HOVER"); b.pack(side="left",padx=(0,8)); self._tw(b)
+        b=_make_btn(br,"⤓  Export JSON…",self._diag_export,"BTN_BG","BTN_HOVER"); b.pack(side="left"); self._tw(b)
+        self.diag_sum_lbl=self._tw(tk.Label(top,text="",font=MONO_S,bg=T["BG"],fg=T["FG_DIM"]),bg="BG",fg="FG_DIM")
+        self.diag_sum_lbl.pack(side="right",padx=(0,16))
+
+        self._tw(tk.Frame(page,bg=T["BORDER"],height=1),bg="BORDER").pack(fill="x")
+        tl=self._tw(tk.Frame(page,bg=T["BG_PANEL"]),bg="BG_PANEL"); tl.pack(fill="x")
+        self.diag_canvas=self._tw(tk.Canvas(tl,height=240,bg=T["BG_PANEL"],highlightthickness=0,bd=0),bg="BG_PANEL")
+        sb=ttk.Scrollbar(tl,orient="vertical",command=self.diag_canvas.yview)
+        self.diag_canvas.configure(yscrollcommand=sb.set)
+        sb.pack(side="right",fill="y"); self.diag_canvas.pack(side="left",fill="x",expand=True)
+        self.diag_canvas.bind("<Configure>",lambda e:self._draw_diag())
+        self.diag_canvas.bind("<Motion>",self._diag_motion)
+        self.diag_detail=self._tw(tk.Label(page,text="Hover a span for details.",font=MONO_S,bg=T["BG"],fg=T["FG_DIM"],
+                                           anchor="w"),bg="BG",fg="FG_DIM")
+        self.diag_detail.pack(fill="x",padx=24,pady=4)
+
+        self._tw(tk.Frame(page,bg=T["BORDER"],height=1),bg="BORDER").pack(fill="x")
+        hdr=self._tw(tk.Frame(page,bg=T["BG_HDR"],pady=6),bg="BG_HDR"); hdr.pack(fill="x")
+        for i,(l,w) in enumerate([("Operation",34),("Wall",10),("Procs",6),("Output",10),("Thread",24)]):
+            self._tw(tk.Label(hdr,text=l,font=MONO_SB,bg=T["BG_HDR"],fg=T["FG_DIM"],width=w,anchor="w"),
+                     bg="BG_HDR",fg="FG_DIM").pack(side="left",padx=(20 if i==0 else 4,0))
+        ro=self._tw(tk.Frame(page,bg=T["BG_PANEL"]),bg="BG_PANEL"); ro.pack(fill="both",expand=True)
+        self.diag_table=self._tw(VirtualTable(ro,[
+            {"text":lambda r:"  "*r["depth"]+r["name"],"width":34,"fg":self._diag_kind},
+            {"text":lambda r:self._diag_dur(r,self._diag_now),"width":10,"font":MONO_S,
+             "fg":lambda r:"FG" if r["end"] is not None else "ACCENT"},
+            {"text":lambda r:str(r["procs"] or ""),"width":6,"font":MONO_S,"fg":"FG_DIM"},
+            {"text":lambda r:fmt_bytes(r["bytes"]) if r["bytes"] else "","width":10,"font":MONO_S,"fg":"FG_DIM"},
+            {"key":"thread","width":None,"font":MONO_S,"fg":"FG_DIM"}],
+            on_click=self._diag_show))
+        self.diag_table.pack(fill="both",expand=True)
+        self._diag_items={}; self._diag_now=0.0; self._diag_seen=None; self._diag_job=None
+        self._diag_cycle_window(0)
+
+    def _toggle_diag(self):
+        b=self._tab_btns["Diagnostics"]
+        if b.winfo_ismapped():
+            b.pack_forget()
+            if self._active_tab=="Diagnostics": self._switch_tab("Updates")
+        else:
+            b.pack(side="left"); self._switch_tab("Diagnostics")
+
+    def _diag_cycle_window(self, step=1):
+        self._diag_win=(self._diag_win+step)%len(self._DIAG_WINDOWS)
+        self.diag_win_btn.config(text=f"⌚  {self._DIAG_WINDOWS[self._diag_win][1]}")
+        self._draw_diag()
+
+    def _diag_clear(self):
+        SPANS.clear(); self._diag_seen=None; self._diag_refresh()
+
+    def _diag_export(self):
+        path=filedialog.asksaveasfilename(parent=self,title="Export timing spans",defaultextension=".json",
+                                          initialfile=time.strftime("arch-sysup-spans-%Y%m%d-%H%M%S.json"),
+                                          filetypes=[("JSON","*.json"),("All files","*")])
+        if not path: return
+        try:
+            with open(path,"w") as f: json.dump(SPANS.export(),f,indent=1)
+            self.diag_detail.config(text=f"Exported to {path}",fg=T["VER_NEW"])
+        except OSError as e:
+            self.diag_detail.config(text=f"Export failed: {e}",fg=T["VER_OLD"])
+
+    def _diag_tick(self):
+        if self._active_tab!="Diagnostics": self._diag_job=None; return
+        self._diag_refresh()
+        self._diag_job=self.after(1000,self._diag_tick)
+
+    def _diag_refresh(self):
+        self._diag_now=time.perf_counter()-SPANS.t0
+        spans=SPANS.snapshot()
+        running=sum(s["end"] is None for s in spans)
+        self.diag_sum_lbl.config(text=f"{len(spans)} spans · {running} running · keeps {SPANS.done.maxlen}")
+        # The table only changes when spans start or finish; running rows tick with the timeline
+        seen=(spans[-1]["id"] if spans else 0,len(spans),running)
+        if seen!=self._diag_seen or running:
+            self._diag_seen=seen
+            self.diag_table.set_rows(spans[::-1],"No spans recorded yet.",keep_view=True)
+        self._draw_diag(spans)
+
+    def _draw_diag(self, spans=None):
+        c=self.diag_canvas; c.delete("all"); self._diag_items={}
+        W=c.winfo_width()
+        if W<50: return
+        spans=SPANS.snapshot() if spans is None else spans
+        now=self._diag_now=time.perf_counter()-SPANS.t0
+        win=self._DIAG_WINDOWS[self._diag_win][0]
+        t0=max(0.0,now-win) if win else (spans[0]["start"] if spans else 0.0)
+        spans=[s for s in spans if (s["end"] if s["end"] is not None else now)>=t0]
+        R,LW=self._DIAG_ROW,self._DIAG_LANE_W
+        scale=(W-LW-8)/max(now-t0,1e-3)
+        cw=tkfont.Font(font=MONO_S).measure("0")
+        # Time axis: seconds before now, at a step that gives at most ~8 ticks
+        step=next((s for s in (0.01,0.05,0.1,0.5,1,2,5,10,30,60,120,300,600,1800) if (now-t0)/s<=8),3600)
+        t=now
+        while t>=t0:
+            x=LW+(t-t0)*scale
+            c.create_line(x,14,x,10000,fill=T["BORDER"],tags="grid")
+            c.create_text(x,2,text="now" if t==now else f"-{round(now-t,2):g}s",anchor="n",font=MONO_S,fill=T["FG_DIM"])
+            t-=step
+        lanes={}
+        for s in spans: lanes.setdefault(s["thread"],[]).append(s)
+        y=20
+        for th,ss in sorted(lanes.items(),key=lambda kv:(kv[0]!="MainThread",kv[1][0]["start"])):
+            depth=max(s["depth"] for s in ss)+1
+            c.create_rectangle(0,y-2,W,y+depth*R,fill=T["BG"],outline="",tags="lane")
+            c.create_text(8,y,text=re.sub(r"^Thread-(\d+) \((\w+)\)$",r"\2 #\1",th)[:LW//cw-1],
+                          anchor="nw",font=MONO_S,fill=T["FG_DIM"])
+            for s in ss:
+                x0=LW+(max(s["start"],t0)-t0)*scale
+                x1=max(x0+1,LW+((s["end"] if s["end"] is not None else now)-t0)*scale)
+                yy=y+s["depth"]*R
+                it=c.create_rectangle(x0,yy,x1,yy+R-2,fill=T[self._diag_kind(s)],outline=T["BG_PANEL"])
+                self._diag_items[it]=s
+                n=int((x1-x0-4)//cw)
+                if n>=4:
+                    self._diag_items[c.create_text(x0+2,yy+(R-2)//2,text=s["name"][:n],anchor="w",
+                                                   font=MONO_S,fill=T["BG"])]=s
+            y+=depth*R+6
+        c.tag_lower("grid"); c.tag_lower("lane")
+        c.configure(scrollregion=(0,0,W,max(y,c.winfo_height())))
+
+    def _diag_motion(self, e):
+        s=self._diag_items.get(next(iter(self.diag_canvas.find_withtag("current")),None))
+        if s: self._diag_show(s)
+
+    def _diag_show(self, s):
+        extra=[f"{s['procs']} proc{'s' if s['procs']!=1 else ''}" if s["procs"] else "",
+               fmt_bytes(s["bytes"]) if s["bytes"] else "",s["thread"]]
+        extra+=[f"{k}={v}" for k,v in s["attrs"].items()]
+        self.diag_detail.config(text=f"{s['name']}  {self._diag_dur(s,self._diag_now)}  · "+" · ".join(x for x in extra if x),
+                                fg=T["FG"])
 
     # ══════════════════════════════════════════════════════════════════════════
     # SHARED UTILITIES
     # ══════════════════════════════════════════════════════════════════════════
-    def _prompt_sudo(self, prompt="Enter your sudo password:"):
-        if self._sudo_pw and verify_sudo(self._sudo_pw): return self._sudo_pw
-        result,done=[None],threading.Event()
-        def _do():
-            dlg=SudoDialog(self,prompt); self.wait_window(dlg)
-            if dlg.result is None: done.set(); return
-            if verify_sudo(dlg.result): result[0]=dlg.result; done.set(); return
-            dlg2=SudoDialog(self,prompt); dlg2.show_error("Incorrect password. Please try again.")
-            self.wait_window(dlg2)
-            if dlg2.result and verify_sudo(dlg2.result): result[0]=dlg2.result
-            done.set()
-        self.after(0,_do); done.wait(); return result[0]
-
-    def _stream_sudo(self, cmd):
-        proc=run_sudo_cmd(self._sudo_pw,cmd)
-        for line in proc.stdout: self._log_line(line.rstrip(),T["FG"])
-        proc.wait()
-        if proc.returncode not in (0,None): self._log_line(f"Exit code: {proc.returncode}",T["VER_OLD"])
-
-    def _stream_cmd(self, cmd):
+    # ── Transaction queue hooks (worker thread) and status ──
+    def _tx_start(self, job):
+        """Each job gets a fresh log and transcript; the clear must land before its first line."""
+        ready=threading.Event()
+        def _do(): self._show_log(); self._log_clear(); ready.set()
+        self.after(0,_do); ready.wait()
+        self._log_line(f"▶ {TransactionQueue.describe(job)}",T["ACCENT"])
+
+    def _tx_prepare(self):
+        if self._prefetch_proc:
+            self._log_line("Stopping background prefetch — already downloaded packages are reused.",T["FG_DIM"])
+            self._stop_prefetch()
+
+    def _tx_controls(self, *btns, retry=None):
+        """on_done for a queued job: re-enable the buttons disabled when it was submitted,
+        whether it finished, failed or was cancelled. `retry` only comes back if it did
+        not finish (after a success the refresh that follows decides)."""
+        def _done(job):
+            for b in btns: b.enable()
+            if retry and job["state"]!="done": retry.enable()
+        cb=lambda job:self.after(0,_done,job)
+        cb.controls=btns+((retry,) if retry else ())     # to disable again when the job is retried
+        return cb
+
+    def _tx_wait(self, job, holder):
+        self._log_line(f"⏳ Waiting for the pacman database lock — held by {holder}",T["BTN_ORANGE"])
+
+    def _tx_error(self, job, e):
+        if isinstance(e,DbLocked): e=f"database still locked after {TransactionQueue.RETRIES} attempts"
+        if isinstance(e,DbLockStale):
+            e=f"{DB_LOCK} is stale — no package manager has held it for {TransactionQueue.STALE_WAIT}s"
+            self.after(0,self._offer_unlock,job)
+        if isinstance(e,subprocess.CalledProcessError): e=f"{os.path.basename(e.cmd[0])} exited with status {e.returncode}"
+        self._log_line(f"✗ {job['label']} failed: {e}",T["VER_OLD"])
+
+    def _offer_unlock(self, job):
+        """Jobs gave up on a stale db.lck: offer to remove it through the helper, then retry them."""
+        self._stale_jobs.append(job)
+        if len(self._stale_jobs)>1: return                # the question is already on screen
+        ok=messagebox.askyesno("Stale Database Lock",
+            f"{DB_LOCK} exists, but no pacman or other package manager is running.\n"
+            "It was most likely left behind by an interrupted pacman.\n\nRemove the lock and retry?",parent=self)
+        jobs,self._stale_jobs=self._stale_jobs,[]
+        if not ok: return
+        def _rm():
+            rm=self._helper.remove_stale_lock(); out=rm.read().decode("utf-8","replace").strip()
+            if rm.wait():
+                self._log_line(out or f"✗ Could not remove {DB_LOCK}",T["VER_OLD"]); return
+            self._log_line(f"✓ Removed stale {DB_LOCK}",T["VER_NEW"])
+            self.after(0,_retry)
+        def _retry():
+            for j in jobs:
+                for cb in j["on_done"]:
+                    for b in getattr(cb,"controls",()): b.disable()
+                self._txq.retry(j)
+        threading.Thread(target=_rm,daemon=True).start()
+
+    def _txq_show(self):
+        q=self._txq; cur,n=q.current,len(q.pending)
+        if cur and q.waiting: text,fg=f"⏳ {cur['label']} — waiting for pacman lock",T["BTN_ORANGE"]
+        elif cur:             text,fg=f"▶ {cur['label']}",T["ACCENT"]
+        else:                 text,fg="",T["FG_DIM"]
+        if n: text+=f"{'  ·  ' if text else ''}{n} queued"
+        self.txq_lbl.config(text=text,fg=fg)
+        if self._txq_table:
+            try: self._txq_table.set_rows(q.jobs(),"✓  Queue is empty.","VER_NEW",keep_view=True)
+            except tk.TclError: self._txq_table=None
+
+    def _txq_dialog(self):
+        """Pending and running transactions; queued ones can be cancelled."""
+        if self._txq_table: self._txq_table.winfo_toplevel().lift(); return
+        dlg=tk.Toplevel(self); dlg.title("Transaction Queue")
+        dlg.configure(bg=T["BG"]); dlg.geometry("640x320"); dlg.transient(self)
+        tk.Label(dlg,text="Transaction Queue",font=MONO_B,bg=T["BG"],fg=T["ACCENT"]).pack(pady=(16,2))
+        tk.Label(dlg,text="Runs one at a time; jobs that touch the package database wait for its lock.",
+                 font=MONO_S,bg=T["BG"],fg=T["FG_DIM"]).pack(pady=(0,10))
+        waiting=lambda j:j["state"]=="running" and self._txq.waiting
+        self._txq_table=VirtualTable(dlg,[
+            {"text":lambda j:"waiting" if waiting(j) else j["state"],"width":10,"font":MONO_SB,
+             "fg":lambda j:"BTN_ORANGE" if waiting(j) else ("ACCENT" if j["state"]=="running" else "FG_DIM")},
+            {"text":TransactionQueue.describe,"width":None,"fg":"FG"},
+            {"action":lambda j:" ✕ Cancel " if j["state"]=="queued" else None,"font":MONO_S,"bg":"BTN_RED",
+             "on_click":self._txq.cancel}],row_h=30)
+        self._txq_table.pack(fill="both",expand=True,padx=20)
+        def _close(): self._txq_table=None; dlg.destroy()
+        _make_btn(dlg,"  Close  ",_close,"BTN_BG","BTN_HOVER").pack(pady=12)
+        dlg.protocol("WM_DELETE_WINDOW",_close)
+        self._txq_show()
+
+    def _ensure_helper(self, prompt="Enter your sudo password:"):
+        """Main thread: make sure the privileged helper is up, asking for the password
+        only when it is not. The password goes to sudo once and is not kept."""
+        if self._helper.alive(): return True
+        dlg=SudoDialog(self,prompt); self.wait_window(dlg)
+        while dlg.result is not None:
+            err=self._helper.start(dlg.result)
+            if err is None: return True
+            dlg=SudoDialog(self,prompt); dlg.show_error(err); self.wait_window(dlg)
+        return False
+
+    def _stream_sudo(self, cmd, expected=0, mirrors=False):
+        """Run cmd through the helper, streaming its output to the log. A non-zero exit
+        raises (DbLocked when pacman could not get the lock, else CalledProcessError)
+        so the queued job fails. mirrors: fold the run into the mirror health store,
+        failed runs included."""
+        # pacman only draws progress bars on a terminal: the helper gives it a 120-column pty
+        with SPANS.span("sudo "+cmd[0],argv=" ".join(map(str,cmd))[:200]):
+            proc=self._helper.run(cmd,columns=120 if cmd[0]=="pacman" else None); SPANS.note(1)
+            pp=self._pump(proc,expected)
+        if mirrors: self._record_transaction_mirrors(pp)
+        if proc.returncode not in (0,None):
+            if pp.locked: raise DbLocked(cmd[0])
+            raise subprocess.CalledProcessError(proc.returncode,cmd)
+        return pp
+
+    def _stream_cmd(self, cmd, expected=0):
+        with SPANS.span(os.path.basename(cmd[0]),argv=" ".join(map(str,cmd))[:200]):
+            # A pty, so the pacman the AUR helper runs draws its progress too
+            proc,fd=popen_pty(cmd,120,stdin=None,env={**os.environ,"COLUMNS":"120"}); SPANS.note(1)
+            try: self._pump(proc,expected,read=lambda:read_pty(fd))
+            finally: os.close(fd)
+        if proc.returncode: raise subprocess.CalledProcessError(proc.returncode,cmd)
+
+    def _pump(self, proc, expected=0, read=None):
+        """Read proc's output (or read() chunks, for a pty) through a ProgressParser:
+        finished lines go to the log, progress redraws only update the state the
+        progress panel samples. Returns the parser."""
+        pp=ProgressParser(expected); self._prog=pp
+        raw=getattr(proc.stdout,"buffer",proc.stdout); dec=codecs.getincrementaldecoder("utf-8")("replace")
         try:
-            proc=subprocess.Popen(cmd,stdout=subprocess.PIPE,stderr=subprocess.STDOUT,text=True,bufsize=1)
-            for line in proc.stdout: self._log_line(line.rstrip(),T["FG"])
+            for chunk in iter(read or (lambda:raw.read1(65536)),b""):
+                SPANS.note(0,len(chunk))
+                for kind,val in pp.feed(dec.decode(chunk)):
+                    if kind=="line": self._log_line(val,T["FG"])
+            for kind,val in pp.feed(dec.decode(b"",True))+pp.close():
+                if kind=="line": self._log_line(val,T["FG"])
             proc.wait()
-        except Exception as e: self._log_line(f"Error: {e}",T["VER_OLD"])
+        finally:
+            if self._prog is pp: self._prog=None
+        return pp
 
     def _set_status(self,msg,color=None): self.status_lbl.config(text=msg,fg=color or T["FG_DIM"])
     def _show_log(self): self.log_frame.pack(fill="x")
     def _hide_log(self): self.log_frame.pack_forget()
 
     def _log_clear(self):
+        # Each clear starts a new transaction, so it also starts a new transcript
+        self._log_q.clear(); self._log_close()
+        self._log_first=0
+        self.log_more_lbl.pack_forget(); self.log_file_lbl.config(text="")
         self.log_text.config(state="normal"); self.log_text.delete("1.0","end"); self.log_text.config(state="disabled")
 
+    def _log_open(self):
+        d=os.path.dirname(xdg_path("state","logs/x"))
+        try:
+            old=sorted(f for f in os.listdir(d) if f.endswith(".log.gz"))
+            for f in old[:max(0,len(old)-LOG_KEEP_FILES+1)]: os.unlink(os.path.join(d,f))
+            self._log_path=os.path.join(d,time.strftime("%Y%m%d-%H%M%S")+f"-{os.getpid()}.log.gz")
+            self._log_file=gzip.open(self._log_path,"at",encoding="utf-8")
+            self.log_file_lbl.config(text=f"transcript: {self._log_path}")
+        except OSError:
+            self._log_file=None; self._log_path=None
+
+    def _log_close(self):
+        if self._log_file:
+            try: self._log_file.close()
+            except OSError: pass
+        self._log_file=None
+
+    def destroy(self):
+        self._stop_prefetch(); self._helper.close(); self._log_close(); super().destroy()
+
+    def _log_spill_lines(self):
+        """Iterate (lineno, text) over the current transcript without loading it whole.
+        Call _log_sync() on the Tk thread first so the reader sees every line."""
+        if not self._log_path: return
+        try:
+            with gzip.open(self._log_path,"rt",encoding="utf-8",errors="replace") as f:
+                for n,line in enumerate(f): yield n,line.rstrip("\n")
+        except (OSError,EOFError): return   # live file has no gzip trailer yet
+
+    def _log_sync(self):
+        if self._log_file:
+            try: self._log_file.flush()   # zlib sync-flush; the file stays readable mid-stream
+            except OSError: pass
+
+    def _log_load_more(self, count=1000):
+        """Prepend up to `count` transcript lines that were trimmed from the widget."""
+        end=self._log_first
+        if end<=0: return
+        self._log_sync()
+        chunk=collections.deque(maxlen=count)
+        for n,line in self._log_spill_lines():
+            if n>=end: break
+            chunk.append(line)
+        if not chunk: return
+        self.log_text.config(state="normal")
+        self.log_text.insert("1.0","".join(l+"\n" for l in chunk),"c_def")
+        self.log_text.config(state="disabled"); self.log_text.see("1.0")
+        self._log_first=end-len(chunk)
+        if self._log_first<=0: self.log_more_lbl.pack_forget()
+
+    def _log_search(self):
+        needle=self.log_find_var.get().strip().lower()
+        if not needle or not self._log_path: return
+        self._log_sync()
+        def _run():
+            hits=[]
+            for n,line in self._log_spill_lines():
+                if needle in line.lower():
+                    hits.append(f"{n+1:>7}  {line}")
+                    if len(hits)>=1000: hits.append("… (first 1000 matches)"); break
+            self.after(0,lambda:self._log_show_hits(needle,hits))
+        threading.Thread(target=_run,daemon=True).start()
+
+    def _log_show_hits(self, needle, hits):
+        dlg=tk.Toplevel(self); dlg.title(f"Transcript matches: {needle}")
+        dlg.configure(bg=T["BG"]); dlg.geometry("900x420"); dlg.transient(self)
+        t=tk.Text(dlg,bg=T["BG_LOG"],fg=T["FG"],font=("Monospace",9),relief="flat",bd=0,wrap="none")
+        sb=ttk.Scrollbar(dlg,command=t.yview); t.configure(yscrollcommand=sb.set)
+        sb.pack(side="right",fill="y"); t.pack(fill="both",expand=True)
+        t.insert("end","\n".join(hits) or "No matches."); t.config(state="disabled")
+
     def _log_line(self, text, color=None):
-        def _ins():
+        # Thread-safe: deque.append is atomic, the widget is only touched by _log_flush
+        self._log_q.append((text,color))
+
+    def _log_tag(self, color):
+        tag=f"c_{color or 'def'}"
+        if tag not in self._log_tags:
+            self.log_text.tag_configure(tag,foreground=color); self._log_tags.add(tag)
+        return tag
+
+    def _log_flush(self):
+        q=self._log_q
+        if q:
+            args=[]; n=min(len(q),LOG_BATCH_MAX)
+            for _ in range(n):
+                text,color=q.popleft(); args+=(text+"\n",self._log_tag(color))
+            if self._log_file is None: self._log_open()
+            if self._log_file:
+                try: self._log_file.write("".join(args[0::2]))
+                except OSError: pass
             self.log_text.config(state="normal")
-            tag=f"c_{color or 'def'}"; self.log_text.tag_configure(tag,foreground=color or T["FG"])
-            self.log_text.insert("end",text+"\n",tag)
+            self.log_text.insert("end",*args)
+            # Bound the widget: drop the oldest lines, they stay in the transcript
+            extra=int(self.log_text.index("end-1c").split(".")[0])-1-LOG_KEEP_LINES
+            if extra>0:
+                self.log_text.delete("1.0",f"{extra+1}.0"); self._log_first+=extra
+                if self._log_path: self.log_more_lbl.pack(side="left",padx=(0,12),before=self.log_file_lbl)
             self.log_text.see("end"); self.log_text.config(state="disabled")
-        self.after(0,_ins)
+        self._prog_draw()
+        self.after(LOG_FLUSH_MS,self._log_flush)
+
+    def _prog_draw(self):
+        # Runs on the flush tick, so progress redraws are capped at the log frame rate
+        pp=self._prog
+        snap=pp.snapshot() if pp else None
+        if snap==self._prog_shown: return
+        if (snap is None)!=(self._prog_shown is None):
+            if snap: self.prog_frame.pack(fill="x",pady=(0,2),before=self.log_text)
+            else:    self.prog_frame.pack_forget()
+        self._prog_shown=snap
+        if not snap: return
+        label,frac,detail=snap
+        self.prog_lbl.config(text=label[:60]); self.prog_detail.config(text=detail)
+        c=self.prog_bar; c.delete("all"); W=c.winfo_width()
+        if frac is not None: c.create_rectangle(0,0,int(W*frac),8,fill=T["ACCENT"],outline="")
 
     def _prompt_reboot(self):
         dlg=tk.Toplevel(self); dlg.title("Reboot Required")
@@ -1820,7 +4405,10 @@ class SysUpApp(tk.Tk):
         tk.Label(dlg,text="⚠  Kernel Updated",font=("Monospace",13,"bold"),bg=T["BG"],fg=T["KERNEL_FG"]).pack(pady=(24,6))
         tk.Label(dlg,text="A new kernel was installed.\nReboot now to apply it?",font=MONO,bg=T["BG"],fg=T["FG"],justify="center").pack(pady=(0,20))
         br=tk.Frame(dlg,bg=T["BG"]); br.pack()
-        def do_reboot(): dlg.destroy(); subprocess.Popen(["sudo","reboot"])
+        def do_reboot():
+            dlg.destroy()
+            if self._helper.alive(): self._helper.run(["reboot"])
+            else: subprocess.Popen(["sudo","reboot"])
         def dismiss(): dlg.destroy(); self.refresh_btn.enable()
         _make_btn(br,"  Reboot Now  ",do_reboot,"BTN_RED","BTN_RED_H","#ffffff").pack(side="left",padx=(0,12))
         _make_btn(br,"  Later  ",dismiss,"BTN_BG","BTN_HOVER").pack(side="left")
@@ -1874,9 +4462,13 @@ def _set_window_icon(app):
             pass
 
 if __name__=="__main__":
+    prof=next((a for a in sys.argv[1:] if a.split("=",1)[0]==PROFILE_FLAG),None)
+    if prof: PROFILE=LoopProfiler(prof.partition("=")[2] or None)
     app=SysUpApp()
     style=ttk.Style(app); style.theme_use("clam")
     style.configure("Vertical.TScrollbar",background=T["BTN_BG"],troughcolor=T["BG_PANEL"],
                     arrowcolor=T["FG_DIM"],bordercolor=T["BORDER"])
     _set_window_icon(app)
+    if PROFILE: PROFILE.attach(app)
     app.mainloop()
+    if PROFILE: print(f"profile report: {PROFILE.report()}",file=sys.stderr)
@@ -2,22 +2,102 @@
 import subprocess
 import time
 import os
+import re
+import json
+import argparse
+import ctypes
+import ctypes.util
+import select
 
 # --- Agnostic Configuration ---
-CHECK_INTERVAL = 3600 
+CHECK_INTERVAL = 3600   # upper bound between checks; db changes trigger one sooner
+SETTLE_SECONDS = 20     # quiet period after the last db change before re-checking
 SCRIPT_CMD = "/usr/bin/arch-sysup" # We will symlink the main script here
 ICON_PATH = "/usr/share/icons/hicolor/scalable/apps/arch-sysup.svg"
+PACMAN_DBPATH = "/var/lib/pacman"
+
+# --- Shared update state (read by arch-sysup at startup) ---
+# Must match UPDATE_STATE_VERSION / db_fingerprint() in arch-sysup.py
+STATE_VERSION = 1
+
+def state_path():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    os.makedirs(os.path.join(base, "arch-sysup"), exist_ok=True)
+    return os.path.join(base, "arch-sysup", "update-state.json")
+
+def db_fingerprint(dbpath=PACMAN_DBPATH):
+    fp = {}
+    sync = os.path.join(dbpath, "sync")
+    try:
+        names = sorted(f for f in os.listdir(sync) if f.endswith(".db"))
+    except OSError:
+        names = []
+    for f in names:
+        try:
+            fp[f] = os.stat(os.path.join(sync, f)).st_mtime_ns
+        except OSError:
+            pass
+    try:
+        fp["local"] = os.stat(os.path.join(dbpath, "local")).st_mtime_ns
+    except OSError:
+        pass
+    return fp
+
+def parse_updates(text, source):
+    updates = []
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) >= 4:  # pkgname oldver -> newver
+            updates.append({"pkg": parts[0], "old": parts[1], "new": parts[3], "source": source})
+    return updates
+
+def resolve_repos(updates):
+    # One pacman -Si for all official updates so the GUI can render the cached list as-is
+    official = [u for u in updates if u["source"] == "official"]
+    repos, sizes = {}, {}
+    if official:
+        try:
+            out = subprocess.run(["pacman", "-Si"] + [u["pkg"] for u in official],
+                                 capture_output=True, text=True, timeout=60).stdout
+        except Exception:
+            out = ""
+        for block in out.split("\n\n"):
+            name = re.search(r'^Name\s*:\s*(\S+)', block, re.M)
+            repo = re.search(r'^Repository\s*:\s*(\S+)', block, re.M)
+            if name and repo and name.group(1) not in repos:
+                repos[name.group(1)] = repo.group(1)
+                size = re.search(r'^Download Size\s*:\s*([\d.,]+)\s*([KMG]?)i?B', block, re.M)
+                if size:
+                    sizes[name.group(1)] = int(float(size.group(1).replace(",", "."))
+                                               * 1024 ** " KMG".index(size.group(2) or " "))
+    for u in updates:
+        u["repo"] = repos.get(u["pkg"], "AUR")
+        u["dl_size"] = sizes.get(u["pkg"], 0)
+
+def save_state(updates):
+    path = state_path()
+    state = {"version": STATE_VERSION, "timestamp": time.time(),
+             "fingerprint": db_fingerprint(), "updates": updates}
+    try:
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass
 
 def get_updates():
-    repo_count = 0
-    aur_count = 0
-    
-    # Check official repos
+    updates = []
+    ok = True
+
+    # Check official repos (exit code 2 just means "nothing to update")
     try:
-        repo_out = subprocess.check_output(["checkupdates"], text=True).strip()
-        repo_count = len(repo_out.split('\n')) if repo_out else 0
-    except subprocess.CalledProcessError:
-        repo_count = 0
+        repo_out = subprocess.run(["checkupdates"], capture_output=True, text=True)
+        if repo_out.returncode == 0:
+            updates += parse_updates(repo_out.stdout, "official")
+        elif repo_out.returncode != 2:
+            ok = False
+    except Exception:
+        ok = False
 
     # Check AUR
     aur_helper = None
@@ -29,12 +109,73 @@ def get_updates():
     if aur_helper:
         try:
             aur_out = subprocess.check_output([aur_helper, "-Qua"], text=True).strip()
-            aur_count = len(aur_out.split('\n')) if aur_out else 0
+            updates += parse_updates(aur_out, "aur")
         except subprocess.CalledProcessError:
-            aur_count = 0
-            
+            pass
+        except Exception:
+            ok = False
+
+    resolve_repos(updates)
+    if ok:
+        save_state(updates)
+    repo_count = sum(1 for u in updates if u["source"] == "official")
+    aur_count = len(updates) - repo_count
     return repo_count, aur_count
 
+# --- pacman database watcher (inotify via libc, no extra dependencies) ---
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM  = 0x040
+IN_MOVED_TO    = 0x080
+IN_CREATE      = 0x100
+IN_DELETE      = 0x200
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+def open_db_watch(dbpath=PACMAN_DBPATH):
+    # Watch sync/ (pacman -Sy rewrites the .db files) and local/ (entries come and
+    # go with every transaction). Returns an inotify fd, or None if unavailable.
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    watched = 0
+    for sub in ("sync", "local"):
+        if libc.inotify_add_watch(fd, os.path.join(dbpath, sub).encode(), WATCH_MASK) >= 0:
+            watched += 1
+    if not watched:
+        os.close(fd)
+        return None
+    return fd
+
+def _drain(fd):
+    try:
+        while os.read(fd, 65536):
+            pass
+    except (BlockingIOError, OSError):
+        pass
+
+def wait_for_db_change(fd, timeout, settle=SETTLE_SECONDS, dbpath=PACMAN_DBPATH):
+    # Block until the databases changed and then stayed quiet for `settle` seconds
+    # with no pacman holding the lock, or until `timeout` passes. A whole -Syu
+    # (hundreds of events) therefore collapses into a single re-check. The deadline
+    # holds after a change too, so a stale db.lck cannot block the periodic check.
+    deadline = time.monotonic() + timeout
+    changed = False
+    while True:
+        left = deadline - time.monotonic()
+        wait = min(settle, left) if changed else left
+        if wait <= 0:
+            return changed
+        ready, _, _ = select.select([fd], [], [], wait)
+        if ready:
+            _drain(fd)
+            changed = True
+            continue
+        if changed and not os.path.exists(os.path.join(dbpath, "db.lck")):
+            return True
+
 def send_notification(repo, aur):
     cmd = [
         "notify-send",
@@ -53,9 +194,23 @@ def send_notification(repo, aur):
         pass
 
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Arch-Sysup update notifier")
+    ap.add_argument("--interval", type=int,
+                    default=int(os.environ.get("ARCH_SYSUP_INTERVAL", CHECK_INTERVAL)),
+                    help="maximum seconds between checks (default %(default)s)")
+    ap.add_argument("--settle", type=int, default=SETTLE_SECONDS,
+                    help="quiet seconds after a db change before re-checking")
+    ap.add_argument("--poll", action="store_true",
+                    help="ignore database changes and only check every --interval seconds")
+    args = ap.parse_args()
+
+    watch = None if args.poll else open_db_watch()
     time.sleep(10)
     while True:
         repo, aur = get_updates()
         if repo > 0 or aur > 0:
             send_notification(repo, aur)
-        time.sleep(CHECK_INTERVAL)
+        if watch is None:
+            time.sleep(args.interval)
+        else:
+            wait_for_db_change(watch, args.interval, args.settle)
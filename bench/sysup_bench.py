@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Arch-Sysup benchmark harness — times the hot paths against synthetic pacman data.
+
+Generates local + sync databases, a package cache, a pacman.log and fake
+checkupdates / pacman / yay shims (configurable latency and output size) in a
+scratch directory, then times the same code the GUI runs:
+
+  updates       collect_updates + enrich_updates   (_fetch_updates + _process_parsed_updates_bg)
+  search_db     SyncDB.search over the index         (_fetch_search, sync db path)
+  search_parse  parse_search_output on -Ss output    (_fetch_search, pacman/AUR helper path)
+  stats         collect_stats                        (_fetch_stats)
+  orphans       collect_orphans                      (_fetch_orphans)
+  render        updates_table set_rows + scrolling   (the Updates tab table; needs a display or Xvfb)
+
+plus cold/warm parses of the sync and local dbs. Results go to JSON; --compare
+prints the ratio against an earlier run.
+
+  python bench/sysup_bench.py                          # 2k, 10k, 50k packages
+  python bench/sysup_bench.py --sizes 2000 --repeat 3 --latency 0.05 -o new.json --compare old.json
+"""
+
+import argparse, importlib.util, io, json, os, platform, random, shutil, statistics, subprocess
+import sys, tarfile, tempfile, time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP  = os.path.join(HERE, "..", "Arch-Sysup-V2.py")
+WORDS = ("lib","python","qt","gtk","font","rust","go","perl","data","tool","kit","daemon","utils",
+         "x11","wayland","audio","video","net","crypt","image","docs","git","shell","theme")
+
+# ── Synthetic pacman data ─────────────────────────────────────────────────────
+def _desc(**fields):
+    out=[]
+    for k,v in fields.items():
+        v=v if isinstance(v,list) else [v]
+        if v: out.append(f"%{k}%\n"+"\n".join(map(str,v))+"\n")
+    return ("\n".join(out)+"\n").encode()
+
+def make_packages(n, seed=1):
+    """n package records with names, versions, deps on earlier packages and some provides."""
+    rnd=random.Random(seed); pkgs=[]
+    for i in range(n):
+        name=f"{rnd.choice(WORDS)}-{rnd.choice(WORDS)}-{i}"
+        deps=[pkgs[rnd.randrange(i)]["name"] for _ in range(rnd.randint(0,4))] if i else []
+        pkgs.append({"name":name,"ver":f"{rnd.randint(0,20)}.{rnd.randint(0,99)}-{rnd.randint(1,3)}",
+                     "desc":" ".join(rnd.choice(WORDS) for _ in range(8)),"deps":sorted(set(deps)),
+                     "provides":[f"lib{name}.so=1-64"] if i%17==0 else [],
+                     "csize":rnd.randint(10_000,50_000_000),"isize":rnd.randint(50_000,200_000_000),
+                     "repo":"core" if i%10==0 else "extra"})
+    return pkgs
+
+def write_sync_db(path, pkgs):
+    with tarfile.open(path,"w:gz",compresslevel=6) as tf:
+        for p in pkgs:
+            d=f"{p['name']}-{p['ver']}"
+            data=_desc(FILENAME=f"{d}-x86_64.pkg.tar.zst",NAME=p["name"],VERSION=p["ver"],DESC=p["desc"],
+                       CSIZE=p["csize"],ISIZE=p["isize"],URL="https://example.org",LICENSE="GPL",
+                       ARCH="x86_64",BUILDDATE=1700000000,PACKAGER="Bench <bench@example.org>",
+                       DEPENDS=p["deps"],PROVIDES=p["provides"])
+            ti=tarfile.TarInfo(d+"/desc"); ti.size=len(data); ti.mtime=1700000000
+            tf.addfile(ti,io.BytesIO(data))
+
+def build_tree(base, n, updates, latency, seed=1):
+    """Write dbpath, pacman.conf, cache, pacman.log and shims for n packages under base."""
+    rnd=random.Random(seed+1); pkgs=make_packages(n,seed)
+    dbpath=os.path.join(base,"db"); os.makedirs(os.path.join(dbpath,"sync")); os.makedirs(os.path.join(dbpath,"local"))
+    conf=os.path.join(base,"pacman.conf")
+    with open(conf,"w") as f: f.write("[options]\nArchitecture = auto\n\n[core]\nServer = http://x/$repo\n\n[extra]\nServer = http://x/$repo\n")
+    for repo in ("core","extra"): write_sync_db(os.path.join(dbpath,"sync",repo+".db"),[p for p in pkgs if p["repo"]==repo])
+    # Local: everything installed, 2% foreign, ~20% explicit; dep-only leaves become orphans
+    foreign=[{**make_packages(1,seed+i)[0],"name":f"aur-pkg-{i}"} for i in range(max(1,n//50))]
+    for p in pkgs+foreign:
+        d=os.path.join(dbpath,"local",f"{p['name']}-{p['ver']}"); os.mkdir(d)
+        with open(os.path.join(d,"desc"),"wb") as f:
+            f.write(_desc(NAME=p["name"],VERSION=p["ver"],DESC=p["desc"],SIZE=p["isize"],
+                          REASON=0 if rnd.random()<0.2 else 1,INSTALLDATE=1700000000,DEPENDS=p["deps"],
+                          PROVIDES=p["provides"]))
+    cache=os.path.join(base,"cache"); os.mkdir(cache)
+    for p in pkgs[::2]:
+        for rel in (1,2):
+            fn=os.path.join(cache,f"{p['name']}-{p['ver'].rsplit('-',1)[0]}-{rel}-x86_64.pkg.tar.zst")
+            with open(fn,"wb") as f: f.truncate(p["csize"]//1000)
+    log=os.path.join(base,"pacman.log")
+    with open(log,"w") as f:
+        for i,p in enumerate(pkgs):
+            ts=time.strftime("%Y-%m-%dT%H:%M:%S+0000",time.gmtime(1700000000+i*60))
+            if i%25==0: f.write(f"[{ts}] [PACMAN] Running 'pacman -Syu'\n[{ts}] [ALPM] transaction started\n")
+            f.write(f"[{ts}] [ALPM] upgraded {p['name']} (0.1-1 -> {p['ver']})\n")
+            if i%25==24: f.write(f"[{ts}] [ALPM] transaction completed\n")
+    # Shim output: `name old -> new` for checkupdates / yay -Qua, -Ss listings for search
+    out=os.path.join(base,"out"); os.mkdir(out)
+    ups=rnd.sample(pkgs,min(updates,n))
+    with open(os.path.join(out,"checkupdates"),"w") as f: f.writelines(f"{p['name']} 0.0-1 -> {p['ver']}\n" for p in ups)
+    with open(os.path.join(out,"yay-Qua"),"w") as f: f.writelines(f"{p['name']} 1-1 -> 1-2\n" for p in foreign)
+    with open(os.path.join(out,"Ss"),"w") as f:
+        f.writelines(f"{p['repo']}/{p['name']} {p['ver']} (group){' [installed]' if i%3==0 else ''}\n    {p['desc']}\n"
+                     for i,p in enumerate(pkgs))
+    shims=os.path.join(base,"bin"); os.mkdir(shims)
+    for name,body in (("checkupdates",f'cat "{out}/checkupdates"'),
+                      ("yay",f'case "$1" in -Qua) cat "{out}/yay-Qua";; -Ss) cat "{out}/Ss";; esac'),
+                      ("pacman",f'case "$1" in -Ss) cat "{out}/Ss";; esac')):
+        path=os.path.join(shims,name)
+        with open(path,"w") as f: f.write(f"#!/bin/sh\nsleep {latency}\n{body}\nexit 0\n")
+        os.chmod(path,0o755)
+    return {"dbpath":dbpath,"conf":conf,"cache":cache,"log":log,"bin":shims,"ss":os.path.join(out,"Ss"),
+            "packages":len(pkgs),"installed":len(pkgs)+len(foreign),"updates":len(ups)+len(foreign)}
+
+# ── Harness ───────────────────────────────────────────────────────────────────
+def load_app():
+    spec=importlib.util.spec_from_file_location("arch_sysup",APP)
+    mod=importlib.util.module_from_spec(spec); spec.loader.exec_module(mod)
+    return mod
+
+def timeit(fn, repeat, setup=None):
+    """Run fn repeat times (setup() before each, untimed); min/median/runs in ms."""
+    runs=[]
+    for _ in range(repeat):
+        arg=setup() if setup else None
+        t0=time.perf_counter(); fn(arg) if setup else fn()
+        runs.append((time.perf_counter()-t0)*1000)
+    return {"min":round(min(runs),2),"median":round(statistics.median(runs),2),"runs":[round(r,2) for r in runs]}
+
+def start_display():
+    """(display for Tk or None, Xvfb process or None, reason when None)."""
+    if os.environ.get("DISPLAY"): return os.environ["DISPLAY"],None,None
+    if not shutil.which("Xvfb"): return None,None,"no $DISPLAY and Xvfb not installed (xorg-server-xvfb)"
+    for n in range(99,120):
+        if not os.path.exists(f"/tmp/.X11-unix/X{n}"): break
+    proc=subprocess.Popen(["Xvfb",f":{n}","-screen","0","1280x1024x24","-nolisten","tcp"],
+                          stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+    for _ in range(50):
+        if os.path.exists(f"/tmp/.X11-unix/X{n}"): return f":{n}",proc,None
+        time.sleep(0.1)
+    proc.kill(); return None,None,"Xvfb did not start"
+
+def bench_render(app, rows, repeat):
+    """set_rows + first paint, then paging through the whole table."""
+    import tkinter as tk
+    root=tk.Tk(); root.geometry("1120x600")
+    # the app's own Updates table; every third package has an older build cached
+    table=app.updates_table(root,lambda r:len(r["pkg"])%3==0,lambda r:None)
+    table.pack(fill="both",expand=True); root.update()
+    def fill(): table.set_rows(rows); root.update()
+    def scroll():
+        table.canvas.yview_moveto(0); root.update()
+        for _ in range(50): table.canvas.yview_scroll(1,"pages"); root.update()
+    out={"set_rows":timeit(fill,repeat),"scroll_50_pages":timeit(scroll,repeat)}
+    root.destroy(); return out
+
+def run_size(app, base, n, args):
+    tree=build_tree(base,n,max(1,int(n*args.update_frac)),args.latency,args.seed)
+    os.environ["PATH"]=tree["bin"]+os.pathsep+os.environ["PATH"]
+    try:
+        res={"packages":tree["packages"],"installed":tree["installed"],"update_lines":tree["updates"]}
+        newsync=lambda:app.SyncDB(tree["dbpath"],tree["conf"])
+        res["syncdb_cold"]=timeit(lambda s:s.refresh(),args.repeat,newsync)
+        sdb=newsync().refresh()
+        res["syncdb_warm"]=timeit(sdb.refresh,args.repeat)
+        res["localdb_cold"]=timeit(lambda l:l.refresh(sdb),args.repeat,lambda:app.LocalDB(tree["dbpath"]))
+        ldb=app.LocalDB(tree["dbpath"]).refresh(sdb)
+        res["localdb_warm"]=timeit(lambda:ldb.refresh(sdb),args.repeat)
+        res["updates"]=timeit(lambda:app.collect_updates("yay",sdb),args.repeat)
+        def search():
+            inst=ldb.refresh().pkgs
+            [{"pkg":p["name"],"installed":p["name"] in inst} for p in sdb.search("lib python")]
+        res["search_db"]=timeit(search,args.repeat)
+        with open(tree["ss"]) as f: ss=f.read()
+        res["search_parse"]=timeit(lambda:app.parse_search_output(ss,"pacman"),args.repeat)
+        logidx=lambda:app.PacmanLogIndex(tree["log"],os.path.join(base,f"log-{time.perf_counter_ns()}.sqlite"))
+        res["stats_cold"]=timeit(lambda a:app.collect_stats(sdb,app.LocalDB(tree["dbpath"]),*a),args.repeat,
+                                 lambda:(app.PkgCache(tree["cache"]),logidx()))
+        warm=(app.PkgCache(tree["cache"]),logidx()); app.collect_stats(sdb,ldb,*warm)
+        res["stats_warm"]=timeit(lambda:app.collect_stats(sdb,ldb,*warm),args.repeat)
+        res["orphans_cold"]=timeit(app.collect_orphans,args.repeat,lambda:app.LocalDB(tree["dbpath"]))
+        res["orphans_warm"]=timeit(lambda:app.collect_orphans(ldb),args.repeat)
+        if args.display:
+            rows=[{"repo":p["repo"],"pkg":p["name"],"old":"0.0-1","new":p["ver"],"kernel":app.is_kernel(p["name"])}
+                  for p in sdb.pkgs.values()]
+            res["render"]=bench_render(app,rows,args.repeat)
+        else: res["render"]={"skipped":args.no_display}
+        return res
+    finally:
+        os.environ["PATH"]=os.environ["PATH"].split(os.pathsep,1)[1]
+
+def compare(new, old):
+    diff=[k for k in ("latency","update_frac","seed","cpus") if new["meta"].get(k)!=old.get("meta",{}).get(k)]
+    if diff: print(f"note: runs differ in {', '.join(diff)} — ratios are not like for like",file=sys.stderr)
+    print(f"\n{'':<28}{'old ms':>10}{'new ms':>10}{'ratio':>8}")
+    for size,res in new["results"].items():
+        prev=old.get("results",{}).get(size)
+        if not prev: continue
+        print(f"── {size} packages")
+        flat=lambda r,p="":{k2:v2 for k,v in r.items() if isinstance(v,dict)
+                              for k2,v2 in ({p+k:v} if "median" in v else flat(v,p+k+".")).items()}
+        a,b=flat(prev),flat(res)
+        for k in b:
+            if k in a and a[k]["median"]:
+                ratio=b[k]["median"]/a[k]["median"]
+                print(f"  {k:<26}{a[k]['median']:>10.1f}{b[k]['median']:>10.1f}{ratio:>7.2f}x"
+                      +("  ◀ slower" if ratio>1.15 else ""))
+
+def main():
+    ap=argparse.ArgumentParser(description="Benchmark arch-sysup hot paths on synthetic pacman data.")
+    ap.add_argument("--sizes",default="2000,10000,50000",help="package counts (default %(default)s)")
+    ap.add_argument("--repeat",type=int,default=5,help="timed runs per benchmark (default %(default)s)")
+    ap.add_argument("--latency",type=float,default=0.0,help="seconds each shim sleeps before answering")
+    ap.add_argument("--update-frac",type=float,default=0.05,help="share of packages checkupdates reports")
+    ap.add_argument("--seed",type=int,default=1)
+    ap.add_argument("-o","--out",default="-",help="JSON output file (default stdout)")
+    ap.add_argument("--compare",metavar="OLD.json",help="print new/old median ratios against an earlier run")
+    ap.add_argument("--keep",action="store_true",help="keep the scratch directory")
+    args=ap.parse_args()
+    scratch=tempfile.mkdtemp(prefix="sysup-bench-")
+    os.environ["XDG_CACHE_HOME"]=os.path.join(scratch,"xdg-cache")   # never touch the real caches
+    os.environ["XDG_STATE_HOME"]=os.path.join(scratch,"xdg-state")
+    args.display,xvfb,args.no_display=start_display()
+    if args.display: os.environ["DISPLAY"]=args.display
+    try:
+        app=load_app()
+        rev=subprocess.run(["git","-C",HERE,"describe","--always","--dirty"],capture_output=True,text=True).stdout.strip()
+        report={"meta":{"revision":rev or None,"python":platform.python_version(),"platform":platform.platform(),
+                        "cpus":os.cpu_count(),"date":time.strftime("%Y-%m-%dT%H:%M:%S"),"repeat":args.repeat,
+                        "latency":args.latency,"update_frac":args.update_frac,"seed":args.seed},"results":{}}
+        for n in (int(x) for x in args.sizes.split(",")):
+            print(f"… {n} packages",file=sys.stderr)
+            d=os.path.join(scratch,str(n)); os.mkdir(d)
+            report["results"][str(n)]=run_size(app,d,n,args)
+        text=json.dumps(report,indent=2)
+        if args.out=="-": print(text)
+        else:
+            with open(args.out,"w") as f: f.write(text+"\n")
+        if args.compare:
+            with open(args.compare) as f: compare(report,json.load(f))
+    finally:
+        if xvfb: xvfb.terminate()
+        if args.keep: print(f"scratch kept in {scratch}",file=sys.stderr)
+        else: shutil.rmtree(scratch,ignore_errors=True)
+
+if __name__=="__main__":
+    main()
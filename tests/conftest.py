@@ -0,0 +1,14 @@
+"""Load Arch-Sysup-V2.py (not importable by name) once for the whole test run."""
+
+import importlib.util, os, sys
+
+import pytest
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Arch-Sysup-V2.py")
+
+@pytest.fixture(scope="session")
+def sysup():
+    if "sysup" not in sys.modules:
+        spec=importlib.util.spec_from_file_location("sysup",APP)
+        mod=importlib.util.module_from_spec(spec); sys.modules["sysup"]=mod; spec.loader.exec_module(mod)
+    return sys.modules["sysup"]
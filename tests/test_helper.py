@@ -0,0 +1,183 @@
+"""The privileged helper's allow-list: helper_check() and the write/rm/run ops of
+privileged_helper_main(), driven in-process over fake stdin/stdout."""
+
+import io, json, os, shutil, subprocess, sys, time, types
+
+import pytest
+
+@pytest.fixture
+def cache(sysup, tmp_path, monkeypatch):
+    d=tmp_path/"pkg"; d.mkdir()
+    monkeypatch.setattr(sysup,"PKG_CACHE",str(d))
+    return d
+
+def serve(sysup, monkeypatch, *reqs):
+    """Run the helper on reqs (then quit) and return its replies, keyed by id."""
+    data=b"".join(json.dumps(dict(r,id=i)).encode()+b"\n" for i,r in enumerate(reqs,1))
+    out=io.BytesIO()
+    monkeypatch.setattr(sys,"stdin",io.TextIOWrapper(io.BytesIO(data+b'{"op":"quit"}\n')))
+    monkeypatch.setattr(sys,"stdout",types.SimpleNamespace(buffer=out))
+    assert sysup.privileged_helper_main()==0
+    replies={}
+    for line in out.getvalue().splitlines():
+        msg=json.loads(line)
+        if "exit" in msg: replies[msg["id"]]=msg
+    return [replies[i] for i in range(1,len(reqs)+1)]
+
+# ── helper_check ──────────────────────────────────────────────────────────────
+@pytest.mark.parametrize("argv",[
+    ["pacman","-Syu","--noconfirm"],
+    ["pacman","-S","--needed","core/linux","python-foo","gtk+3","lib32-glibc"],
+    ["pacman","-Rns","--noconfirm","foo"],
+    ["reflector","--latest","5","--save","/etc/pacman.d/mirrorlist"],
+    ["reflector","--save=/etc/pacman.d/mirrorlist","--sort","rate"],
+    ["reboot"],
+])
+def test_allowed(sysup, argv):
+    assert sysup.helper_check(argv) is None
+
+def test_prefetch_only_on_private_dbs(sysup):
+    assert sysup.helper_check(sysup.PREFETCH_ARGV) is None
+    for argv in (["pacman","-Syuw","--noconfirm"],["pacman","-Syuw","--noconfirm","--dbpath","/var/lib/pacman"],
+                 sysup.PREFETCH_ARGV+["foo"],sysup.PREFETCH_ARGV[:-2]):
+        assert sysup.helper_check(argv)
+
+def test_upgrade_from_cache(sysup, cache):
+    pkg=cache/"foo-1.0-1-x86_64.pkg.tar.zst"; pkg.write_bytes(b"")
+    assert sysup.helper_check(["pacman","-U","--noconfirm",str(pkg)]) is None
+
+@pytest.mark.parametrize("rel",[
+    "../outside.pkg.tar.zst",
+    "../pkg/../outside.pkg.tar.zst",
+    "sub/foo-1.0-1-x86_64.pkg.tar.zst",
+    "sub/../../outside.pkg.tar.zst",
+])
+def test_upgrade_outside_cache(sysup, cache, rel):
+    assert sysup.helper_check(["pacman","-U",os.path.join(str(cache),rel)])
+
+def test_upgrade_symlink_in_cache(sysup, cache, tmp_path):
+    target=tmp_path/"evil.pkg.tar.zst"; target.write_bytes(b"")
+    (cache/"foo-1.0-1-x86_64.pkg.tar.zst").symlink_to(target)
+    assert sysup.helper_check(["pacman","-U",str(cache/"foo-1.0-1-x86_64.pkg.tar.zst")])
+
+def test_upgrade_relative(sysup, cache):
+    assert sysup.helper_check(["pacman","-U","foo-1.0-1-x86_64.pkg.tar.zst"])
+
+@pytest.mark.parametrize("flag",[
+    "--config","--config=/tmp/pacman.conf","--overwrite=*","--overwrite","--","--dbpath=/tmp",
+    "--root","--hookdir=/tmp","--cachedir=/tmp","-b","--noconfir","--asdeps",
+])
+def test_flag_not_allowed(sysup, flag):
+    assert sysup.helper_check(["pacman","-S",flag,"foo"])
+    assert sysup.helper_check(["pacman","-Syu","--noconfirm",flag])
+
+@pytest.mark.parametrize("op",["-Q","-Sc","-Scc","-D","-R","-Rdd","-T","--sync",""])
+def test_operation_not_allowed(sysup, op):
+    assert sysup.helper_check(["pacman",op,"foo"])
+
+@pytest.mark.parametrize("name",[
+    "../foo","foo bar","foo;reboot","$(id)","foo/bar/baz","/etc/passwd","","core/","foo\n","-",
+])
+def test_bad_package_name(sysup, name):
+    assert sysup.helper_check(["pacman","-S",name])
+
+@pytest.mark.parametrize("argv",[
+    [],"pacman -Syu",["pacman"],["pacman",1],["sh","-c","id"],["/usr/bin/pacman","-Syu"],
+    ["reboot","now"],["systemctl","reboot"],
+])
+def test_command_not_allowed(sysup, argv):
+    assert sysup.helper_check(argv)
+
+@pytest.mark.parametrize("tail",[
+    [],
+    ["--save","/etc/sudoers"],
+    ["--save=/etc/sudoers"],
+    ["--save","/etc/pacman.d/mirrorlist","--sav","/etc/sudoers"],
+    ["--save","/etc/pacman.d/mirrorlist","--sa=/etc/sudoers"],
+    ["--save","/etc/pacman.d/mirrorlist","--s","/etc/sudoers"],
+    ["--sav","/etc/sudoers","--save","/etc/pacman.d/mirrorlist"],
+    ["--save","/etc/pacman.d/mirrorlist","--save","/etc/pacman.d/mirrorlist"],
+    ["--save","/etc/pacman.d/mirrorlist","@/tmp/args"],
+    ["--save","/etc/pacman.d/mirrorlist","--","--save","/etc/sudoers"],
+    ["--save"],
+    ["--save="],
+])
+def test_reflector_save(sysup, tail):
+    assert sysup.helper_check(["reflector"]+tail)
+
+# ── privileged_helper_main ────────────────────────────────────────────────────
+def test_run_rejected_before_exec(sysup, monkeypatch, tmp_path):
+    flag=tmp_path/"ran"
+    r,=serve(sysup,monkeypatch,{"op":"run","argv":["sh","-c",f"touch {flag}"]})
+    assert r["exit"]==126 and "not allowed" in r["error"] and not flag.exists()
+
+def test_write_outside_allow_list(sysup, monkeypatch, tmp_path):
+    target=tmp_path/"passwd"
+    replies=serve(sysup,monkeypatch,{"op":"write","path":str(target),"data":"x"},
+                  {"op":"write","path":sysup.MIRRORLIST+"/../../sudoers","data":"x"},
+                  {"op":"write","path":None,"data":"x"})
+    assert [r["exit"] for r in replies]==[126,126,126] and not target.exists()
+
+def test_write_allowed(sysup, monkeypatch, tmp_path):
+    target=tmp_path/"mirrorlist"; target.write_text("old\n"); target.chmod(0o640)
+    monkeypatch.setattr(sysup,"_HELPER_WRITABLE",{str(target)})
+    r,=serve(sysup,monkeypatch,{"op":"write","path":str(target),"data":"new\n","backup":True})
+    assert r["exit"]==0 and target.read_text()=="new\n" and (tmp_path/"mirrorlist.bak").read_text()=="old\n"
+    assert target.stat().st_mode&0o777==0o640
+
+def test_rm_outside_cache(sysup, monkeypatch, cache, tmp_path):
+    outside=tmp_path/"keep"; outside.write_text("x")
+    (cache/"sub").mkdir(); nested=cache/"sub"/"foo.pkg.tar.zst"; nested.write_text("x")
+    link=cache/"link.pkg.tar.zst"; link.symlink_to(outside)
+    ok=cache/"foo-1.0-1-x86_64.pkg.tar.zst"; ok.write_text("x")
+    replies=serve(sysup,monkeypatch,{"op":"rm","paths":[str(outside)]},
+                  {"op":"rm","paths":[str(nested)]},
+                  {"op":"rm","paths":[str(link)]},
+                  {"op":"rm","paths":[str(cache/".."/"keep")]},
+                  {"op":"rm","paths":[str(ok),str(outside)]},
+                  {"op":"rm","paths":[sysup.PACMAN_CONF]})
+    assert [r["exit"] for r in replies]==[126]*6
+    assert outside.exists() and nested.exists() and link.is_symlink() and ok.exists()
+
+def test_rm_in_cache(sysup, monkeypatch, cache):
+    pkgs=[cache/"foo-1.0-1-x86_64.pkg.tar.zst",cache/"foo-1.0-1-x86_64.pkg.tar.zst.sig"]
+    for p in pkgs: p.write_text("x")
+    r,=serve(sysup,monkeypatch,{"op":"rm","paths":[str(p) for p in pkgs]})
+    assert r["exit"]==0 and not any(p.exists() for p in pkgs)
+
+@pytest.fixture
+def lock(sysup, monkeypatch, tmp_path):
+    path=tmp_path/"db.lck"; path.write_text("")
+    monkeypatch.setattr(sysup,"DB_LOCK",str(path))
+    return path
+
+def test_rm_lock_while_pacman_runs(sysup, monkeypatch, lock, tmp_path):
+    fake=tmp_path/"pacman"; shutil.copy(shutil.which("sleep"),fake)   # /proc/<pid>/comm == "pacman"
+    proc=subprocess.Popen([str(fake),"30"])
+    try:
+        deadline=time.monotonic()+5
+        while sysup.db_lock_holder(str(lock))==sysup.STALE_LOCK and time.monotonic()<deadline: time.sleep(0.01)
+        r,=serve(sysup,monkeypatch,{"op":"rm","paths":[str(lock)]})
+        assert r["exit"]==126 and "pacman" in r["error"] and lock.exists()
+    finally:
+        proc.kill(); proc.wait()
+
+def test_rm_stale_lock(sysup, monkeypatch, lock):
+    if sysup.db_lock_holder(str(lock))!=sysup.STALE_LOCK: pytest.skip("a package manager is running")
+    r,=serve(sysup,monkeypatch,{"op":"rm","paths":[str(lock)]})
+    assert r["exit"]==0 and not lock.exists()
+
+def test_rm_lock_with_other_paths(sysup, monkeypatch, lock, cache):
+    r,=serve(sysup,monkeypatch,{"op":"rm","paths":[str(lock),str(cache/"x.pkg.tar.zst")]})
+    assert r["exit"]==126 and lock.exists()
+
+def test_seed_dbpath(sysup, tmp_path):
+    src=tmp_path/"live"; (src/"local").mkdir(parents=True); (src/"sync").mkdir()
+    (src/"sync"/"core.db").write_text("live"); os.utime(src/"sync"/"core.db",(1000,1000))
+    dst=tmp_path/"private"; sysup.seed_dbpath(str(dst),str(src))
+    assert os.readlink(dst/"local")==str(src/"local")
+    assert (dst/"sync"/"core.db").read_text()=="live" and (dst/"sync"/"core.db").stat().st_mtime==1000
+    (dst/"sync"/"core.db").write_text("newer"); (dst/"db.lck").write_text("")
+    sysup.seed_dbpath(str(dst),str(src))
+    assert (dst/"sync"/"core.db").read_text()=="newer"          # not overwritten by the live copy
+    if sysup.db_lock_holder(str(dst/"db.lck"))==sysup.STALE_LOCK: assert not (dst/"db.lck").exists()
@@ -0,0 +1,117 @@
+"""Mirror prober against local HTTP stand-ins with injected delays and failures."""
+
+import http.server, socket, threading, time
+
+import pytest
+
+DB = bytes(range(256))*1024          # 256 KiB stand-in core.db
+LASTSYNC = 1700000000
+
+class Mirror(http.server.BaseHTTPRequestHandler):
+    """The first path segment picks the behaviour: fast, slow (late first byte),
+    missing (404), hang (no response past the timeout), stall (stops mid-body)."""
+    def do_GET(self):
+        kind,_,rest=self.path.lstrip("/").partition("/")
+        if kind=="hang": time.sleep(2); return
+        if kind=="missing": self.send_error(404); return
+        if rest=="lastsync": body=str(LASTSYNC).encode()
+        elif rest.endswith("/core.db"): body=DB
+        else: self.send_error(404); return
+        if kind=="slow" and body is DB: time.sleep(0.3)
+        self.send_response(200); self.send_header("Content-Length",str(len(body))); self.end_headers()
+        if kind=="stall": self.wfile.write(body[:4096]); self.wfile.flush(); time.sleep(2); return
+        self.wfile.write(body)
+    def log_message(self, *a): pass
+
+@pytest.fixture(scope="module")
+def mirror():
+    srv=http.server.ThreadingHTTPServer(("127.0.0.1",0),Mirror); srv.daemon_threads=True
+    threading.Thread(target=srv.serve_forever,daemon=True).start()
+    yield lambda kind:f"http://127.0.0.1:{srv.server_port}/{kind}/$repo/os/$arch"
+    srv.shutdown(); srv.server_close()
+
+@pytest.fixture
+def refused():
+    s=socket.socket(); s.bind(("127.0.0.1",0)); port=s.getsockname()[1]; s.close()
+    return f"http://127.0.0.1:{port}/$repo/os/$arch"
+
+# ── probe_mirror ──────────────────────────────────────────────────────────────
+def test_fast(sysup, mirror):
+    r=sysup.probe_mirror(mirror("fast"),timeout=2,arch="x86_64")
+    assert r["ok"] and not r["error"] and r["bytes"]==len(DB) and r["rate"]>0
+    assert r["url"].endswith("/fast/core/os/x86_64/core.db") and r["lastsync"]==LASTSYNC
+
+def test_max_bytes(sysup, mirror):
+    r=sysup.probe_mirror(mirror("fast"),timeout=2,max_bytes=1)
+    assert r["ok"] and 0<r["bytes"]<len(DB)
+
+def test_slow_first_byte(sysup, mirror):
+    r=sysup.probe_mirror(mirror("slow"),timeout=2)
+    assert r["ok"] and r["ttfb"]>=0.3 and r["connect"]<0.3
+
+def test_not_found(sysup, mirror):
+    r=sysup.probe_mirror(mirror("missing"),timeout=2)
+    assert not r["ok"] and r["error"]=="HTTP 404" and r["lastsync"] is None
+
+def test_refused(sysup, refused):
+    r=sysup.probe_mirror(refused,timeout=2)
+    assert not r["ok"] and r["error"] and r["connect"] is None
+
+@pytest.mark.parametrize("kind",["hang","stall"])
+def test_timeout(sysup, mirror, kind):
+    t0=time.monotonic(); r=sysup.probe_mirror(mirror(kind),timeout=0.5)
+    assert not r["ok"] and r["error"] and time.monotonic()-t0<1.5
+
+def test_unsupported_scheme(sysup):
+    r=sysup.probe_mirror("ftp://example.org/$repo/os/$arch")
+    assert not r["ok"] and r["error"]=="unsupported: ftp"
+
+# ── probe_mirrors ─────────────────────────────────────────────────────────────
+def test_rank_and_stream(sysup, mirror, refused):
+    servers=[mirror("slow"),mirror("missing"),mirror("fast"),refused,mirror("hang")]
+    seen=[]; lock=threading.Lock()
+    def on_result(r):
+        with lock: seen.append((r["server"],threading.current_thread() is not threading.main_thread()))
+    ranked=sysup.probe_mirrors(servers,workers=5,timeout=1,on_result=on_result)
+    assert [r["server"] for r in ranked[:2]]==[mirror("fast"),mirror("slow")]
+    assert {r["server"] for r in ranked[2:]}=={mirror("missing"),refused,mirror("hang")}
+    assert not any(r["ok"] for r in ranked[2:])
+    assert sorted(s for s,_ in seen)==sorted(servers) and all(t for _,t in seen)
+    # results arrive as each probe finishes, not in submission order
+    order=[s for s,_ in seen]
+    assert order.index(mirror("fast"))<order.index(mirror("slow"))<order.index(mirror("hang"))
+
+def test_stop(sysup, mirror):
+    stop=threading.Event(); seen=[]
+    def on_result(r): seen.append(r); stop.set()
+    ranked=sysup.probe_mirrors([mirror("fast")]*6,workers=1,timeout=2,on_result=on_result,stop=stop)
+    assert len(seen)==1 and len(ranked)==1
+
+def test_score_failed(sysup):
+    assert sysup.mirror_score({"ok":False,"rate":None}) is None
+
+# ── rank_mirrorlist ───────────────────────────────────────────────────────────
+MIRRORLIST = """\
+## Arch Linux repository mirrorlist
+## Germany
+Server = https://a.example/$repo/os/$arch
+#Server = https://b.example/$repo/os/$arch
+Server = https://c.example/$repo/os/$arch
+"""
+
+def test_rank_mirrorlist(sysup):
+    out=sysup.rank_mirrorlist(MIRRORLIST,["https://c.example/$repo/os/$arch","https://a.example/$repo/os/$arch"],"2 of 3")
+    lines=out.splitlines()
+    assert lines[0].startswith(sysup._MIRROR_MARK+" on ") and lines[0].endswith(" — 2 of 3")
+    assert lines[1:4]==["Server = https://c.example/$repo/os/$arch","Server = https://a.example/$repo/os/$arch",""]
+    assert lines[4:]==["## Arch Linux repository mirrorlist","## Germany",
+                       "#Server = https://a.example/$repo/os/$arch","#Server = https://b.example/$repo/os/$arch",
+                       "#Server = https://c.example/$repo/os/$arch"]
+
+def test_rerank_replaces_block(sysup):
+    once=sysup.rank_mirrorlist(MIRRORLIST,["https://c.example/$repo/os/$arch"])
+    twice=sysup.rank_mirrorlist(once,["https://b.example/$repo/os/$arch"])
+    assert twice.count(sysup._MIRROR_MARK)==1
+    assert twice.splitlines()[1:3]==["Server = https://b.example/$repo/os/$arch",""]
+    assert twice.splitlines()[3:]==once.splitlines()[3:]
+    assert sum(1 for ln in twice.splitlines() if ln.startswith("Server"))==1